@@ -1,28 +1,88 @@
 from __future__ import annotations
 
+import asyncio
 import base64
+import hashlib
+import hmac
+import json
+import threading
 import time
 import uuid
 from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Any, Dict, Optional
 
-from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel, Field
-
-from app.speech import build_voice_pipeline
+from starlette.concurrency import run_in_threadpool
+
+from app.speech import (
+    AudioTooLong,
+    ChatReply,
+    TTSJobStore,
+    UploadTooLarge,
+    build_voice_pipeline,
+    preloaded_voice_pipeline,
+    read_voice_upload,
+)
+from natubot_core.admission import (
+    PRIORITY_CHAT,
+    PRIORITY_SHORT_TTS,
+    PRIORITY_VOICE,
+    AdmissionController,
+    AdmissionRejected,
+)
+from natubot_core.answer_bundle import AnswerBundle, AnswerBundleStore, dominant_version, question_key
+from natubot_core.canonical import CanonicalAnswer, CanonicalMatcher, CanonicalStore, load_intents
+from natubot_core.chunk_store import ChunkStore
+from natubot_core.decompose import CatalogVocabulary, QueryDecomposer
 from natubot_core.gemini_client import GeminiClient
+from natubot_core.health import DependencyProber
 from natubot_core.kiosk_registry import get_kiosk_info, load_kiosk_registry, verify_kiosk
 from natubot_core.logging_utils import log_event, setup_json_logger
+from natubot_core.metrics import metrics
+from natubot_core.model_router import ModelRouter, ModelTier, RoutingPolicy
 from natubot_core.pinecone_client import PineconeClients
-from natubot_core.rag import answer_with_rag
+from natubot_core.profiling import SamplingProfiler
+from natubot_core.prompts import VoiceAnswerProfile, split_voice_answer
+from natubot_core.rag import answer_with_rag, retrieve_context
+from natubot_core.rerank import RerankConfig
+from natubot_core.resilience import (
+    CircuitBreaker,
+    Deadline,
+    DeadlineExceeded,
+    RequestCancelled,
+    run_with_timeout,
+    stage_timeout,
+)
+from natubot_core.sessions import SessionStore, is_follow_up
 from natubot_core.settings import PROJECT_ROOT, get_settings
+from natubot_core.speculative import SpeculativeRetrieval
 
 settings = get_settings()
 
-app = FastAPI(title="NatuBot Backend (Gemini + Pinecone)", version="0.7.0")
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    prober.start()
+    try:
+        yield
+    finally:
+        prober.stop()
+        speculation_pool.shutdown(wait=False, cancel_futures=True)
+        if tts_jobs is not None:
+            tts_jobs.shutdown()
+        if llm_pool is not None:
+            llm_pool.shutdown(wait=False, cancel_futures=True)
+        if retrieval_pool is not None:
+            retrieval_pool.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(title="NatuBot Backend (Gemini + Pinecone)", version="0.7.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,21 +90,65 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "X-Request-Id", "ETag"],
 )
 
+
+
+def _breaker(name: str, slow_call_ms: float) -> CircuitBreaker:
+    return CircuitBreaker(
+        name,
+        window=settings.breaker_window,
+        min_calls=settings.breaker_min_calls,
+        failure_rate=settings.breaker_failure_rate,
+        slow_call_ms=slow_call_ms,
+        slow_rate=settings.breaker_slow_rate,
+        open_sec=settings.breaker_open_sec,
+    )
+
+
+# Circuit breakers por upstream (fallan rápido a una respuesta degradada)
+breakers = {
+    "gemini_embed": _breaker("gemini_embed", settings.embed_slow_ms),
+    "gemini_generate": _breaker("gemini_generate", settings.generate_slow_ms),
+    "pinecone_query": _breaker("pinecone_query", settings.query_slow_ms),
+}
+# Con tiers, el modelo rápido tiene su propio breaker: si uno se abre, el hedge/failover al otro sigue.
+model_breakers: Dict[str, CircuitBreaker] = {}
+if settings.model_tiering_enabled and settings.gemini_fast_model != settings.gemini_chat_model:
+    breakers["gemini_generate_fast"] = _breaker("gemini_generate_fast", settings.generate_slow_ms)
+    model_breakers[settings.gemini_fast_model] = breakers["gemini_generate_fast"]
+
 # Clients (singletons)
 gemini = GeminiClient(
     api_key=settings.gemini_api_key,
     chat_model=settings.gemini_chat_model,
     embed_model=settings.gemini_embed_model,
     embed_dim=settings.embed_dim,
+    embed_breaker=breakers["gemini_embed"],
+    generate_breaker=breakers["gemini_generate"],
+    model_breakers=model_breakers,
+    context_cache_ttl_sec=settings.gemini_context_cache_ttl_sec if settings.gemini_context_cache_enabled else 0.0,
+    context_cache_refresh_sec=settings.gemini_context_cache_refresh_sec,
+    embed_batch_max=settings.embed_batch_max_size if settings.embed_batch_enabled else 0,
+    embed_batch_wait_ms=settings.embed_batch_max_wait_ms,
+    embed_batch_min_concurrency=settings.embed_batch_min_concurrency,
 )
 
 pinecone = PineconeClients(
     api_key=settings.pinecone_api_key,
     index_name=settings.pinecone_index_name,
     index_host=settings.pinecone_index_host,
+    query_breaker=breakers["pinecone_query"],
+)
+
+# Sesiones de conversación (TTL + LRU, en memoria)
+sessions = SessionStore(
+    max_sessions=settings.session_max,
+    ttl_sec=settings.session_ttl_sec,
+    max_turns=settings.session_max_turns,
 )
+metrics.gauge("sessions.active", lambda: len(sessions))
 
 # Kiosk registry
 _registry_path = Path(settings.kiosk_registry_file)
@@ -58,15 +162,206 @@ if not _log_dir.is_absolute():
     _log_dir = PROJECT_ROOT / _log_dir
 logger = setup_json_logger(_log_dir, level=settings.log_level)
 
+# Profiler por muestreo de requests lentos (se prende/apaga en runtime vía /admin/profiling)
+_profiling_dir = Path(settings.profiling_dir)
+if not _profiling_dir.is_absolute():
+    _profiling_dir = PROJECT_ROOT / _profiling_dir
+profiler = SamplingProfiler(
+    _profiling_dir,
+    enabled=settings.profiling_enabled,
+    sample_rate=settings.profiling_sample_rate,
+    slow_ms=settings.profiling_slow_ms,
+    interval_ms=settings.profiling_interval_ms,
+    fmt=settings.profiling_format,
+    max_files=settings.profiling_max_files,
+    max_total_mb=settings.profiling_max_mb,
+    logger=logger,
+)
+PROFILED_PATHS = {"/chat", "/api/voice/turn", "/api/voice/turn/", "/voice/turn", "/voice/turn/"}
+
+# Tiers de modelo (opcional): el router elige modelo por turno y hedgea si el tier se demora
+llm_pool: Optional[ThreadPoolExecutor] = None
+router: Optional[ModelRouter] = None
+if settings.model_tiering_enabled:
+    llm_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm")
+    router = ModelRouter(
+        gemini,
+        fast=ModelTier(
+            "fast",
+            settings.gemini_fast_model,
+            settings.tier_fast_budget_ms,
+            settings.tier_fast_usd_in,
+            settings.tier_fast_usd_out,
+        ),
+        full=ModelTier(
+            "full",
+            settings.gemini_chat_model,
+            settings.tier_full_budget_ms,
+            settings.tier_full_usd_in,
+            settings.tier_full_usd_out,
+        ),
+        executor=llm_pool,
+        policy=RoutingPolicy(
+            max_question_words=settings.tier_max_question_words,
+            min_score_margin=settings.tier_min_score_margin,
+            max_products=settings.tier_max_products,
+        ),
+        hedge=settings.tier_hedge_enabled,
+        logger=logger,
+    )
+
+# Rerank por diversidad entre retrieval y prompt
+rerank = (
+    RerankConfig(
+        fetch_multiplier=settings.rerank_fetch_multiplier,
+        max_candidates=settings.rerank_max_candidates,
+        lambda_=settings.rerank_lambda,
+        score_gap=settings.rerank_score_gap,
+        min_score_ratio=settings.rerank_min_score_ratio,
+        min_keep=settings.rerank_min_keep,
+    )
+    if settings.rerank_enabled
+    else None
+)
+voice_answer = VoiceAnswerProfile(
+    max_output_tokens=settings.voice_max_output_tokens,
+    spoken_max_words=settings.voice_spoken_max_words,
+)
+
+# Retrieval especulativo de voz: pool propio para no ocupar el threadpool de requests
+speculation_pool = ThreadPoolExecutor(max_workers=settings.speculative_workers, thread_name_prefix="speculative")
+
+# Texto de chunks local (opcional: solo si la ingesta generó el store)
+chunk_store: Optional[ChunkStore] = None
+_chunk_store_path = Path(settings.chunk_store_path)
+if not _chunk_store_path.is_absolute():
+    _chunk_store_path = PROJECT_ROOT / _chunk_store_path
+if settings.chunk_store_enabled and _chunk_store_path.exists():
+    try:
+        chunk_store = ChunkStore(_chunk_store_path)
+    except Exception as e:
+        log_event(logger, {"event": "chunk_store_init_error", "error": str(e)})
+metrics.gauge("chunk_store.chunks", lambda: len(chunk_store) if chunk_store is not None else 0)
+
+# Descomposición de preguntas multi-producto: vocabulario del catálogo sacado del store de chunks
+decomposer: Optional[QueryDecomposer] = None
+retrieval_pool: Optional[ThreadPoolExecutor] = None
+if settings.query_decomposition_enabled and chunk_store is not None:
+    try:
+        _catalog = CatalogVocabulary.from_metadata(chunk_store.iter_metadata())
+        if len(_catalog):
+            decomposer = QueryDecomposer(
+                _catalog,
+                max_facets=settings.query_decomposition_max_facets,
+                min_per_facet=settings.query_decomposition_min_per_facet,
+            )
+            retrieval_pool = ThreadPoolExecutor(
+                max_workers=settings.query_decomposition_workers, thread_name_prefix="retrieval"
+            )
+    except Exception as e:
+        log_event(logger, {"event": "decomposer_init_error", "error": str(e)})
+
+# Respuestas canónicas precalculadas (opcional: solo si existe el store generado offline)
+canonical_store: Optional[CanonicalStore] = None
+canonical: Optional[CanonicalMatcher] = None
+_canonical_path = Path(settings.canonical_store_path)
+if not _canonical_path.is_absolute():
+    _canonical_path = PROJECT_ROOT / _canonical_path
+if settings.canonical_enabled and _canonical_path.exists():
+    try:
+        _intents_path = Path(settings.canonical_intents_file) if settings.canonical_intents_file else None
+        if _intents_path is not None and not _intents_path.is_absolute():
+            _intents_path = PROJECT_ROOT / _intents_path
+        canonical_store = CanonicalStore(_canonical_path)
+        canonical = CanonicalMatcher(
+            canonical_store.load_answers(settings.canonical_data_version or None),
+            load_intents(_intents_path),
+        )
+    except Exception as e:
+        canonical_store, canonical = None, None
+        log_event(logger, {"event": "canonical_init_error", "error": str(e)})
+metrics.gauge("canonical.answers", lambda: len(canonical) if canonical is not None else 0)
+
+# Respuestas frecuentes que el kiosco guarda en IndexedDB (opcional: solo si existe el bundle generado offline)
+answer_bundle: Optional[AnswerBundle] = None
+_answer_bundle_path = Path(settings.answer_bundle_path)
+if not _answer_bundle_path.is_absolute():
+    _answer_bundle_path = PROJECT_ROOT / _answer_bundle_path
+if settings.answer_bundle_enabled and _answer_bundle_path.exists():
+    try:
+        answer_bundle = AnswerBundle(
+            AnswerBundleStore(_answer_bundle_path),
+            data_version=settings.answer_bundle_data_version
+            or (dominant_version(chunk_store.versions()) if chunk_store is not None else ""),
+            terms_version=settings.terms_version,
+        )
+    except Exception as e:
+        log_event(logger, {"event": "answer_bundle_init_error", "error": str(e)})
+metrics.gauge("answer_bundle.answers", lambda: len(answer_bundle) if answer_bundle is not None else 0)
+
 # Voice pipeline (lazy-safe to avoid breaking existing endpoints if models are missing)
+# Con app/serve.py los modelos ya vienen cargados del proceso maestro (compartidos entre workers).
 voice_pipeline = None
 voice_pipeline_error = ""
 try:
-    voice_pipeline = build_voice_pipeline(settings)
+    voice_pipeline = preloaded_voice_pipeline() or build_voice_pipeline(settings)
 except Exception as e:
     voice_pipeline_error = str(e)
     log_event(logger, {"event": "voice_pipeline_init_error", "error": voice_pipeline_error})
 
+# Audio de turnos en dos fases (el turno responde con el texto; el TTS sigue en segundo plano)
+tts_jobs: Optional[TTSJobStore] = None
+if voice_pipeline is not None:
+    tts_jobs = TTSJobStore(
+        voice_pipeline.tts_engine.synthesize,
+        workers=settings.tts_job_workers,
+        ttl_sec=settings.tts_job_ttl_sec,
+        max_jobs=settings.tts_job_max_jobs,
+    )
+
+
+
+def _probe_pinecone() -> Dict[str, Any]:
+    stats = pinecone.stats(namespace=settings.pinecone_namespace)
+    total = getattr(stats, "total_vector_count", None)
+    return {"total_vector_count": int(total)} if total is not None else {}
+
+
+def _probe_stt(deep: bool = False) -> Dict[str, Any]:
+    if voice_pipeline is None:
+        raise RuntimeError(f"Voice pipeline no disponible: {voice_pipeline_error}")
+    return voice_pipeline.check_stt(deep=deep)
+
+
+def _probe_tts(deep: bool = False) -> Dict[str, Any]:
+    if voice_pipeline is None:
+        raise RuntimeError(f"Voice pipeline no disponible: {voice_pipeline_error}")
+    return voice_pipeline.check_tts(deep=deep)
+
+
+# Health: dependencias chequeadas en segundo plano; /health solo lee memoria
+prober = DependencyProber(
+    interval_sec=settings.health_probe_interval_sec,
+    stale_after_sec=settings.health_stale_after_sec,
+)
+prober.register("pinecone", _probe_pinecone)
+prober.register("gemini", lambda: gemini.ping(timeout=settings.health_probe_timeout_sec))
+prober.register("stt", _probe_stt, critical=False, deep_check=lambda: _probe_stt(deep=True))
+prober.register("tts", _probe_tts, critical=False, deep_check=lambda: _probe_tts(deep=True))
+
+# Admisión para trabajo pesado: límites por etapa, colas acotadas y prioridad
+admission = AdmissionController(
+    total_slots=settings.admission_total_slots,
+    stage_limits={
+        "chat": settings.admission_chat_limit,
+        "tts": settings.admission_tts_limit,
+        "voice": settings.admission_voice_limit,
+    },
+    max_queue=settings.admission_max_queue,
+    max_wait_sec=settings.admission_max_wait_sec,
+    metrics=metrics,
+)
+
 # Rate limiting (in-memory; ok for MVP single instance)
 _rate_store = defaultdict(lambda: deque())
 
@@ -84,14 +379,24 @@ class ChatResponse(BaseModel):
     answer: str
     citations: list
     used_context: bool
+    degraded: bool = False
+    model_tier: Optional[str] = None
 
 
 class VoiceTurnJSONRequest(BaseModel):
-    audio_base64: str
+    # El audio se decodifica en streaming (app.speech.upload); aquí solo se validan los demás campos.
+    audio_base64: str = ""
     filename: Optional[str] = "audio.wav"
+    # "audio/pcm;rate=16000;channels=1" = PCM int16 crudo (sin decode ni resample)
+    content_type: Optional[str] = None
     include_audio: bool = True
+    # true: responde apenas hay texto, con `audio_job` (null = VOICE_AUDIO_ASYNC)
+    audio_async: Optional[bool] = None
+    # true: el kiosco ya recortó el silencio con su VAD (se respeta con VAD_CLIENT_ENABLED)
+    client_vad: bool = False
     top_k: int = Field(settings.default_top_k, ge=1, le=settings.max_top_k)
     pinecone_filter: Optional[Dict[str, Any]] = None
+    session_id: Optional[str] = None
 
 
 class TTSRequest(BaseModel):
@@ -99,10 +404,25 @@ class TTSRequest(BaseModel):
     as_base64: bool = True
 
 
+class ProfilingUpdate(BaseModel):
+    enabled: Optional[bool] = None
+    sample_rate: Optional[float] = Field(default=None, ge=0.0, le=1.0)
+    slow_ms: Optional[float] = Field(default=None, ge=0.0)
+    format: Optional[str] = None
+
+
 def _device_id(request: Request) -> str:
     return (request.headers.get("x-device-id") or "").strip() or "unknown"
 
 
+def _kiosk_key(request: Request) -> str:
+    # Igual que el rate limit: device id o, sin header, la IP del cliente.
+    did = _device_id(request)
+    if did != "unknown":
+        return did
+    return request.client.host if request.client else "unknown"
+
+
 def _token(request: Request) -> str:
     tok = (request.headers.get("x-kiosk-token") or "").strip()
     if tok:
@@ -129,10 +449,81 @@ def _require_kiosk(request: Request) -> Dict[str, Any]:
     return {"device_id": did, "kiosk": get_kiosk_info(did, kiosk_registry) or {}, "auth_ok": True}
 
 
-def _chat_answer(question: str, *, top_k: int, pinecone_filter: Optional[Dict[str, Any]] = None) -> str:
+def _stage_budgets() -> Dict[str, float]:
+    return {
+        "embed": settings.embed_timeout_sec,
+        "query": settings.query_timeout_sec,
+        "generate": settings.generate_timeout_sec,
+        "tts": settings.tts_timeout_sec,
+    }
+
+
+def _log_question(request: Request, question: str, source: str, pinecone_filter: Optional[Dict[str, Any]]) -> None:
+    """Pregunta normalizada en los logs: de aquí salen las frecuentes del bundle del kiosco."""
+    if not settings.answer_bundle_log_questions or pinecone_filter:
+        return
+    key = question_key(question)
+    if not key:
+        return
+    did = _device_id(request)
+    log_event(
+        logger,
+        {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "event": "question",
+            "device_id": did,
+            "kiosk_location": (get_kiosk_info(did, kiosk_registry) or {}).get("location"),
+            "source": source,
+            "q": key,
+        },
+    )
+
+
+def _canonical_hit(
+    question: str,
+    pinecone_filter: Optional[Dict[str, Any]] = None,
+    session_id: Optional[str] = None,
+) -> Optional[CanonicalAnswer]:
+    """Respuesta precalculada para "intención + producto"; con filtros explícitos siempre va por RAG."""
+    if canonical is None or pinecone_filter:
+        return None
+    state = sessions.get(session_id)
+    last_product = state.product_names[0] if state is not None and len(state.product_names) == 1 else None
+    hit = canonical.match(question, fallback_product=last_product)
+    if hit is None:
+        return None
+    metrics.inc("canonical.hits")
+    if session_id:
+        sessions.record(
+            session_id, question=question, answer=hit.answer, contexts=[], product_names=[hit.product_name]
+        )
+    return hit
+
+
+def _chat_answer(
+    question: str,
+    *,
+    top_k: int,
+    pinecone_filter: Optional[Dict[str, Any]] = None,
+    deadline: Optional[Deadline] = None,
+    generate_reserve_sec: float = 0.0,
+    session_id: Optional[str] = None,
+    include_audio: bool = False,
+    answer_profile: str = "text",
+    speculative: Optional[SpeculativeRetrieval] = None,
+) -> ChatReply:
     q = (question or "").strip()
     if not q:
-        return "No logré escuchar bien tu mensaje. ¿Podrías repetirlo, por favor?"
+        return ChatReply(text="No logré escuchar bien tu mensaje. ¿Podrías repetirlo, por favor?")
+    hit = _canonical_hit(q, pinecone_filter, session_id)
+    if hit is not None:
+        if answer_profile != "voice":
+            audio = canonical_store.audio_for(hit.answer_sha) if include_audio and hit.has_audio else None
+            return ChatReply(text=hit.answer, audio_wav=audio)
+        # Turno de voz: el resumen hablado precalculado y su WAV, nunca el audio de la respuesta completa.
+        spoken = hit.spoken or split_voice_answer(hit.answer, voice_answer.spoken_max_words)[0]
+        audio = canonical_store.spoken_audio_for(hit.answer_sha) if include_audio and hit.has_spoken_audio else None
+        return ChatReply(text=hit.answer, audio_wav=audio, spoken_text=spoken)
     result = answer_with_rag(
         question=q,
         gemini=gemini,
@@ -141,8 +532,95 @@ def _chat_answer(question: str, *, top_k: int, pinecone_filter: Optional[Dict[st
         top_k=top_k,
         bot_name=settings.bot_name,
         pinecone_filter=pinecone_filter,
+        deadline=deadline,
+        generate_reserve_sec=generate_reserve_sec,
+        degraded_answer=settings.degraded_message,
+        sessions=sessions,
+        session_id=session_id,
+        chunk_store=chunk_store,
+        rerank=rerank,
+        decomposer=decomposer,
+        executor=retrieval_pool,
+        voice_profile=voice_answer if answer_profile == "voice" else None,
+        speculative=speculative,
+        router=router,
+    )
+    return ChatReply(text=result["answer"], spoken_text=result.get("spoken_answer"))
+
+
+def _speculative_retrieval(
+    *,
+    top_k: int,
+    pinecone_filter: Optional[Dict[str, Any]],
+    deadline: Deadline,
+    session_id: Optional[str],
+) -> Optional[SpeculativeRetrieval]:
+    """Retrieval con el transcript parcial del turno de voz (mismos parámetros que el RAG final)."""
+    if not settings.speculative_retrieval_enabled:
+        return None
+
+    def retrieve(partial: str):
+        # Parciales que irán por respuesta canónica o por contexto de sesión no necesitan retrieval.
+        if canonical is not None and not pinecone_filter and canonical.match(partial) is not None:
+            return None
+        state = sessions.get(session_id)
+        if state is not None and state.pinecone_filter == pinecone_filter and is_follow_up(partial, state):
+            return None
+        return retrieve_context(
+            question=partial,
+            gemini=gemini,
+            pinecone=pinecone,
+            namespace=settings.pinecone_namespace,
+            top_k=top_k,
+            pinecone_filter=pinecone_filter,
+            deadline=deadline,
+            chunk_store=chunk_store,
+            rerank=rerank,
+            decomposer=decomposer,
+            executor=retrieval_pool,
+        )
+
+    return SpeculativeRetrieval(
+        retrieve=retrieve,
+        executor=speculation_pool,
+        min_words=settings.speculative_min_words,
+        stable_updates=settings.speculative_stable_updates,
+        min_overlap=settings.speculative_min_overlap,
     )
-    return result["answer"]
+
+
+@asynccontextmanager
+async def _admitted(stage: str, priority: int, deadline: Optional[Deadline] = None):
+    """Reserva un slot de admisión o responde 503 + Retry-After sin encolar trabajo imposible."""
+    max_wait = deadline.remaining() if deadline is not None else None
+    try:
+        await admission.acquire(stage, priority, max_wait_sec=max_wait)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after_sec)})
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        admission.release(stage, service_sec=time.monotonic() - started)
+
+
+async def _run_until_disconnect(request: Request, deadline: Deadline, fn):
+    """
+    Corre `fn` (bloqueante) en el threadpool. Si el kiosco se desconecta, cancela el
+    deadline: el worker corta en el siguiente límite de etapa en vez de seguir gastando
+    Gemini/Pinecone/TTS para nadie.
+    """
+    task = asyncio.ensure_future(run_in_threadpool(profiler.bind(fn)))
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=0.5)
+        if done:
+            break
+        if not deadline.cancelled and await request.is_disconnected():
+            deadline.cancel("cliente desconectado")
+    try:
+        return task.result()
+    except RequestCancelled:
+        raise HTTPException(status_code=499, detail="Cliente desconectado; solicitud cancelada.")
 
 
 @app.middleware("http")
@@ -153,6 +631,7 @@ async def logging_middleware(request: Request, call_next):
     did = _device_id(request)
     client_ip = request.client.host if request.client else "unknown"
     status = 500
+    profile = profiler.start(request_id, request.url.path) if request.url.path in PROFILED_PATHS else None
 
     try:
         response = await call_next(request)
@@ -160,6 +639,9 @@ async def logging_middleware(request: Request, call_next):
         response.headers["X-Request-Id"] = request_id
         return response
     finally:
+        finished = profiler.finish(profile)
+        if finished is not None:
+            await run_in_threadpool(profiler.save, finished, status)
         elapsed_ms = int((time.time() - start) * 1000)
         kiosk_info = get_kiosk_info(did, kiosk_registry) or {}
         log_event(
@@ -213,59 +695,185 @@ def root():
     return {"ok": True, "message": "NatuBot backend running. See /docs, /terms, /config."}
 
 
+# Respuestas renderizadas de /config (por kiosco) y /terms (por mtime del archivo).
+# Settings es inmutable por proceso: el ETag (hash del cuerpo) cambia solo si cambia el contenido.
+_config_cache: Dict[str, tuple] = {}
+_terms_cache: Dict[str, Any] = {"key": None, "entry": None}
+
+
+def _render_cached(payload: Dict[str, Any]) -> tuple:
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match") or ""
+    if header.strip() == "*":
+        return True
+    # If-None-Match usa comparación débil: W/"x" coincide con "x".
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def _conditional_json(request: Request, entry: tuple, cache_control: str) -> Response:
+    body, etag = entry
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if _etag_matches(request, etag):
+        metrics.inc("http.not_modified")
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @app.get("/config")
 def get_config(request: Request):
     did = _device_id(request)
     info = get_kiosk_info(did, kiosk_registry) or {}
-
-    payload = {
-        "ok": True,
-        "bot_name": settings.bot_name,
-        "offline_message": settings.offline_message,
-        "max_message_chars": settings.max_message_chars,
-        "welcome_message": settings.welcome_message,
-        "welcome_message_version": settings.welcome_message_version,
-        "terms_version": settings.terms_version,
-        "rate_limit_rpm": settings.rate_limit_rpm,
-        "rate_limit_window_sec": settings.rate_limit_window_sec,
-        "speech": {
-            "stt_mode": settings.stt_mode,
-            "tts_mode": settings.tts_mode,
-            "vad_enabled": settings.vad_enabled,
-            "audio_sample_rate": settings.audio_sample_rate,
-        },
-    }
-    if info:
-        payload["kiosk"] = {"device_id": did, "name": info.get("name"), "location": info.get("location")}
-    return payload
+    # Dispositivos fuera del registro comparten la misma respuesta (clave acotada).
+    cache_key = did if info else ""
+
+    entry = _config_cache.get(cache_key)
+    if entry is None:
+        payload = {
+            "ok": True,
+            "bot_name": settings.bot_name,
+            "offline_message": settings.offline_message,
+            "max_message_chars": settings.max_message_chars,
+            "welcome_message": settings.welcome_message,
+            "welcome_message_version": settings.welcome_message_version,
+            "terms_version": settings.terms_version,
+            "rate_limit_rpm": settings.rate_limit_rpm,
+            "rate_limit_window_sec": settings.rate_limit_window_sec,
+            "speech": {
+                "stt_mode": settings.stt_mode,
+                "tts_mode": settings.tts_mode,
+                "vad_enabled": settings.vad_enabled,
+                "client_vad": settings.vad_client_enabled,
+                "vad_end_silence_ms": settings.vad_end_silence_ms,
+                "audio_sample_rate": settings.audio_sample_rate,
+                "max_turn_sec": settings.voice_max_turn_sec,
+                "audio_async": settings.voice_audio_async,
+            },
+            "answer_bundle": {
+                "enabled": answer_bundle is not None,
+                "sync_sec": settings.answer_bundle_sync_sec,
+            },
+        }
+        if info:
+            payload["kiosk"] = {"device_id": did, "name": info.get("name"), "location": info.get("location")}
+        entry = _config_cache[cache_key] = _render_cached(payload)
+    return _conditional_json(request, entry, "private, no-cache")
 
 
 @app.get("/terms")
-def get_terms():
+def get_terms(request: Request):
     try:
         terms_path = Path(settings.terms_file)
         if not terms_path.is_absolute():
             terms_path = PROJECT_ROOT / terms_path
         if not terms_path.exists():
             return JSONResponse(status_code=500, content={"ok": False, "error": f"No se encontró TERMS_FILE: {terms_path}"})
-        text = terms_path.read_text(encoding="utf-8")
-        return {"ok": True, "version": settings.terms_version, "content_markdown": text}
+        st = terms_path.stat()
+        key = (str(terms_path), st.st_mtime_ns, st.st_size)
+        if _terms_cache["key"] != key:
+            text = terms_path.read_text(encoding="utf-8")
+            _terms_cache["entry"] = _render_cached({"ok": True, "version": settings.terms_version, "content_markdown": text})
+            _terms_cache["key"] = key
+        return _conditional_json(request, _terms_cache["entry"], "public, no-cache")
     except Exception as e:
         return JSONResponse(status_code=500, content={"ok": False, "error": str(e)})
 
 
+# Bundle por ubicación (acotado por las ubicaciones del ranking); se invalida solo al reiniciar.
+_bundle_cache: Dict[str, tuple] = {}
+# Sin bundle el kiosco borra el que tenga guardado (versión vacía).
+_empty_bundle = _render_cached({"ok": True, "version": "", "answers": []})
+
+
+@app.get("/kiosk/bundle")
+def get_answer_bundle(request: Request):
+    auth = _require_kiosk(request)
+    if answer_bundle is None:
+        return _conditional_json(request, _empty_bundle, "private, no-cache")
+    location = answer_bundle.resolve(auth["kiosk"].get("location"))
+    entry = _bundle_cache.get(location)
+    if entry is None:
+        entry = _bundle_cache[location] = _render_cached(answer_bundle.payload(location))
+    return _conditional_json(request, entry, "private, no-cache")
+
+
+@app.get("/kiosk/bundle/audio/{audio_sha}")
+def get_answer_bundle_audio(audio_sha: str, request: Request):
+    _ = _require_kiosk(request)
+    hit = answer_bundle.audio(audio_sha) if answer_bundle is not None else None
+    if hit is None:
+        raise HTTPException(status_code=404, detail="Audio no encontrado en el bundle vigente.")
+    audio, mime = hit
+    # El sha identifica el contenido: el kiosco lo guarda para siempre (no cambia nunca).
+    etag = '"' + audio_sha[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=31536000, immutable"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    metrics.inc("answer_bundle.audio_served")
+    return Response(content=audio, media_type=mime, headers=headers)
+
+
 @app.get("/health")
-def health():
-    # JSON-safe health check
+def health(deep: bool = False):
+    # JSON-safe health check: sirve el último resultado del prober (sin llamadas remotas).
+    # deep=true fuerza un chequeo sincrónico completo (solo si HEALTH_ALLOW_DEEP=true).
+    if deep:
+        if not settings.health_allow_deep:
+            raise HTTPException(status_code=403, detail="Deep health check desactivado (HEALTH_ALLOW_DEEP=false).")
+        prober.run_once(deep=True)
+
+    snap = prober.snapshot()
+    payload = {
+        "ok": snap["ok"],
+        "status": "starting" if snap["starting"] else ("ok" if snap["ok"] else "down"),
+        "pinecone_namespace": settings.pinecone_namespace,
+        "checks": snap["checks"],
+        "breakers": {name: b.snapshot() for name, b in breakers.items()},
+    }
+    if not snap["ok"]:
+        return JSONResponse(status_code=500, content=payload)
+    return payload
+
+
+@app.get("/metrics")
+def get_metrics():
+    # Gauges de admisión (cola, en vuelo), histogramas de espera y contadores de rechazo.
+    return {"ok": True, "admission": admission.snapshot(), **metrics.snapshot()}
+
+
+def _require_admin(request: Request) -> None:
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Endpoints de administración desactivados (ADMIN_TOKEN vacío).")
+    tok = (request.headers.get("x-admin-token") or "").strip()
+    if not hmac.compare_digest(tok.encode("utf-8"), settings.admin_token.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid admin token.")
+
+
+@app.get("/admin/profiling")
+def get_profiling(request: Request):
+    _require_admin(request)
+    return {"ok": True, **profiler.status()}
+
+
+@app.post("/admin/profiling")
+def update_profiling(req: ProfilingUpdate, request: Request):
+    # Cambio en memoria (por proceso); al reiniciar vuelve a PROFILING_*.
+    _require_admin(request)
     try:
-        _ = pinecone.stats(namespace=settings.pinecone_namespace)
-        return {"ok": True, "pinecone_namespace": settings.pinecone_namespace}
-    except Exception as e:
-        return JSONResponse(status_code=500, content={"ok": False, "error": str(e)})
+        status = profiler.configure(
+            enabled=req.enabled, sample_rate=req.sample_rate, slow_ms=req.slow_ms, fmt=req.format
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    log_event(logger, {"ts": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "event": "profiling_configured", **status})
+    return {"ok": True, **status}
 
 
 @app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest, request: Request) -> ChatResponse:
+async def chat(req: ChatRequest, request: Request) -> ChatResponse:
     _ = _require_kiosk(request)
 
     if not req.accepted_terms:
@@ -273,17 +881,45 @@ def chat(req: ChatRequest, request: Request) -> ChatResponse:
     if req.accepted_terms_version != settings.terms_version:
         raise HTTPException(status_code=412, detail="Debes aceptar la versión actual de términos y condiciones antes de continuar.")
 
+    _log_question(request, req.message, "text", req.pinecone_filter)
+    hit = _canonical_hit(req.message.strip(), req.pinecone_filter, req.session_id)
+    if hit is not None:
+        return ChatResponse(answer=hit.answer, citations=hit.citations, used_context=True)
+
+    deadline = Deadline(settings.chat_deadline_sec, budgets=_stage_budgets())
     try:
-        result = answer_with_rag(
-            question=req.message,
-            gemini=gemini,
-            pinecone=pinecone,
-            namespace=settings.pinecone_namespace,
-            top_k=req.top_k,
-            bot_name=settings.bot_name,
-            pinecone_filter=req.pinecone_filter,
+        async with _admitted("chat", PRIORITY_CHAT, deadline):
+            result = await _run_until_disconnect(
+                request,
+                deadline,
+                lambda: answer_with_rag(
+                    question=req.message,
+                    gemini=gemini,
+                    pinecone=pinecone,
+                    namespace=settings.pinecone_namespace,
+                    top_k=req.top_k,
+                    bot_name=settings.bot_name,
+                    pinecone_filter=req.pinecone_filter,
+                    deadline=deadline,
+                    degraded_answer=settings.degraded_message,
+                    sessions=sessions,
+                    session_id=req.session_id,
+                    chunk_store=chunk_store,
+                    rerank=rerank,
+                    decomposer=decomposer,
+                    executor=retrieval_pool,
+                    router=router,
+                ),
+            )
+        return ChatResponse(
+            answer=result["answer"],
+            citations=result["citations"],
+            used_context=result["used_context"],
+            degraded=result.get("degraded", False),
+            model_tier=result.get("model_tier"),
         )
-        return ChatResponse(answer=result["answer"], citations=result["citations"], used_context=result["used_context"])
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"No fue posible responder en este momento: {str(e)}")
 
@@ -292,13 +928,7 @@ def chat(req: ChatRequest, request: Request) -> ChatResponse:
 @app.post("/api/voice/turn/")
 @app.post("/voice/turn")
 @app.post("/voice/turn/")
-async def voice_turn(
-    request: Request,
-    audio: Optional[UploadFile] = File(default=None, alias="audio"),
-    file: Optional[UploadFile] = File(default=None, alias="file"),
-    include_audio: bool = Form(default=True),
-    top_k: int = Form(default=settings.default_top_k),
-):
+async def voice_turn(request: Request):
     _ = _require_kiosk(request)
 
     if settings.stt_mode in {"off", "disabled", "none"}:
@@ -310,46 +940,94 @@ async def voice_turn(
     if voice_pipeline is None:
         raise HTTPException(status_code=503, detail=f"Voice pipeline no disponible: {voice_pipeline_error}")
 
-    ctype = (request.headers.get("content-type") or "").lower()
-
-    audio_bytes = b""
-    source_name = "audio.wav"
-    req_include_audio = include_audio
-    req_top_k = top_k
-    req_filter = None
+    # Multipart o JSON/base64, leído en streaming con tope de bytes (413 apenas se excede).
+    try:
+        upload = await read_voice_upload(
+            request,
+            max_audio_bytes=settings.voice_max_upload_bytes,
+            spool_bytes=settings.voice_upload_spool_bytes,
+        )
+    except UploadTooLarge as e:
+        metrics.inc("voice.upload_rejected_bytes")
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Audio inválido para voz: {e}")
 
-    if "application/json" in ctype:
+    audio_bytes = upload.audio
+    source_name = upload.filename
+    audio_content_type = upload.content_type
+    if "application/json" in (request.headers.get("content-type") or "").lower():
         try:
-            body = await request.body()
-            payload = VoiceTurnJSONRequest.model_validate_json(body)
-            audio_bytes = base64.b64decode(payload.audio_base64)
-            source_name = payload.filename or "audio.wav"
-            req_include_audio = payload.include_audio
-            req_top_k = payload.top_k
-            req_filter = payload.pinecone_filter
+            payload = VoiceTurnJSONRequest.model_validate(upload.fields)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"JSON inválido para voz: {e}")
+        req_include_audio = payload.include_audio
+        req_audio_async = settings.voice_audio_async if payload.audio_async is None else payload.audio_async
+        req_client_vad = payload.client_vad
+        req_top_k = payload.top_k
+        req_filter = payload.pinecone_filter
+        req_session_id = payload.session_id
     else:
-        up = audio or file
-        if up is None:
-            raise HTTPException(status_code=400, detail="Debes enviar archivo de audio en multipart/form-data (campo audio).")
-        audio_bytes = await up.read()
-        source_name = up.filename or "audio.wav"
+        try:
+            req_include_audio = str(upload.fields.get("include_audio", "true")).strip().lower() not in {"0", "false", "no", "off"}
+            raw_async = str(upload.fields.get("audio_async", "")).strip().lower()
+            req_audio_async = raw_async in {"1", "true", "yes", "on"} if raw_async else settings.voice_audio_async
+            req_client_vad = str(upload.fields.get("client_vad", "")).strip().lower() in {"1", "true", "yes", "on"}
+            req_top_k = int(upload.fields.get("top_k") or settings.default_top_k)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Campos inválidos para voz: {e}")
+        req_filter = None
+        req_session_id = upload.fields.get("session_id") or None
 
     if not audio_bytes:
         raise HTTPException(status_code=400, detail="Audio vacío.")
 
+    # Un turno nuevo invalida el audio pendiente del turno anterior de este kiosco.
+    kiosk_key = _kiosk_key(request)
+    if tts_jobs is not None:
+        tts_jobs.cancel_owner(kiosk_key)
+    defer_tts = req_include_audio and req_audio_async and tts_jobs is not None
+
+    deadline = Deadline(settings.voice_deadline_sec, budgets=_stage_budgets())
+    # Con TTS diferido la síntesis queda fuera del deadline: la generación no reserva tiempo.
+    tts_reserve = settings.voice_tts_reserve_sec if req_include_audio and not defer_tts else 0.0
+    speculative = _speculative_retrieval(
+        top_k=req_top_k, pinecone_filter=req_filter, deadline=deadline, session_id=req_session_id
+    )
     try:
-        result = voice_pipeline.run_turn(
-            audio_bytes=audio_bytes,
-            source_name=source_name,
-            include_audio=req_include_audio,
-            chat_callable=lambda txt: _chat_answer(txt or "", top_k=req_top_k, pinecone_filter=req_filter),
-            logger=logger,
-        )
+        async with _admitted("voice", PRIORITY_VOICE, deadline):
+            result = await _run_until_disconnect(
+                request,
+                deadline,
+                lambda: voice_pipeline.run_turn(
+                    audio_bytes=audio_bytes,
+                    source_name=source_name,
+                    content_type=audio_content_type,
+                    include_audio=req_include_audio,
+                    chat_callable=lambda txt, session_id=None, answer_profile="text": _chat_answer(
+                        txt or "",
+                        top_k=req_top_k,
+                        pinecone_filter=req_filter,
+                        deadline=deadline,
+                        generate_reserve_sec=tts_reserve,
+                        session_id=session_id,
+                        include_audio=req_include_audio,
+                        answer_profile=answer_profile,
+                        speculative=speculative,
+                    ),
+                    logger=logger,
+                    deadline=deadline,
+                    session_id=req_session_id,
+                    on_partial=speculative.on_partial if speculative is not None else None,
+                    defer_tts=defer_tts,
+                    client_trimmed=req_client_vad and settings.vad_client_enabled,
+                ),
+            )
+        _log_question(request, result.stt_text, "voice", req_filter)
         output = {
             "stt_text": result.stt_text,
             "bot_text": result.bot_text,
+            "spoken_text": result.spoken_text or result.bot_text,
             "stt_mode_used": result.stt_mode_used,
             "fallback_used": result.fallback_used,
             "latency_ms": {
@@ -358,29 +1036,109 @@ async def voice_turn(
                 "tts": result.tts_latency_ms,
             },
         }
-        if req_include_audio and result.audio_wav is not None:
+        if defer_tts:
+            spoken = (result.spoken_text or result.bot_text).strip()
+            if spoken or result.audio_wav is not None:
+                job = tts_jobs.submit(kiosk_key, spoken, audio_wav=result.audio_wav)
+                output["audio_job"] = {**tts_jobs.snapshot(job), "url": f"/api/voice/audio/{job.id}"}
+        elif req_include_audio and result.audio_wav is not None:
             output["audio_wav_base64"] = base64.b64encode(result.audio_wav).decode("utf-8")
         if result.tts_error:
             output["tts_error"] = result.tts_error
         return output
     except HTTPException:
         raise
+    except AudioTooLong as e:
+        metrics.inc("voice.upload_rejected_duration")
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Error en pipeline de voz: {e}")
+    finally:
+        if speculative is not None:
+            speculative.close()
+
+
+@app.get("/api/voice/audio/{job_id}")
+async def voice_audio(job_id: str, request: Request, wait: float = 0.0):
+    """
+    Audio de un turno en dos fases. `wait` (s, tope TTS_JOB_MAX_WAIT_SEC) hace long-poll:
+    responde apenas el job termina. 200 con audio, 202 si sigue en curso, 410 si se canceló
+    (turno nuevo del mismo kiosco), 404 si no existe o expiró, 503 si la síntesis falló.
+    """
+    _ = _require_kiosk(request)
+    if tts_jobs is None:
+        raise HTTPException(status_code=503, detail=f"Voice pipeline no disponible: {voice_pipeline_error}")
+    owner = _kiosk_key(request)
+    job = tts_jobs.get(job_id, owner)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job de audio inexistente o expirado.")
+
+    until = time.monotonic() + max(0.0, min(wait, settings.tts_job_max_wait_sec))
+    while not job.done_event.is_set() and time.monotonic() < until:
+        if await request.is_disconnected():
+            raise HTTPException(status_code=499, detail="Cliente desconectado.")
+        await asyncio.sleep(0.05)
+
+    if job.status == "done":
+        return {**tts_jobs.snapshot(job), "audio_wav_base64": base64.b64encode(job.audio_wav or b"").decode("utf-8")}
+    if job.status == "cancelled":
+        raise HTTPException(status_code=410, detail="Job de audio cancelado (el kiosco inició otro turno).")
+    if job.status == "error":
+        raise HTTPException(status_code=503, detail=f"No fue posible sintetizar audio: {job.error}")
+    return JSONResponse(status_code=202, content=tts_jobs.snapshot(job))
+
+
+@app.delete("/api/voice/audio/{job_id}")
+def cancel_voice_audio(job_id: str, request: Request):
+    _ = _require_kiosk(request)
+    cancelled = tts_jobs is not None and tts_jobs.cancel(job_id, _kiosk_key(request))
+    return {"ok": True, "cancelled": cancelled}
 
 
 @app.post("/api/tts")
 @app.post("/tts")
-def tts(req: TTSRequest, request: Request):
+async def tts(req: TTSRequest, request: Request):
     _ = _require_kiosk(request)
 
     if voice_pipeline is None:
         raise HTTPException(status_code=503, detail=f"Voice pipeline no disponible: {voice_pipeline_error}")
 
+    # Respuesta canónica con audio precalculado: sin síntesis ni slot de admisión.
+    hit = canonical.by_text(req.text) if canonical is not None else None
+    if hit is not None and hit.has_audio:
+        wav_bytes = await run_in_threadpool(canonical_store.audio_for, hit.answer_sha)
+        if wav_bytes:
+            metrics.inc("canonical.audio_hits")
+            return {"audio_wav_base64": base64.b64encode(wav_bytes).decode("utf-8")}
+
+    # TTS corto (respuesta de chat típica) va antes que un turno de voz completo.
+    priority = PRIORITY_SHORT_TTS if len(req.text) <= settings.short_tts_chars else PRIORITY_VOICE
+    # Mismo presupuesto de etapa que el TTS del turno de voz: una síntesis trabada no retiene
+    # el slot de admisión, y Silero corta entre chunks al vencer el deadline o si el kiosco se va.
+    deadline = Deadline(settings.tts_timeout_sec, budgets=_stage_budgets())
+    stop_tts = threading.Event()
+
+    def synthesize() -> bytes:
+        return run_with_timeout(
+            lambda: voice_pipeline.tts_engine.synthesize(
+                req.text, should_stop=lambda: stop_tts.is_set() or deadline.expired
+            ),
+            stage_timeout(deadline, "tts"),
+        )
+
     try:
-        wav_bytes = voice_pipeline.tts_engine.synthesize(req.text)
+        async with _admitted("tts", priority, deadline):
+            wav_bytes = await _run_until_disconnect(request, deadline, synthesize)
         if req.as_base64:
             return {"audio_wav_base64": base64.b64encode(wav_bytes).decode("utf-8")}
         return JSONResponse(content={"audio_wav_base64": base64.b64encode(wav_bytes).decode("utf-8")})
+    except HTTPException:
+        stop_tts.set()
+        raise
+    except DeadlineExceeded as e:
+        stop_tts.set()
+        metrics.inc("tts.timeouts")
+        raise HTTPException(status_code=504, detail=f"La síntesis de audio excedió el tiempo disponible: {e}")
     except Exception as e:
+        stop_tts.set()
         raise HTTPException(status_code=503, detail=f"No fue posible sintetizar audio: {e}")
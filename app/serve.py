@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import random
+import signal
+import socket
+import sys
+import time
+import traceback
+from typing import Dict
+
+from natubot_core.settings import get_settings
+
+# Un worker que muere antes de esto se reinicia con espera (evita un loop de crashes).
+MIN_UPTIME_SEC = 5.0
+
+
+def _log(msg: str) -> None:
+    print(f"[serve {os.getpid()}] {msg}", file=sys.stderr, flush=True)
+
+
+def _torch_threads(settings, workers: int) -> int:
+    if settings.torch_num_threads > 0:
+        return settings.torch_num_threads
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def _preload(settings) -> None:
+    """
+    Carga Vosk y Silero en el maestro. torch queda con 1 hilo mientras tanto: si el pool de
+    OpenMP ya existe al forkear, los hijos heredan un runtime con hilos que no existen y se
+    cuelgan en la primera operación paralela. Cada worker fija sus hilos después del fork.
+    """
+    import torch
+
+    torch.set_num_threads(1)
+    from app.speech import preload_voice_pipeline
+
+    started = time.time()
+    try:
+        pipeline = preload_voice_pipeline(settings)
+    except Exception as e:
+        _log(f"precarga de voz falló, cada worker la intentará por su cuenta: {e}")
+        return
+    _log(
+        f"modelos precargados en {time.time() - started:.1f}s "
+        f"(vosk={'sí' if pipeline.stt_router.local_engine is not None else 'no'}, "
+        f"tts={type(pipeline.tts_engine).__name__})"
+    )
+
+
+def _listen(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket, args: argparse.Namespace, torch_threads: int) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Tras el fork todos los hijos tienen el mismo estado de `random` (muestreo del profiler).
+    random.seed()
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(torch_threads)
+
+    import uvicorn
+
+    # app.main se importa aquí, ya en el hijo: clientes de Gemini/Pinecone (gRPC), pools de
+    # hilos, prober y logger son de cada proceso; los modelos vienen del maestro.
+    config = uvicorn.Config("app.main:app", log_level=args.log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(
+        description="Servidor preforked: carga los modelos de voz una vez y forkea los workers (copy-on-write)"
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=settings.serve_workers)
+    parser.add_argument(
+        "--no-preload",
+        dest="preload",
+        action="store_false",
+        default=settings.serve_preload,
+        help="Cada worker carga sus modelos (para comparar memoria)",
+    )
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0, help="Segundos antes de matar workers al apagar")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        raise SystemExit("El modo preforked necesita fork (Linux/macOS); en Windows usa uvicorn app.main:app.")
+
+    workers = max(1, args.workers)
+    torch_threads = _torch_threads(settings, workers)
+    if args.preload:
+        _preload(settings)
+    if "app.main" in sys.modules:
+        # Sus clientes y pools quedarían compartidos (y rotos) entre los hijos.
+        raise RuntimeError("app.main no debe importarse en el proceso maestro antes del fork.")
+    if workers > 1:
+        _log(
+            "aviso: sesiones, rate limit, cachés y jobs de audio (VOICE_AUDIO_ASYNC) viven en la "
+            "memoria de cada worker"
+        )
+
+    sock = _listen(args.host, args.port)
+    # Lo cargado hasta aquí pasa a la generación permanente: el GC de los hijos no lo recorre
+    # ni lo escribe, así sus páginas siguen compartidas.
+    gc.collect()
+    gc.freeze()
+
+    children: Dict[int, tuple] = {}
+    stopping = False
+
+    def spawn(index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(sock, args, torch_threads)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = (index, time.monotonic())
+
+    def on_signal(signum, _frame) -> None:
+        nonlocal stopping
+        if not stopping:
+            _log(f"señal {signum}: apagando {len(children)} workers")
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+
+    _log(
+        f"escuchando en {args.host}:{args.port} con {workers} workers "
+        f"(precarga={'sí' if args.preload else 'no'}, torch_threads={torch_threads})"
+    )
+    for i in range(workers):
+        spawn(i)
+
+    kill_at = None
+    while children:
+        if stopping:
+            kill_at = kill_at or time.monotonic() + args.graceful_timeout
+            if time.monotonic() > kill_at:
+                for pid in list(children):
+                    os.kill(pid, signal.SIGKILL)
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                time.sleep(0.1)
+                continue
+        else:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+        entry = children.pop(pid, None)
+        if entry is None or stopping:
+            continue
+        index, started = entry
+        _log(f"worker {index} (pid {pid}) terminó con estado {os.waitstatus_to_exitcode(status)}; reiniciando")
+        if time.monotonic() - started < MIN_UPTIME_SEC:
+            time.sleep(MIN_UPTIME_SEC)
+        if not stopping:
+            spawn(index)
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,26 @@
-from .pipeline import VoiceTurnPipeline, VoicePipelineResult, build_voice_pipeline
+from .audio_utils import AudioTooLong
+from .pipeline import (
+    ChatReply,
+    VoicePipelineResult,
+    VoiceTurnPipeline,
+    build_voice_pipeline,
+    preload_voice_pipeline,
+    preloaded_voice_pipeline,
+)
+from .tts_jobs import TTSJob, TTSJobStore
+from .upload import UploadTooLarge, VoiceUpload, read_voice_upload
 
-__all__ = ["VoiceTurnPipeline", "VoicePipelineResult", "build_voice_pipeline"]
+__all__ = [
+    "AudioTooLong",
+    "ChatReply",
+    "TTSJob",
+    "TTSJobStore",
+    "UploadTooLarge",
+    "VoiceTurnPipeline",
+    "VoicePipelineResult",
+    "VoiceUpload",
+    "build_voice_pipeline",
+    "preload_voice_pipeline",
+    "preloaded_voice_pipeline",
+    "read_voice_upload",
+]
@@ -5,7 +5,7 @@ import subprocess
 import tempfile
 import wave
 from pathlib import Path
-from typing import Tuple
+from typing import Optional, Tuple
 
 import numpy as np
 
@@ -13,6 +13,43 @@ TARGET_SAMPLE_RATE = 16000
 TARGET_SAMPLE_WIDTH = 2
 TARGET_CHANNELS = 1
 
+# PCM crudo del kiosco (AudioWorklet): int16 little-endian, sin header.
+# Content-Type: "audio/pcm;rate=16000;channels=1"
+RAW_PCM_MIME = "audio/pcm"
+
+
+class AudioTooLong(ValueError):
+    def __init__(self, duration_sec: float, max_duration_sec: float):
+        super().__init__(f"Audio de {duration_sec:.1f}s supera el máximo de {max_duration_sec:.0f}s por turno.")
+        self.duration_sec = duration_sec
+        self.max_duration_sec = max_duration_sec
+
+
+def _check_duration(frames: int, sample_rate: int, max_duration_sec: Optional[float]) -> None:
+    if max_duration_sec is None or sample_rate <= 0:
+        return
+    duration = frames / float(sample_rate)
+    if duration > max_duration_sec:
+        raise AudioTooLong(duration, max_duration_sec)
+
+
+def parse_raw_pcm_content_type(content_type: Optional[str]) -> Optional[Tuple[int, int]]:
+    """(sample_rate, channels) si el content type declara PCM crudo; None en otro caso."""
+    if not content_type:
+        return None
+    parts = [p.strip().lower() for p in content_type.split(";")]
+    if parts[0] not in {RAW_PCM_MIME, "audio/x-pcm"}:
+        return None
+    params = dict(p.split("=", 1) for p in parts[1:] if "=" in p)
+    try:
+        rate = int(params.get("rate", TARGET_SAMPLE_RATE))
+        channels = int(params.get("channels", TARGET_CHANNELS))
+    except ValueError:
+        raise RuntimeError(f"Content-Type PCM inválido: {content_type}")
+    if rate <= 0 or channels <= 0:
+        raise RuntimeError(f"Content-Type PCM inválido: {content_type}")
+    return rate, channels
+
 
 def _pcm_bytes_to_float32(pcm_bytes: bytes, sample_width: int) -> np.ndarray:
     if not pcm_bytes:
@@ -64,11 +101,26 @@ def _resample_float32(samples: np.ndarray, src_rate: int, dst_rate: int) -> np.n
     return np.interp(x_new, x_old, samples).astype(np.float32)
 
 
-def decode_audio_to_pcm(audio_bytes: bytes, source_name: str = "audio.wav") -> Tuple[bytes, int, int, int]:
+def decode_audio_to_pcm(
+    audio_bytes: bytes,
+    source_name: str = "audio.wav",
+    content_type: Optional[str] = None,
+    max_duration_sec: Optional[float] = None,
+) -> Tuple[bytes, int, int, int]:
     """
     Return tuple: (pcm_bytes, sample_rate, sample_width, channels).
-    Supports WAV natively and falls back to ffmpeg for other formats.
+    Raw PCM (content_type "audio/pcm;rate=...;channels=...") passes through with no decode,
+    WAV is parsed natively and anything else falls back to ffmpeg.
+    With max_duration_sec, raises AudioTooLong before materializing the frames when possible.
     """
+    raw = parse_raw_pcm_content_type(content_type)
+    if raw is not None:
+        rate, channels = raw
+        frame = TARGET_SAMPLE_WIDTH * channels
+        usable = (len(audio_bytes) // frame) * frame
+        _check_duration(usable // frame, rate, max_duration_sec)
+        return audio_bytes[:usable], rate, TARGET_SAMPLE_WIDTH, channels
+
     header = audio_bytes[:12]
     is_wav = header[:4] == b"RIFF" and header[8:12] == b"WAVE"
 
@@ -77,6 +129,7 @@ def decode_audio_to_pcm(audio_bytes: bytes, source_name: str = "audio.wav") -> T
             channels = wf.getnchannels()
             sample_rate = wf.getframerate()
             sample_width = wf.getsampwidth()
+            _check_duration(wf.getnframes(), sample_rate, max_duration_sec)
             frames = wf.readframes(wf.getnframes())
             return frames, sample_rate, sample_width, channels
 
@@ -94,6 +147,11 @@ def decode_audio_to_pcm(audio_bytes: bytes, source_name: str = "audio.wav") -> T
             "-y",
             "-i",
             str(src_path),
+        ]
+        if max_duration_sec is not None:
+            # Corta la decodificación apenas pasado el tope: basta para detectar el exceso.
+            cmd += ["-t", f"{max_duration_sec + 0.5:.2f}"]
+        cmd += [
             "-ac",
             "1",
             "-ar",
@@ -109,6 +167,7 @@ def decode_audio_to_pcm(audio_bytes: bytes, source_name: str = "audio.wav") -> T
             channels = wf.getnchannels()
             sample_rate = wf.getframerate()
             sample_width = wf.getsampwidth()
+            _check_duration(wf.getnframes(), sample_rate, max_duration_sec)
             frames = wf.readframes(wf.getnframes())
             return frames, sample_rate, sample_width, channels
     finally:
@@ -124,6 +183,10 @@ def ensure_pcm16_mono_16k(
     channels: int,
     target_sample_rate: int = TARGET_SAMPLE_RATE,
 ) -> bytes:
+    if sample_width == TARGET_SAMPLE_WIDTH and channels == TARGET_CHANNELS and sample_rate == target_sample_rate:
+        # Ya está en el formato del pipeline (ej. PCM del AudioWorklet): sin conversión.
+        return pcm_bytes[: len(pcm_bytes) - (len(pcm_bytes) % TARGET_SAMPLE_WIDTH)]
+
     samples = _pcm_bytes_to_float32(pcm_bytes, sample_width)
 
     if channels > 1 and samples.size > 0:
@@ -144,8 +207,16 @@ def pcm16_to_wav_bytes(pcm_bytes: bytes, sample_rate: int = TARGET_SAMPLE_RATE)
     return bio.getvalue()
 
 
-def normalize_audio_bytes(audio_bytes: bytes, source_name: str = "audio.wav", target_sample_rate: int = TARGET_SAMPLE_RATE) -> bytes:
-    pcm, sr, sw, ch = decode_audio_to_pcm(audio_bytes, source_name=source_name)
+def normalize_audio_bytes(
+    audio_bytes: bytes,
+    source_name: str = "audio.wav",
+    target_sample_rate: int = TARGET_SAMPLE_RATE,
+    content_type: Optional[str] = None,
+    max_duration_sec: Optional[float] = None,
+) -> bytes:
+    pcm, sr, sw, ch = decode_audio_to_pcm(
+        audio_bytes, source_name=source_name, content_type=content_type, max_duration_sec=max_duration_sec
+    )
     return ensure_pcm16_mono_16k(
         pcm,
         sample_rate=sr,
@@ -1,13 +1,17 @@
 from __future__ import annotations
 
-from typing import Protocol
+from typing import Callable, Optional, Protocol
 
 
 class STTEngine(Protocol):
-    def transcribe(self, audio_pcm_16k_mono_bytes: bytes) -> str:
+    def transcribe(
+        self,
+        audio_pcm_16k_mono_bytes: bytes,
+        on_partial: Optional[Callable[[str], None]] = None,
+    ) -> str:
         ...
 
 
 class TTSEngine(Protocol):
-    def synthesize(self, text: str) -> bytes:
+    def synthesize(self, text: str, should_stop: Optional[Callable[[], bool]] = None) -> bytes:
         ...
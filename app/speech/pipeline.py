@@ -1,24 +1,29 @@
 from __future__ import annotations
 
+import threading
 import time
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
 
 from natubot_core.logging_utils import log_event
+from natubot_core.resilience import Deadline, RequestCancelled, run_with_timeout, stage_timeout
+from natubot_core.settings import PROJECT_ROOT
 
-from .audio_utils import normalize_audio_bytes, pcm16_to_wav_bytes
+from .audio_utils import normalize_audio_bytes, parse_raw_pcm_content_type, pcm16_to_wav_bytes
 from .interfaces import STTEngine, TTSEngine
 from .stt_azure import AzureSTT
 from .stt_vosk import VoskSTT
 from .tts_silero import SileroTTS
 from .vad import VADConfig, trim_to_speech
+from .vocabulary import load_grammar
 
 
 class _UnavailableTTS:
     def __init__(self, reason: str):
         self.reason = reason
 
-    def synthesize(self, text: str) -> bytes:
+    def synthesize(self, text: str, should_stop=None) -> bytes:
         raise RuntimeError(self.reason)
 
 
@@ -33,7 +38,25 @@ class STTRouter:
         self.local_engine = local_engine
         self.azure_engine = azure_engine
 
-    def transcribe(self, *, wav_bytes: bytes, pcm16_mono: bytes) -> Dict[str, Any]:
+    def status(self) -> Dict[str, Any]:
+        if self.mode in {"off", "disabled", "none"}:
+            return {"mode": self.mode, "local": False, "azure": False}
+        if self.local_engine is None and self.azure_engine is None:
+            raise RuntimeError("STT sin motores disponibles (ni Vosk local ni Azure).")
+        return {
+            "mode": self.mode,
+            "local": self.local_engine is not None,
+            "azure": self.azure_engine is not None,
+        }
+
+    def transcribe(
+        self,
+        *,
+        wav_bytes: bytes,
+        pcm16_mono: bytes,
+        on_partial: Optional[Callable[[str], None]] = None,
+    ) -> Dict[str, Any]:
+        """`on_partial` solo aplica a Vosk (Azure devuelve el transcript de una vez)."""
         fallback_used = False
 
         if self.mode in {"off", "disabled", "none"}:
@@ -42,7 +65,7 @@ class STTRouter:
         if self.mode in {"local", "vosk"}:
             if self.local_engine is not None:
                 try:
-                    text = self.local_engine.transcribe(pcm16_mono)
+                    text = self.local_engine.transcribe(pcm16_mono, on_partial=on_partial)
                     return {
                         "text": text,
                         "stt_mode_used": "local",
@@ -81,7 +104,7 @@ class STTRouter:
             if self.local_engine is None:
                 raise RuntimeError("Azure STT falló y no hay Vosk local para fallback.")
 
-            text = self.local_engine.transcribe(pcm16_mono)
+            text = self.local_engine.transcribe(pcm16_mono, on_partial=on_partial)
             return {
                 "text": text,
                 "stt_mode_used": "local",
@@ -91,6 +114,18 @@ class STTRouter:
         raise RuntimeError(f"STT_MODE no soportado: {self.mode}. Usa 'local' o 'azure'.")
 
 
+@dataclass
+class ChatReply:
+    """
+    Respuesta del chat_callable; `audio_wav` precalculado evita la síntesis TTS.
+    `spoken_text` (perfil de voz) es lo que se sintetiza; `text` va completo a pantalla.
+    """
+
+    text: str
+    audio_wav: Optional[bytes] = None
+    spoken_text: Optional[str] = None
+
+
 @dataclass
 class VoicePipelineResult:
     stt_text: str
@@ -102,13 +137,46 @@ class VoicePipelineResult:
     llm_latency_ms: int
     tts_latency_ms: int
     tts_error: Optional[str] = None
+    decode_latency_ms: int = 0
+    vad_latency_ms: int = 0
+    input_audio_ms: int = 0
+    speech_audio_ms: int = 0
+    spoken_text: Optional[str] = None
 
 
 class VoiceTurnPipeline:
-    def __init__(self, stt_router: STTRouter, tts_engine: TTSEngine, vad_config: VADConfig):
+    # Holgura sobre el tope de turno: el recorder se detiene unos ms después de MAX_TURN_MS.
+    TURN_GRACE_SEC = 1.0
+
+    def __init__(
+        self,
+        stt_router: STTRouter,
+        tts_engine: TTSEngine,
+        vad_config: VADConfig,
+        max_turn_sec: Optional[float] = None,
+        answer_profile: str = "voice",
+    ):
         self.stt_router = stt_router
         self.tts_engine = tts_engine
         self.vad_config = vad_config
+        self.max_turn_sec = max_turn_sec
+        # Se pasa al chat_callable: "voice" pide respuesta hablada corta + texto de pantalla.
+        self.answer_profile = answer_profile
+
+    def check_stt(self, deep: bool = False) -> Dict[str, Any]:
+        status = self.stt_router.status()
+        if deep and self.stt_router.local_engine is not None:
+            # 300 ms de silencio: ejercita el recognizer sin depender de audio real.
+            silence = b"\x00\x00" * int(self.vad_config.sample_rate * 0.3)
+            self.stt_router.local_engine.transcribe(silence)
+        return status
+
+    def check_tts(self, deep: bool = False) -> Dict[str, Any]:
+        if isinstance(self.tts_engine, _UnavailableTTS):
+            raise RuntimeError(self.tts_engine.reason)
+        if deep:
+            self.tts_engine.synthesize("Hola.")
+        return {"engine": type(self.tts_engine).__name__}
 
     def run_turn(
         self,
@@ -118,39 +186,102 @@ class VoiceTurnPipeline:
         include_audio: bool,
         chat_callable,
         logger,
+        deadline: Optional[Deadline] = None,
+        session_id: Optional[str] = None,
+        content_type: Optional[str] = None,
+        on_partial: Optional[Callable[[str], None]] = None,
+        defer_tts: bool = False,
+        client_trimmed: bool = False,
     ) -> VoicePipelineResult:
-        pcm = normalize_audio_bytes(audio_bytes, source_name=source_name, target_sample_rate=self.vad_config.sample_rate)
-        processed_pcm = trim_to_speech(pcm, self.vad_config)
+        """
+        Con `defer_tts` el turno termina con el texto: no sintetiza (el caller encola el TTS,
+        ver TTSJobStore) y `audio_wav` solo trae el audio precalculado si lo hay.
+        `client_trimmed`: el kiosco ya cortó el silencio con su VAD; no se vuelve a recortar.
+        """
+        decode_start = time.time()
+        pcm = normalize_audio_bytes(
+            audio_bytes,
+            source_name=source_name,
+            target_sample_rate=self.vad_config.sample_rate,
+            content_type=content_type,
+            max_duration_sec=(self.max_turn_sec + self.TURN_GRACE_SEC) if self.max_turn_sec else None,
+        )
+        decode_latency_ms = int((time.time() - decode_start) * 1000)
+        vad_start = time.time()
+        processed_pcm = pcm if client_trimmed else trim_to_speech(pcm, self.vad_config)
+        vad_latency_ms = int((time.time() - vad_start) * 1000)
+        bytes_per_ms = self.vad_config.sample_rate * 2 / 1000.0
+        input_audio_ms = int(len(pcm) / bytes_per_ms)
+        speech_audio_ms = int(len(processed_pcm) / bytes_per_ms)
         wav_16k = pcm16_to_wav_bytes(processed_pcm, sample_rate=self.vad_config.sample_rate)
 
+        if deadline is not None:
+            deadline.check("stt")
         stt_start = time.time()
-        stt_res = self.stt_router.transcribe(wav_bytes=wav_16k, pcm16_mono=processed_pcm)
+        stt_res = self.stt_router.transcribe(wav_bytes=wav_16k, pcm16_mono=processed_pcm, on_partial=on_partial)
         stt_latency_ms = int((time.time() - stt_start) * 1000)
         stt_text = (stt_res.get("text") or "").strip()
 
+        if deadline is not None:
+            deadline.check("llm")
         llm_start = time.time()
-        bot_text = chat_callable(stt_text)
+        chat_kwargs: Dict[str, Any] = {"answer_profile": self.answer_profile}
+        if session_id:
+            chat_kwargs["session_id"] = session_id
+        reply = chat_callable(stt_text, **chat_kwargs)
+        if not isinstance(reply, ChatReply):
+            reply = ChatReply(text=reply)
+        bot_text = reply.text
+        tts_text = reply.spoken_text or bot_text
         llm_latency_ms = int((time.time() - llm_start) * 1000)
 
         tts_latency_ms = 0
         wav_out = None
         tts_error = None
-        if include_audio:
+        if include_audio and reply.audio_wav is not None:
+            wav_out = reply.audio_wav
+        elif include_audio and not defer_tts:
             tts_start = time.time()
+            stop_tts = threading.Event()
+
+            def should_stop() -> bool:
+                return stop_tts.is_set() or (deadline is not None and deadline.expired)
+
             try:
-                wav_out = self.tts_engine.synthesize(bot_text)
+                wav_out = run_with_timeout(
+                    lambda: self.tts_engine.synthesize(tts_text, should_stop=should_stop),
+                    stage_timeout(deadline, "tts"),
+                )
+            except RequestCancelled:
+                stop_tts.set()
+                raise
             except Exception as e:
+                stop_tts.set()
                 tts_error = str(e)
             tts_latency_ms = int((time.time() - tts_start) * 1000)
 
         payload = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
             "event": "voice_turn",
+            "session_id": session_id,
+            "upload_bytes": len(audio_bytes),
+            "raw_pcm_upload": parse_raw_pcm_content_type(content_type) is not None,
+            "decode_latency_ms": decode_latency_ms,
+            "vad_latency_ms": vad_latency_ms,
+            "client_trimmed": client_trimmed,
+            "input_audio_ms": input_audio_ms,
+            "speech_audio_ms": speech_audio_ms,
             "stt_mode_used": stt_res.get("stt_mode_used"),
             "fallback_used": stt_res.get("fallback_used", False),
             "stt_latency_ms": stt_latency_ms,
             "llm_latency_ms": llm_latency_ms,
             "tts_latency_ms": tts_latency_ms,
             "tts_error": tts_error,
+            "tts_deferred": include_audio and defer_tts and reply.audio_wav is None,
+            "prerendered_audio": reply.audio_wav is not None,
+            "answer_profile": self.answer_profile,
+            "bot_chars": len(bot_text),
+            "tts_chars": len(tts_text),
         }
         log_event(logger, payload)
 
@@ -164,14 +295,59 @@ class VoiceTurnPipeline:
             llm_latency_ms=llm_latency_ms,
             tts_latency_ms=tts_latency_ms,
             tts_error=tts_error,
+            decode_latency_ms=decode_latency_ms,
+            vad_latency_ms=vad_latency_ms,
+            input_audio_ms=input_audio_ms,
+            speech_audio_ms=speech_audio_ms,
+            spoken_text=reply.spoken_text,
         )
 
 
+def _vosk_grammar(settings) -> Optional[List[str]]:
+    if not settings.vosk_grammar_enabled:
+        return None
+    path = Path(settings.vosk_vocabulary_path)
+    if not path.is_absolute():
+        path = PROJECT_ROOT / path
+    if not path.exists():
+        return None
+    try:
+        return load_grammar(path) or None
+    except Exception:
+        return None
+
+
+# Pipeline cargado por el proceso maestro de app/serve.py antes de forkear los workers.
+_preloaded: Optional[VoiceTurnPipeline] = None
+
+
+def preload_voice_pipeline(settings) -> VoiceTurnPipeline:
+    """
+    Carga Vosk y Silero una sola vez en el proceso maestro: los workers forkeados heredan los
+    pesos (solo lectura) como páginas compartidas copy-on-write en vez de cargar su copia.
+    """
+    global _preloaded
+    _preloaded = build_voice_pipeline(settings)
+    return _preloaded
+
+
+def preloaded_voice_pipeline() -> Optional[VoiceTurnPipeline]:
+    return _preloaded
+
+
 def build_voice_pipeline(settings) -> VoiceTurnPipeline:
     local_stt: Optional[VoskSTT] = None
     if settings.stt_mode not in {"off", "disabled", "none"}:
         try:
-            local_stt = VoskSTT(settings.vosk_model_path, sample_rate=settings.audio_sample_rate)
+            local_stt = VoskSTT(
+                settings.vosk_model_path,
+                sample_rate=settings.audio_sample_rate,
+                chunk_bytes=settings.vosk_chunk_bytes,
+                grammar=_vosk_grammar(settings),
+                grammar_min_confidence=settings.vosk_grammar_min_confidence,
+                grammar_max_unk_ratio=settings.vosk_grammar_max_unk_ratio,
+                grammar_parallel=settings.vosk_grammar_parallel,
+            )
         except Exception:
             local_stt = None
 
@@ -209,4 +385,10 @@ def build_voice_pipeline(settings) -> VoiceTurnPipeline:
         sample_rate=settings.audio_sample_rate,
     )
 
-    return VoiceTurnPipeline(stt_router=stt_router, tts_engine=tts_engine, vad_config=vad_cfg)
+    return VoiceTurnPipeline(
+        stt_router=stt_router,
+        tts_engine=tts_engine,
+        vad_config=vad_cfg,
+        max_turn_sec=settings.voice_max_turn_sec,
+        answer_profile=settings.voice_answer_profile,
+    )
@@ -2,30 +2,144 @@ from __future__ import annotations
 
 import json
 from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
 
 from vosk import KaldiRecognizer, Model
 
+from natubot_core.metrics import metrics
+
+_UNK = "[unk]"
+
+
+class _Decoding:
+    """Un KaldiRecognizer y lo que lleva acumulado (segmentos cerrados y confianza por palabra)."""
+
+    def __init__(self, recognizer: KaldiRecognizer):
+        self.recognizer = recognizer
+        # Cuando AcceptWaveform cierra un segmento (pausa larga), su texto solo está en
+        # Result(): FinalResult() devuelve únicamente el último segmento.
+        self.segments: List[str] = []
+        self.confidences: List[float] = []
+
+    def _close_segment(self, raw: str) -> None:
+        payload = json.loads(raw or "{}")
+        text = (payload.get("text") or "").strip()
+        if text:
+            self.segments.append(text)
+        self.confidences.extend(float(w.get("conf", 0.0)) for w in payload.get("result") or [])
+
+    def accept(self, chunk: bytes) -> bool:
+        """True si el chunk cerró un segmento."""
+        if self.recognizer.AcceptWaveform(chunk):
+            self._close_segment(self.recognizer.Result())
+            return True
+        return False
+
+    def transcript(self, closed: bool) -> str:
+        """Segmentos cerrados + parcial en curso, sin `[unk]`."""
+        partial = "" if closed else (json.loads(self.recognizer.PartialResult() or "{}").get("partial") or "").strip()
+        return " ".join(w for w in " ".join(self.segments + [partial]).split() if w != _UNK)
+
+    def finish(self) -> Tuple[str, List[float]]:
+        """(texto, confianza por palabra; vacía sin gramática)."""
+        self._close_segment(self.recognizer.FinalResult())
+        return " ".join(self.segments), self.confidences
+
 
 class VoskSTT:
-    def __init__(self, model_path: str, sample_rate: int = 16000):
+    def __init__(
+        self,
+        model_path: str,
+        sample_rate: int = 16000,
+        chunk_bytes: int = 4000,
+        grammar: Optional[Sequence[str]] = None,
+        grammar_min_confidence: float = 0.75,
+        grammar_max_unk_ratio: float = 0.2,
+        grammar_parallel: bool = False,
+    ):
+        """
+        Con `grammar` (frases del catálogo, ver app/speech/vocabulary.py) se decodifica primero
+        con vocabulario restringido; si la confianza media de las palabras queda bajo
+        `grammar_min_confidence` o hay demasiados `[unk]`, se re-decodifica el clip con
+        vocabulario abierto. `grammar_parallel` alimenta ambos reconocedores en la misma pasada:
+        el fallback no agrega latencia, pero cada turno paga el doble de CPU.
+        """
         path = Path(model_path)
         if not path.exists():
             raise RuntimeError(
                 f"Modelo Vosk no encontrado en {path}. Descárgalo en esa ruta o cambia VOSK_MODEL_PATH."
             )
         self.sample_rate = sample_rate
+        self.chunk_bytes = max(2, chunk_bytes - (chunk_bytes % 2))
         self.model = Model(str(path))
+        self.grammar_json = json.dumps(list(grammar), ensure_ascii=False) if grammar else None
+        self.grammar_min_confidence = grammar_min_confidence
+        self.grammar_max_unk_ratio = grammar_max_unk_ratio
+        self.grammar_parallel = grammar_parallel
+
+    def _recognizer(self, grammar_json: Optional[str]) -> _Decoding:
+        if grammar_json is not None:
+            recognizer = KaldiRecognizer(self.model, self.sample_rate, grammar_json)
+            recognizer.SetWords(True)
+        else:
+            recognizer = KaldiRecognizer(self.model, self.sample_rate)
+            recognizer.SetWords(False)
+        return _Decoding(recognizer)
 
-    def transcribe(self, audio_pcm_16k_mono_bytes: bytes) -> str:
+    def transcribe(
+        self,
+        audio_pcm_16k_mono_bytes: bytes,
+        on_partial: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        """
+        `on_partial` recibe el transcript acumulado (segmentos cerrados + parcial en curso)
+        después de cada chunk; se usa para lanzar el retrieval antes de que termine el STT.
+        """
         if not audio_pcm_16k_mono_bytes:
             return ""
-        recognizer = KaldiRecognizer(self.model, self.sample_rate)
-        recognizer.SetWords(False)
 
-        chunk = 4000
-        for i in range(0, len(audio_pcm_16k_mono_bytes), chunk):
-            recognizer.AcceptWaveform(audio_pcm_16k_mono_bytes[i : i + chunk])
+        restricted: Optional[_Decoding] = None
+        if self.grammar_json is not None:
+            try:
+                restricted = self._recognizer(self.grammar_json)
+            except Exception:
+                # Modelos grandes (grafo estático) no aceptan gramática en runtime.
+                restricted = None
+        if restricted is None:
+            return self._run(audio_pcm_16k_mono_bytes, [self._recognizer(None)], on_partial)[0].finish()[0]
+
+        # Los parciales salen solo del reconocedor restringido: el consumidor ve un transcript que
+        # solo crece y el fallback no los repite.
+        decodings = [restricted]
+        if self.grammar_parallel:
+            decodings.append(self._recognizer(None))
+        self._run(audio_pcm_16k_mono_bytes, decodings, on_partial)
+
+        text, confidences = restricted.finish()
+        words = text.split()
+        unk_ratio = words.count(_UNK) / len(words) if words else 1.0
+        mean_conf = sum(confidences) / len(confidences) if confidences else 0.0
+        if words and unk_ratio <= self.grammar_max_unk_ratio and mean_conf >= self.grammar_min_confidence:
+            metrics.inc("stt.grammar_hits")
+            return " ".join(w for w in words if w != _UNK)
+
+        # Fuera del catálogo o dudoso: vocabulario abierto.
+        metrics.inc("stt.grammar_fallbacks")
+        if self.grammar_parallel:
+            return decodings[1].finish()[0]
+        return self._run(audio_pcm_16k_mono_bytes, [self._recognizer(None)], None)[0].finish()[0]
 
-        final = recognizer.FinalResult()
-        payload = json.loads(final) if final else {}
-        return (payload.get("text") or "").strip()
+    def _run(
+        self,
+        pcm: bytes,
+        decodings: List[_Decoding],
+        on_partial: Optional[Callable[[str], None]],
+    ) -> List[_Decoding]:
+        """Una pasada por el audio; `on_partial` recibe el transcript del primer reconocedor."""
+        chunk = self.chunk_bytes
+        for i in range(0, len(pcm), chunk):
+            piece = pcm[i : i + chunk]
+            closed = [d.accept(piece) for d in decodings]
+            if on_partial is not None:
+                on_partial(decodings[0].transcript(closed[0]))
+        return decodings
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+from natubot_core.metrics import metrics
+
+LATENCY_MS_BUCKETS = (100, 250, 500, 1000, 2000, 3000, 5000, 8000, 12000, 20000)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+CANCELLED = "cancelled"
+_FINAL = {DONE, ERROR, CANCELLED}
+
+
+@dataclass
+class TTSJob:
+    id: str
+    owner: str
+    text: str
+    created: float
+    status: str = PENDING
+    audio_wav: Optional[bytes] = None
+    error: Optional[str] = None
+    finished: Optional[float] = None
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+    done_event: threading.Event = field(default_factory=threading.Event)
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        """`now` en el mismo reloj que `created` (el del store, ver TTSJobStore.snapshot)."""
+        return {
+            "id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "age_ms": int((now - self.created) * 1000),
+        }
+
+
+class TTSJobStore:
+    """
+    Síntesis en segundo plano para el turno de voz en dos fases: el turno responde con el
+    texto y un `job id`; el audio se sintetiza en `workers` hilos y el kiosco lo pide después.
+    - Un job nuevo (o `cancel_owner`) del mismo kiosco cancela sus jobs anteriores: el TTS
+      corta entre chunks (`should_stop`) y el resultado se descarta.
+    - Resultados y jobs terminados viven `ttl_sec`; como máximo `max_jobs` en memoria
+      (se descartan primero los más antiguos).
+
+    Métricas: tts_jobs.submitted / done / errors / cancelled / expired, histogramas
+    tts_jobs.queue_ms y tts_jobs.latency_ms (submit → audio listo).
+    """
+
+    def __init__(
+        self,
+        synthesize: Callable[..., bytes],
+        *,
+        workers: int = 1,
+        ttl_sec: float = 120.0,
+        max_jobs: int = 200,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.synthesize = synthesize
+        self.ttl_sec = ttl_sec
+        self.max_jobs = max(1, max_jobs)
+        self.clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="tts-job")
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, TTSJob]" = OrderedDict()
+        metrics.gauge("tts_jobs.pending", self.pending)
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.status not in _FINAL)
+
+    def submit(self, owner: str, text: str, audio_wav: Optional[bytes] = None) -> TTSJob:
+        """`audio_wav` precalculado (respuesta canónica) deja el job listo sin sintetizar."""
+        job = TTSJob(id=uuid.uuid4().hex, owner=owner, text=text, created=self.clock())
+        self.cancel_owner(owner)
+        with self._lock:
+            self._prune_locked()
+            self._jobs[job.id] = job
+        metrics.inc("tts_jobs.submitted")
+        if audio_wav is not None:
+            self._finish(job, DONE, audio_wav=audio_wav)
+        else:
+            self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str, owner: str) -> Optional[TTSJob]:
+        with self._lock:
+            self._prune_locked()
+            job = self._jobs.get(job_id)
+        return job if job is not None and job.owner == owner else None
+
+    def snapshot(self, job: TTSJob) -> Dict[str, Any]:
+        return job.snapshot(self.clock())
+
+    def cancel(self, job_id: str, owner: str) -> bool:
+        job = self.get(job_id, owner)
+        return job is not None and self._cancel(job)
+
+    def cancel_owner(self, owner: str) -> int:
+        with self._lock:
+            jobs = [j for j in self._jobs.values() if j.owner == owner and j.status not in _FINAL]
+        return sum(1 for j in jobs if self._cancel(j))
+
+    def shutdown(self) -> None:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for j in jobs:
+            self._cancel(j)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _cancel(self, job: TTSJob) -> bool:
+        job.cancel_event.set()
+        return self._finish(job, CANCELLED)
+
+    def _finish(self, job: TTSJob, status: str, *, audio_wav: Optional[bytes] = None, error: Optional[str] = None) -> bool:
+        with self._lock:
+            if job.status in _FINAL:
+                return False
+            job.status = status
+            job.audio_wav = audio_wav
+            job.error = error
+            job.finished = self.clock()
+        metrics.inc(f"tts_jobs.{'errors' if status == ERROR else status}")
+        if status == DONE:
+            metrics.observe("tts_jobs.latency_ms", (job.finished - job.created) * 1000.0, buckets=LATENCY_MS_BUCKETS)
+        job.done_event.set()
+        return True
+
+    def _run(self, job: TTSJob) -> None:
+        with self._lock:
+            if job.status != PENDING:
+                return
+            job.status = RUNNING
+        metrics.observe("tts_jobs.queue_ms", (self.clock() - job.created) * 1000.0, buckets=LATENCY_MS_BUCKETS)
+        try:
+            wav = self.synthesize(job.text, should_stop=job.cancel_event.is_set)
+        except Exception as e:
+            self._finish(job, ERROR, error=str(e))
+            return
+        if job.cancel_event.is_set():
+            return
+        self._finish(job, DONE, audio_wav=wav)
+
+    def _prune_locked(self) -> None:
+        now = self.clock()
+        for job_id, job in list(self._jobs.items()):
+            # Sin terminar también expira: nadie va a pedir un audio de hace `ttl_sec`.
+            if now - job.created > self.ttl_sec:
+                job.cancel_event.set()
+                del self._jobs[job_id]
+                metrics.inc("tts_jobs.expired")
+        while len(self._jobs) >= self.max_jobs:
+            _, job = self._jobs.popitem(last=False)
+            job.cancel_event.set()
+            metrics.inc("tts_jobs.expired")
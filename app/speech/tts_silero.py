@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import re
-from typing import List
+from typing import Callable, List, Optional
 
 import numpy as np
 import torch
@@ -86,13 +86,16 @@ class SileroTTS:
         samples = _resample_float32(samples, source_sr, self.target_sample_rate)
         return (samples * 32767.0).astype(np.int16).tobytes()
 
-    def synthesize(self, text: str) -> bytes:
+    def synthesize(self, text: str, should_stop: Optional[Callable[[], bool]] = None) -> bytes:
         chunks = self._chunk_text(text)
         if not chunks:
             return pcm16_to_wav_bytes(b"", sample_rate=self.target_sample_rate)
 
         pcm_parts = []
         for piece in chunks:
+            # Entre chunks: si el deadline venció, liberar CPU en vez de sintetizar para nadie.
+            if should_stop is not None and should_stop():
+                raise RuntimeError("TTS cancelado: deadline agotado.")
             try:
                 audio = self.model.apply_tts(text=piece, speaker=self.speaker, sample_rate=48000)
             except Exception as e:
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+import re
+import tempfile
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Optional
+
+from starlette.requests import Request
+
+# Campos no-audio del JSON (filename, top_k, session_id, pinecone_filter...): tope de tamaño.
+MAX_JSON_FIELDS_BYTES = 64 * 1024
+_AUDIO_KEY = re.compile(rb'"audio_base64"\s*:\s*"')
+
+
+class UploadTooLarge(ValueError):
+    def __init__(self, message: str, limit_bytes: int):
+        super().__init__(message)
+        self.limit_bytes = limit_bytes
+
+
+@dataclass
+class VoiceUpload:
+    audio: bytes
+    filename: str = "audio.wav"
+    content_type: Optional[str] = None
+    fields: Dict[str, Any] = field(default_factory=dict)
+
+
+class _Spool:
+    """Audio decodificado con tope de bytes; pasa a disco sobre `spool_bytes`."""
+
+    def __init__(self, max_bytes: int, spool_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.file = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+
+    def write(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.file.close()
+            raise UploadTooLarge(f"Audio supera el máximo de {self.max_bytes} bytes.", self.max_bytes)
+        self.file.write(data)
+
+    def read_all(self) -> bytes:
+        try:
+            self.file.seek(0)
+            return self.file.read()
+        finally:
+            self.file.close()
+
+
+class _Base64AudioJSONReader:
+    """
+    Parser incremental para {"audio_base64": "...", ...}: decodifica el base64 por bloques
+    de 4 caracteres a medida que llega (nunca guarda el string completo) y conserva el resto
+    del JSON, que es chico, para parsearlo al final.
+    """
+
+    def __init__(self, spool: _Spool):
+        self.spool = spool
+        self.state = "head"
+        self.head = b""
+        self.tail = b""
+        self.pending = b""
+
+    def _check_fields_size(self) -> None:
+        if len(self.head) + len(self.tail) > MAX_JSON_FIELDS_BYTES:
+            raise ValueError("campos JSON demasiado grandes o falta audio_base64")
+
+    def _feed_audio(self, data: bytes) -> None:
+        end = data.find(b'"')
+        part = data if end < 0 else data[:end]
+        # Escapes JSON válidos dentro de base64: "\/" y saltos de línea "\n" / "\r".
+        self.pending += part
+        keep = b""
+        if self.pending.endswith(b"\\"):
+            self.pending, keep = self.pending[:-1], b"\\"
+        self.pending = self.pending.replace(b"\\/", b"/").replace(b"\\n", b"").replace(b"\\r", b"")
+        usable = len(self.pending) - (len(self.pending) % 4)
+        if usable:
+            self._decode(self.pending[:usable])
+        self.pending = self.pending[usable:] + keep
+
+        if end >= 0:
+            if self.pending:
+                self._decode(self.pending + b"=" * (-len(self.pending) % 4))
+                self.pending = b""
+            self.state = "tail"
+            self.tail = data[end + 1:]
+            self._check_fields_size()
+
+    def _decode(self, chunk: bytes) -> None:
+        try:
+            self.spool.write(base64.b64decode(chunk, validate=True))
+        except binascii.Error as e:
+            raise ValueError(f"audio_base64 inválido: {e}")
+
+    def feed(self, data: bytes) -> None:
+        if self.state == "head":
+            self.head += data
+            m = _AUDIO_KEY.search(self.head)
+            if m is None:
+                self._check_fields_size()
+                return
+            rest = self.head[m.end():]
+            self.head = self.head[: m.start()]
+            self.state = "audio"
+            self._feed_audio(rest)
+        elif self.state == "audio":
+            self._feed_audio(data)
+        else:
+            self.tail += data
+            self._check_fields_size()
+
+    def finish(self) -> Dict[str, Any]:
+        if self.state != "tail":
+            raise ValueError("falta audio_base64 o el JSON está incompleto")
+        doc = json.loads(self.head + b'"audio_base64":""' + self.tail)
+        if not isinstance(doc, dict):
+            raise ValueError("se esperaba un objeto JSON")
+        doc.pop("audio_base64", None)
+        return doc
+
+
+def _check_declared_length(request: Request, max_body_bytes: int) -> None:
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_body_bytes:
+        raise UploadTooLarge(f"Solicitud supera el máximo de {max_body_bytes} bytes.", max_body_bytes)
+
+
+async def _limited_stream(request: Request, max_body_bytes: int) -> AsyncIterator[bytes]:
+    total = 0
+    async for chunk in request.stream():
+        total += len(chunk)
+        if total > max_body_bytes:
+            raise UploadTooLarge(f"Solicitud supera el máximo de {max_body_bytes} bytes.", max_body_bytes)
+        yield chunk
+
+
+async def read_voice_upload(request: Request, *, max_audio_bytes: int, spool_bytes: int) -> VoiceUpload:
+    """
+    Lee el audio de /api/voice/turn sin cargar el body completo en memoria:
+    - rechaza apenas Content-Length o los bytes leídos superan el tope,
+    - JSON: decodifica `audio_base64` en streaming hacia un spool (memoria → disco),
+    - multipart: Starlette ya guarda las partes en SpooledTemporaryFile; aquí se acota el body.
+    """
+    ctype = (request.headers.get("content-type") or "").lower()
+
+    if "application/json" in ctype:
+        # base64 infla 4/3 + margen para el resto de campos
+        max_body = (max_audio_bytes * 4) // 3 + 4 + MAX_JSON_FIELDS_BYTES
+        _check_declared_length(request, max_body)
+        spool = _Spool(max_audio_bytes, spool_bytes)
+        reader = _Base64AudioJSONReader(spool)
+        async for chunk in _limited_stream(request, max_body):
+            reader.feed(chunk)
+        fields = reader.finish()
+        return VoiceUpload(
+            audio=spool.read_all(),
+            filename=str(fields.get("filename") or "audio.wav"),
+            content_type=fields.get("content_type"),
+            fields=fields,
+        )
+
+    max_body = max_audio_bytes + MAX_JSON_FIELDS_BYTES
+    _check_declared_length(request, max_body)
+    received = 0
+
+    async def receive():
+        nonlocal received
+        message = await request.receive()
+        if message.get("type") == "http.request":
+            received += len(message.get("body", b""))
+            if received > max_body:
+                raise UploadTooLarge(f"Solicitud supera el máximo de {max_body} bytes.", max_body)
+        return message
+
+    form = await Request(request.scope, receive).form(max_files=2, max_fields=20)
+    try:
+        up = form.get("audio") or form.get("file")
+        if up is None or isinstance(up, str):
+            raise ValueError("Debes enviar archivo de audio en multipart/form-data (campo audio).")
+        audio = await up.read()
+        if len(audio) > max_audio_bytes:
+            raise UploadTooLarge(f"Audio supera el máximo de {max_audio_bytes} bytes.", max_audio_bytes)
+        fields = {k: v for k, v in form.items() if isinstance(v, str)}
+        return VoiceUpload(
+            audio=audio,
+            filename=up.filename or "audio.wav",
+            content_type=up.content_type,
+            fields=fields,
+        )
+    finally:
+        await form.close()
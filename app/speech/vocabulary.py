@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import json
+import re
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+# Frases frecuentes de kiosco (como las dice la gente, con tildes: el léxico de Vosk las usa).
+KIOSK_PHRASES = [
+    "hola", "buenos días", "buenas tardes", "gracias", "por favor", "natubot",
+    "qué es", "para qué sirve", "para qué sirven", "cómo se toma", "cómo se usa", "cómo lo tomo",
+    "cuántas veces al día", "cuánto tiempo", "antes o después de comer", "en ayunas", "en la noche",
+    "qué contraindicaciones tiene", "tiene efectos secundarios", "quién no debe tomarlo",
+    "puedo tomarlo si estoy embarazada", "lo pueden tomar los niños", "es natural",
+    "qué ingredientes tiene", "qué me recomiendas para", "tienes algo para", "cuánto cuesta",
+    "dónde lo compro", "sirve para", "me ayuda con", "dormir", "dormir mejor", "el estrés",
+    "la ansiedad", "la digestión", "el colesterol", "las articulaciones", "las defensas",
+    "la piel", "el cabello", "la presión", "el azúcar", "la energía", "bajar de peso",
+    "y", "o", "el", "la", "los", "las", "un", "una", "de", "del", "con", "para", "que", "qué",
+    "me", "mi", "se", "si", "sí", "no", "es", "este", "esta", "ese", "producto", "productos",
+]
+
+_WORD = re.compile(r"[a-záéíóúüñ0-9]+")
+
+
+def spoken_form(text: str) -> str:
+    """Minúsculas, sin puntuación ni marcas (™, ®, paréntesis); conserva tildes y ñ."""
+    return " ".join(_WORD.findall((text or "").lower()))
+
+
+def _as_list(value: Any) -> List[str]:
+    if isinstance(value, list):
+        return [str(v) for v in value if v]
+    if isinstance(value, str) and value.strip():
+        return [p for p in value.split(",") if p.strip()]
+    return []
+
+
+def build_vocabulary(
+    chunks: Iterable[Dict[str, Any]],
+    intents: Optional[Dict[str, Dict[str, Any]]] = None,
+    extra_phrases: Iterable[str] = (),
+    text_words: int = 300,
+) -> Dict[str, Any]:
+    """
+    Vocabulario del catálogo para la gramática de Vosk a partir de la metadata de los chunks
+    (formato rag_contract_v1): nombres de producto, ingredient_tags, health_goal_tags, las
+    `text_words` palabras más frecuentes de los textos, frases de kiosco y plantillas de intención.
+    """
+    products, ingredients, goals = set(), set(), set()
+    words: Counter = Counter()
+    versions: Counter = Counter()
+    for md in chunks:
+        name = spoken_form(md.get("product_name") or "")
+        if name and name != "unknown product name":
+            products.add(name)
+        ingredients.update(spoken_form(i) for i in _as_list(md.get("ingredient_tags")))
+        goals.update(spoken_form(g) for g in _as_list(md.get("health_goal_tags")))
+        words.update(w for w in _WORD.findall(str(md.get("text") or "").lower()) if len(w) > 2 and not w.isdigit())
+        versions[str(md.get("data_version") or "")] += 1
+
+    phrases = set(spoken_form(p) for p in KIOSK_PHRASES)
+    phrases.update(spoken_form(p) for p in extra_phrases)
+    for intent in (intents or {}).values():
+        question = str(intent.get("question") or "").replace("{product}", " ")
+        phrases.add(spoken_form(question))
+
+    grammar = set(products) | ingredients | goals | phrases
+    grammar.update(w for w, _ in words.most_common(text_words))
+    # Palabras sueltas de cada frase: la gramática encadena entradas, así "para qué sirve la X"
+    # sale de "para qué sirve" + "la" + "X" aunque la frase completa no esté listada.
+    for p in list(grammar):
+        grammar.update(p.split())
+    grammar.discard("")
+
+    return {
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "data_version": versions.most_common(1)[0][0] if versions else "",
+        "products": sorted(products),
+        "ingredients": sorted(i for i in ingredients if i),
+        "health_goals": sorted(g for g in goals if g),
+        "phrases": sorted(grammar),
+    }
+
+
+def save_vocabulary(vocab: Dict[str, Any], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(vocab, ensure_ascii=False, indent=1), encoding="utf-8")
+
+
+def load_grammar(path: Path) -> List[str]:
+    """Lista de frases para `KaldiRecognizer(model, rate, json.dumps(grammar))`, con `[unk]`."""
+    vocab = json.loads(Path(path).read_text(encoding="utf-8"))
+    phrases = [p for p in vocab.get("phrases") or [] if p]
+    return phrases + ["[unk]"] if phrases else []
@@ -0,0 +1,67 @@
+// AudioWorklet: captura el micrófono como PCM int16 mono a 16 kHz.
+// Si el AudioContext ya corre a 16 kHz (Chrome/Edge), solo convierte a int16.
+// Si no, baja la tasa promediando cada ventana de entrada (filtro box + decimación
+// fraccional), suficiente para voz y sin dependencias.
+const TARGET_RATE = 16000
+const POST_SAMPLES = 1600 // ~100 ms por mensaje al hilo principal
+
+class Pcm16CaptureProcessor extends AudioWorkletProcessor {
+  constructor() {
+    super()
+    this.ratio = sampleRate / TARGET_RATE
+    this.acc = 0
+    this.accCount = 0
+    this.pos = 0
+    this.out = new Int16Array(POST_SAMPLES)
+    this.outLen = 0
+    this.port.onmessage = (evt) => {
+      if (evt.data === 'flush') {
+        this.flush()
+        this.port.postMessage({ type: 'flushed' })
+      }
+    }
+  }
+
+  push(sample) {
+    const s = Math.max(-1, Math.min(1, sample))
+    this.out[this.outLen++] = s < 0 ? s * 0x8000 : s * 0x7fff
+    if (this.outLen === this.out.length) this.flush()
+  }
+
+  flush() {
+    if (this.outLen === 0) return
+    const chunk = this.out.slice(0, this.outLen)
+    this.port.postMessage({ type: 'pcm', buffer: chunk.buffer }, [chunk.buffer])
+    this.outLen = 0
+  }
+
+  process(inputs) {
+    const input = inputs[0]
+    if (!input || input.length === 0) return true
+
+    const channels = input.length
+    const frames = input[0].length
+    for (let i = 0; i < frames; i += 1) {
+      let mono = 0
+      for (let c = 0; c < channels; c += 1) mono += input[c][i]
+      mono /= channels
+
+      if (this.ratio <= 1) {
+        this.push(mono)
+        continue
+      }
+      this.acc += mono
+      this.accCount += 1
+      this.pos += 1
+      if (this.pos >= this.ratio) {
+        this.push(this.acc / this.accCount)
+        this.pos -= this.ratio
+        this.acc = 0
+        this.accCount = 0
+      }
+    }
+    return true
+  }
+}
+
+registerProcessor('pcm16-capture', Pcm16CaptureProcessor)
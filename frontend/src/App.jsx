@@ -3,9 +3,10 @@ import ReactMarkdown from 'react-markdown'
 import remarkGfm from 'remark-gfm'
 import { loadRuntimeConfig } from './config'
 import { makeApiClient } from './api'
-import { loadState, saveState, clearState } from './storage'
+import { loadState, saveState, clearState, loadAnswerBundle } from './storage'
+import { findLocalAnswer, localAnswerAudio, syncAnswerBundle } from './answerBundle'
 import { useAudioRecorder } from './hooks/useAudioRecorder'
-import { sendVoiceTurn } from './services/voiceApi'
+import { fetchVoiceAudio, sendVoiceTurn } from './services/voiceApi'
 import { base64ToBlob, blobToFile, playAudioFromBlob } from './utils/audio'
 
 function Header({ botName, kioskMeta, online }) {
@@ -78,6 +79,11 @@ function fmtMs(ms) {
   return `${mm}:${ss}`
 }
 
+function newSessionId() {
+  if (typeof crypto !== 'undefined' && crypto.randomUUID) return crypto.randomUUID()
+  return `s_${Date.now().toString(36)}_${Math.random().toString(36).slice(2, 10)}`
+}
+
 function ChatScreen({ api, config, termsVersion, kioskAuthReady, botName }) {
   const [message, setMessage] = useState('')
   const [busy, setBusy] = useState(false)
@@ -97,8 +103,26 @@ function ChatScreen({ api, config, termsVersion, kioskAuthReady, botName }) {
 
   const chatLogRef = useRef(null)
   const seededRef = useRef(false)
-
-  const recorder = useAudioRecorder()
+  // Sesión de conversación: el backend reutiliza contexto en preguntas de seguimiento.
+  const sessionIdRef = useRef(newSessionId())
+  // Espera del audio del turno anterior (turno en dos fases); se aborta al empezar otro.
+  const audioFetchRef = useRef(null)
+  // Respuestas frecuentes guardadas en IndexedDB (se responden sin request, también sin red).
+  const bundleRef = useRef(null)
+
+  // Mismo tope que aplica el backend: un turno más largo recibiría 413.
+  const maxTurnSec = Number(config?.speech?.max_turn_sec) || 20
+  // VAD en el kiosco: corta el turno tras `vad_end_silence_ms` de silencio y lo envía solo.
+  const clientVad = Boolean(config?.speech?.client_vad) && config?.speech?.vad_enabled !== false
+  const recorder = useAudioRecorder('auto', maxTurnSec * 1000, {
+    enabled: clientVad,
+    endSilenceMs: Number(config?.speech?.vad_end_silence_ms) || 800,
+    onAutoStop: (blob) => {
+      void submitVoiceTurn(blob)
+    },
+  })
+  // El backend responde con el texto apenas está listo y el audio llega después.
+  const audioAsync = Boolean(config?.speech?.audio_async)
   const isOnline = navigator.onLine
 
   useEffect(() => {
@@ -123,6 +147,30 @@ function ChatScreen({ api, config, termsVersion, kioskAuthReady, botName }) {
     if (recorder.error) setErr(recorder.error)
   }, [recorder.error])
 
+  const bundleSyncSec = Number(config?.answer_bundle?.sync_sec) || 900
+  useEffect(() => {
+    let cancelled = false
+    async function sync() {
+      if (!api || !kioskAuthReady || !navigator.onLine) return
+      try {
+        const next = await syncAnswerBundle(api, bundleRef.current)
+        if (!cancelled) bundleRef.current = next
+      } catch {}
+    }
+    ;(async () => {
+      const saved = await loadAnswerBundle()
+      if (!cancelled && !bundleRef.current) bundleRef.current = saved
+      await sync()
+    })()
+    const timer = setInterval(sync, Math.max(60, bundleSyncSec) * 1000)
+    window.addEventListener('online', sync)
+    return () => {
+      cancelled = true
+      clearInterval(timer)
+      window.removeEventListener('online', sync)
+    }
+  }, [api, kioskAuthReady, bundleSyncSec])
+
   const uiBusy = busy || voiceBusy || recorder.state === 'stopping'
 
   const micLabel = useMemo(() => {
@@ -143,8 +191,10 @@ Estoy aquí para ayudarte a conocer nuestros suplementos naturales.
   }
 
   function clearChat() {
+    audioFetchRef.current?.abort()
     setErr('')
     setMessage('')
+    sessionIdRef.current = newSessionId()
     setLog([buildWelcome()])
     setShowPlayLast(false)
     setLastAudioBlob(null)
@@ -162,8 +212,74 @@ Estoy aquí para ayudarte a conocer nuestros suplementos naturales.
     }
   }
 
+  async function playAudioJob(url) {
+    audioFetchRef.current?.abort()
+    const ctrl = new AbortController()
+    audioFetchRef.current = ctrl
+    try {
+      const audioB64 = await fetchVoiceAudio(url, ctrl.signal)
+      if (!audioB64 || ctrl.signal.aborted) return
+      const wavBlob = base64ToBlob(audioB64, 'audio/wav')
+      setLastAudioBlob(wavBlob)
+      setVoiceDiag((d) => ({ ...d, hadAudio: true, lastError: '' }))
+      await tryPlayBotAudio(wavBlob)
+    } catch (e) {
+      if (ctrl.signal.aborted) return
+      setVoiceDiag((d) => ({ ...d, hadAudio: false, lastError: `Audio de la respuesta no disponible: ${String(e.message || e)}` }))
+    }
+  }
+
+  async function speakAnswer(botAnswer) {
+    try {
+      const ttsRes = await api.post('/api/tts', { text: botAnswer, as_base64: true })
+      const audioB64 = String(ttsRes?.audio_wav_base64 || '').trim()
+      if (audioB64) {
+        const wavBlob = base64ToBlob(audioB64, 'audio/wav')
+        setLastAudioBlob(wavBlob)
+        setVoiceDiag((d) => ({ ...d, hadAudio: true, lastError: '' }))
+        await tryPlayBotAudio(wavBlob)
+      } else {
+        setVoiceDiag((d) => ({ ...d, hadAudio: false, lastError: 'El backend /api/tts respondió sin audio_wav_base64.' }))
+      }
+    } catch (ttsErr) {
+      const ttsMsg = `TTS en chat texto no disponible: ${String(ttsErr?.message || ttsErr)}`
+      setVoiceDiag((d) => ({ ...d, hadAudio: false, lastError: ttsMsg }))
+    }
+  }
+
+  async function answerLocally(q, local) {
+    setBusy(true)
+    try {
+      setLog((l) => [
+        ...l,
+        { who: 'Tú', text: q, source: 'text' },
+        { who: (botName || 'NatuBot'), text: local.answer, source: 'local' },
+      ])
+      setMessage('')
+      // El backend no vio este turno: un seguimiento abre sesión nueva en vez de usar contexto viejo.
+      sessionIdRef.current = newSessionId()
+
+      const audio = await localAnswerAudio(local)
+      if (audio) {
+        setLastAudioBlob(audio)
+        setVoiceDiag((d) => ({ ...d, hadAudio: true, lastError: '' }))
+        await tryPlayBotAudio(audio)
+      } else if (navigator.onLine) {
+        await speakAnswer(local.answer)
+      }
+    } finally {
+      setBusy(false)
+    }
+  }
+
   async function sendText() {
     setErr('')
+    const q = message.trim()
+    const local = q ? findLocalAnswer(bundleRef.current, q, termsVersion) : null
+    if (local) {
+      await answerLocally(q, local)
+      return
+    }
     if (!isOnline) {
       setErr(config?.offline_message || 'Sin internet. Este servicio no funciona sin conexión.')
       return
@@ -172,7 +288,6 @@ Estoy aquí para ayudarte a conocer nuestros suplementos naturales.
       setErr('Este kiosco no está configurado. Revisa public/kiosk-config.json.')
       return
     }
-    const q = message.trim()
     if (!q) return
 
     setBusy(true)
@@ -185,32 +300,64 @@ Estoy aquí para ayudarte a conocer nuestros suplementos naturales.
         accepted_terms: true,
         accepted_terms_version: termsVersion,
         top_k: 5,
+        session_id: sessionIdRef.current,
       }
 
       const res = await api.post('/chat', payload)
       const botAnswer = res.answer || '(sin respuesta)'
       setLog((l) => [...l, { who: (botName || 'NatuBot'), text: botAnswer, source: 'text' }])
+      await speakAnswer(botAnswer)
+    } catch (e) {
+      const msg = String(e.message || e)
+      setErr(msg)
+    } finally {
+      setBusy(false)
+    }
+  }
 
-      try {
-        const ttsRes = await api.post('/api/tts', { text: botAnswer, as_base64: true })
-        const audioB64 = String(ttsRes?.audio_wav_base64 || '').trim()
-        if (audioB64) {
-          const wavBlob = base64ToBlob(audioB64, 'audio/wav')
-          setLastAudioBlob(wavBlob)
-          setVoiceDiag((d) => ({ ...d, hadAudio: true, lastError: '' }))
-          await tryPlayBotAudio(wavBlob)
-        } else {
-          setVoiceDiag((d) => ({ ...d, hadAudio: false, lastError: 'El backend /api/tts respondió sin audio_wav_base64.' }))
-        }
-      } catch (ttsErr) {
-        const ttsMsg = `TTS en chat texto no disponible: ${String(ttsErr?.message || ttsErr)}`
-        setVoiceDiag((d) => ({ ...d, hadAudio: false, lastError: ttsMsg }))
+  async function submitVoiceTurn(blob) {
+    setVoiceBusy(true)
+    try {
+      const file = blobToFile(blob, blob.type.startsWith('audio/pcm') ? 'turn.pcm' : 'turn.webm')
+
+      const resp = await sendVoiceTurn({
+        audioFile: file,
+        includeAudio: true,
+        audioAsync,
+        clientVad: recorder.wasTrimmed(),
+        sessionId: sessionIdRef.current,
+      })
+
+      const userText = (resp.stt_text || '').trim() || '(no se detectó voz)'
+      const botText = (resp.bot_text || '').trim() || '(sin respuesta)'
+
+      setVoiceDiag({
+        hadAudio: Boolean(resp.audio_wav_base64),
+        autoplayBlocked: false,
+        lastError: resp.audio_wav_base64 || resp.audio_job ? '' : (resp.tts_error || 'El backend respondió sin audio_wav_base64.'),
+        sttMode: resp.stt_mode_used || '-',
+        fallback: Boolean(resp.fallback_used),
+      })
+
+      setLog((l) => [
+        ...l,
+        { who: 'Tú', text: userText, source: 'voice' },
+        { who: (botName || 'NatuBot'), text: botText, source: 'voice' },
+      ])
+
+      if (resp.audio_wav_base64) {
+        const wavBlob = base64ToBlob(resp.audio_wav_base64, 'audio/wav')
+        setLastAudioBlob(wavBlob)
+        await tryPlayBotAudio(wavBlob)
+      } else if (resp.audio_job) {
+        // Sin await: el texto ya está en pantalla y el botón queda libre mientras llega el audio.
+        void playAudioJob(resp.audio_job.url)
       }
     } catch (e) {
       const msg = String(e.message || e)
       setErr(msg)
     } finally {
-      setBusy(false)
+      setVoiceBusy(false)
     }
   }
 
@@ -234,36 +381,9 @@ Estoy aquí para ayudarte a conocer nuestros suplementos naturales.
       if (recorder.state === 'recording') {
         setVoiceBusy(true)
         const blob = await recorder.stop()
-        const file = blobToFile(blob, 'turn.webm')
-
-        const resp = await sendVoiceTurn({
-          audioFile: file,
-          includeAudio: true,
-        })
-
-        const userText = (resp.stt_text || '').trim() || '(no se detectó voz)'
-        const botText = (resp.bot_text || '').trim() || '(sin respuesta)'
-
-        setVoiceDiag({
-          hadAudio: Boolean(resp.audio_wav_base64),
-          autoplayBlocked: false,
-          lastError: resp.audio_wav_base64 ? '' : (resp.tts_error || 'El backend respondió sin audio_wav_base64.'),
-          sttMode: resp.stt_mode_used || '-',
-          fallback: Boolean(resp.fallback_used),
-        })
-
-        setLog((l) => [
-          ...l,
-          { who: 'Tú', text: userText, source: 'voice' },
-          { who: (botName || 'NatuBot'), text: botText, source: 'voice' },
-        ])
-
-        if (resp.audio_wav_base64) {
-          const wavBlob = base64ToBlob(resp.audio_wav_base64, 'audio/wav')
-          setLastAudioBlob(wavBlob)
-          await tryPlayBotAudio(wavBlob)
-        }
+        await submitVoiceTurn(blob)
       } else {
+        audioFetchRef.current?.abort()
         await recorder.start()
       }
     } catch (e) {
@@ -0,0 +1,68 @@
+import {
+  deleteBundleAudio,
+  listBundleAudio,
+  loadBundleAudio,
+  saveAnswerBundle,
+  saveBundleAudio,
+} from './storage'
+
+// Mismo criterio que natubot_core.sessions.normalize_text: las claves del bundle vienen de ahí.
+export function normalizeQuestion(text) {
+  return String(text || '')
+    .normalize('NFKD')
+    .replace(/[^\x00-\x7f]/g, '')
+    .toLowerCase()
+    .replace(/[^a-z0-9 ]+/g, ' ')
+    .replace(/\s+/g, ' ')
+    .trim()
+}
+
+function fromResponse(etag, body) {
+  const answers = {}
+  for (const a of body.answers || []) {
+    answers[a.q] = { answer: a.answer, citations: a.citations || [], audio: a.audio || null }
+  }
+  return {
+    etag,
+    version: body.version || '',
+    data_version: body.data_version || '',
+    terms_version: body.terms_version || '',
+    location: body.location || null,
+    synced_at: Date.now(),
+    answers,
+  }
+}
+
+// Baja los audios que falten (también tras un 304: una sincronización anterior pudo cortarse)
+// y borra los que ya no usa ninguna respuesta.
+async function syncAudio(api, bundle) {
+  const wanted = new Set(Object.values(bundle?.answers || {}).map((a) => a.audio?.sha).filter(Boolean))
+  const have = new Set(await listBundleAudio())
+  for (const sha of wanted) {
+    if (have.has(sha)) continue
+    try { await saveBundleAudio(sha, await api.getBlob(`/kiosk/bundle/audio/${sha}`)) } catch { break }
+  }
+  await deleteBundleAudio([...have].filter((sha) => !wanted.has(sha)))
+}
+
+// Revalida /kiosk/bundle con su ETag y devuelve el bundle vigente (el guardado si no cambió).
+export async function syncAnswerBundle(api, current) {
+  const res = await api.getIfChanged('/kiosk/bundle', current?.etag)
+  let bundle = current
+  if (res) {
+    bundle = fromResponse(res.etag, res.body)
+    await saveAnswerBundle(bundle)
+  }
+  await syncAudio(api, bundle)
+  return bundle
+}
+
+// Respuesta local para una pregunta frecuente, solo si el bundle se generó con los términos aceptados.
+export function findLocalAnswer(bundle, question, termsVersion) {
+  if (!bundle?.version || !termsVersion || bundle.terms_version !== termsVersion) return null
+  return bundle.answers[normalizeQuestion(question)] || null
+}
+
+export async function localAnswerAudio(answer) {
+  return answer?.audio?.sha ? loadBundleAudio(answer.audio.sha) : null
+}
@@ -1,3 +1,5 @@
+import { loadCachedResponse, saveCachedResponse } from './storage'
+
 export function makeApiClient(runtimeConfig) {
   const base = (runtimeConfig.apiBaseUrl || '').replace(/\/$/, '')
 
@@ -9,12 +11,45 @@ export function makeApiClient(runtimeConfig) {
   }
 
   async function get(path) {
-    const r = await fetch(base + path, { method: 'GET', headers: headers(), cache: 'no-store' })
+    const url = base + path
+    const cached = loadCachedResponse(url)
+    const extra = cached?.etag ? { 'If-None-Match': cached.etag } : {}
+
+    let r
+    try {
+      r = await fetch(url, { method: 'GET', headers: headers(extra), cache: 'no-store' })
+    } catch (e) {
+      if (cached) return cached.body
+      throw e
+    }
+    if (r.status === 304 && cached) return cached.body
+
     const j = await r.json().catch(() => ({}))
     if (!r.ok) throw new Error(j?.error || j?.detail || `HTTP ${r.status}`)
+    const etag = r.headers.get('ETag')
+    if (etag) saveCachedResponse(url, etag, j)
     return j
   }
 
+  // Revalidación sin guardar en localStorage (el bundle vive en IndexedDB): null si no cambió.
+  async function getIfChanged(path, etag) {
+    const r = await fetch(base + path, {
+      method: 'GET',
+      headers: headers(etag ? { 'If-None-Match': etag } : {}),
+      cache: 'no-store',
+    })
+    if (r.status === 304) return null
+    const j = await r.json().catch(() => ({}))
+    if (!r.ok) throw new Error(j?.error || j?.detail || `HTTP ${r.status}`)
+    return { etag: r.headers.get('ETag') || '', body: j }
+  }
+
+  async function getBlob(path) {
+    const r = await fetch(base + path, { method: 'GET', headers: headers() })
+    if (!r.ok) throw new Error(`HTTP ${r.status}`)
+    return r.blob()
+  }
+
   async function post(path, body) {
     const r = await fetch(base + path, { method: 'POST', headers: headers(), body: JSON.stringify(body) })
     const j = await r.json().catch(() => ({}))
@@ -22,5 +57,5 @@ export function makeApiClient(runtimeConfig) {
     return j
   }
 
-  return { get, post }
+  return { get, getIfChanged, getBlob, post }
 }
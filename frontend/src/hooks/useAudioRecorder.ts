@@ -1,8 +1,48 @@
 import { useEffect, useRef, useState } from 'react'
+import { createEnergyVad, slicePcmChunks, type EnergyVad } from '../utils/energyVad'
 
 type RecorderState = 'idle' | 'requesting' | 'recording' | 'stopping' | 'error'
+type CaptureMode = 'auto' | 'pcm16' | 'mediarecorder'
 
+// Tope por defecto; el backend publica el suyo en /config (speech.max_turn_sec) y lo hace cumplir.
 const MAX_TURN_MS = 20_000
+const PCM_SAMPLE_RATE = 16_000
+const PCM_WORKLET_URL = '/worklets/pcm16-capture.js'
+// Mismo default que VAD_END_SILENCE_MS del backend (publicado en /config).
+const VAD_END_SILENCE_MS = 800
+
+type RecorderVad = {
+  // VAD por energía en la captura PCM: corta el silencio inicial y detiene solo el turno.
+  enabled?: boolean
+  endSilenceMs?: number
+  // Recibe el audio cuando el hook detiene la grabación por su cuenta (fin de habla o tope).
+  onAutoStop?: (blob: Blob) => void
+}
+
+// PCM int16 mono 16 kHz sin header: el backend lo usa tal cual (sin ffmpeg ni resample).
+export const PCM16_MIME = `audio/pcm;rate=${PCM_SAMPLE_RATE};channels=1`
+
+function supportsPcmCapture() {
+  return typeof AudioContext !== 'undefined' && typeof AudioWorkletNode !== 'undefined'
+}
+
+async function openCaptureGraph(stream: MediaStream) {
+  // Chrome/Edge remuestrean el micrófono a 16 kHz con su propio filtro; Firefox no acepta
+  // un MediaStreamSource con otra tasa, así que ahí el worklet hace la decimación.
+  let ctx: AudioContext
+  let source: MediaStreamAudioSourceNode
+  try {
+    ctx = new AudioContext({ sampleRate: PCM_SAMPLE_RATE })
+    source = ctx.createMediaStreamSource(stream)
+  } catch {
+    ctx = new AudioContext()
+    source = ctx.createMediaStreamSource(stream)
+  }
+  await ctx.audioWorklet.addModule(PCM_WORKLET_URL)
+  const node = new AudioWorkletNode(ctx, 'pcm16-capture', { numberOfInputs: 1, numberOfOutputs: 0 })
+  source.connect(node)
+  return { ctx, source, node }
+}
 
 function pickMimeType() {
   const preferred = [
@@ -17,7 +57,11 @@ function pickMimeType() {
   return ''
 }
 
-export function useAudioRecorder() {
+export function useAudioRecorder(
+  mode: CaptureMode = 'auto',
+  maxTurnMs: number = MAX_TURN_MS,
+  vad: RecorderVad = {},
+) {
   const [state, setState] = useState<RecorderState>('idle')
   const [error, setError] = useState<string>('')
   const [elapsedMs, setElapsedMs] = useState(0)
@@ -30,6 +74,14 @@ export function useAudioRecorder() {
   const maxTimerRef = useRef<number | null>(null)
   const stopResolverRef = useRef<((blob: Blob) => void) | null>(null)
   const stopRejecterRef = useRef<((err: Error) => void) | null>(null)
+  const audioCtxRef = useRef<AudioContext | null>(null)
+  const workletRef = useRef<AudioWorkletNode | null>(null)
+  const pcmChunksRef = useRef<Int16Array[]>([])
+  const vadRef = useRef<EnergyVad | null>(null)
+  // true si el último blob ya viene recortado por el VAD (el backend no lo vuelve a recortar).
+  const trimmedRef = useRef(false)
+  const autoStopRef = useRef(vad.onAutoStop)
+  autoStopRef.current = vad.onAutoStop
 
   const cleanupTimers = () => {
     if (timerRef.current) {
@@ -48,11 +100,26 @@ export function useAudioRecorder() {
     streamRef.current = null
   }
 
+  const cleanupCapture = () => {
+    const node = workletRef.current
+    if (node) {
+      node.port.onmessage = null
+      node.disconnect()
+    }
+    workletRef.current = null
+    const ctx = audioCtxRef.current
+    if (ctx && ctx.state !== 'closed') ctx.close().catch(() => {})
+    audioCtxRef.current = null
+  }
+
   const finishIdle = () => {
     cleanupTimers()
+    cleanupCapture()
     cleanupStream()
     mediaRecorderRef.current = null
     chunksRef.current = []
+    pcmChunksRef.current = []
+    vadRef.current = null
     startedAtRef.current = 0
     setElapsedMs(0)
   }
@@ -66,24 +133,51 @@ export function useAudioRecorder() {
       const stream = await navigator.mediaDevices.getUserMedia({ audio: true })
       streamRef.current = stream
 
-      const mimeType = pickMimeType()
-      const recorder = mimeType
-        ? new MediaRecorder(stream, { mimeType })
-        : new MediaRecorder(stream)
-
-      chunksRef.current = []
-      recorder.ondataavailable = (evt) => {
-        if (evt.data && evt.data.size > 0) chunksRef.current.push(evt.data)
+      const usePcm = mode === 'pcm16' || (mode === 'auto' && supportsPcmCapture())
+      let capture: Awaited<ReturnType<typeof openCaptureGraph>> | null = null
+      if (usePcm) {
+        try {
+          capture = await openCaptureGraph(stream)
+        } catch (err) {
+          // En modo auto, si el worklet no carga se graba con MediaRecorder como antes.
+          if (mode === 'pcm16') throw err
+        }
       }
 
-      recorder.onerror = () => {
-        setError('Falló la grabación de audio.')
-        setState('error')
-        finishIdle()
-      }
+      if (capture) {
+        const { ctx, node } = capture
+        pcmChunksRef.current = []
+        vadRef.current = vad.enabled
+          ? createEnergyVad(PCM_SAMPLE_RATE, vad.endSilenceMs || VAD_END_SILENCE_MS)
+          : null
+        node.port.onmessage = (evt) => {
+          if (evt.data?.type !== 'pcm') return
+          const samples = new Int16Array(evt.data.buffer)
+          pcmChunksRef.current.push(samples)
+          if (vadRef.current?.push(samples)) autoStop()
+        }
+        audioCtxRef.current = ctx
+        workletRef.current = node
+      } else {
+        const mimeType = pickMimeType()
+        const recorder = mimeType
+          ? new MediaRecorder(stream, { mimeType })
+          : new MediaRecorder(stream)
+
+        chunksRef.current = []
+        recorder.ondataavailable = (evt) => {
+          if (evt.data && evt.data.size > 0) chunksRef.current.push(evt.data)
+        }
 
-      recorder.start(250)
-      mediaRecorderRef.current = recorder
+        recorder.onerror = () => {
+          setError('Falló la grabación de audio.')
+          setState('error')
+          finishIdle()
+        }
+
+        recorder.start(250)
+        mediaRecorderRef.current = recorder
+      }
       startedAtRef.current = Date.now()
       setElapsedMs(0)
       setState('recording')
@@ -93,10 +187,8 @@ export function useAudioRecorder() {
       }, 200)
 
       maxTimerRef.current = window.setTimeout(() => {
-        if (mediaRecorderRef.current?.state === 'recording') {
-          stop().catch(() => {})
-        }
-      }, MAX_TURN_MS)
+        if (mediaRecorderRef.current?.state === 'recording' || workletRef.current) autoStop()
+      }, maxTurnMs)
     } catch (e: any) {
       const msg = e?.name === 'NotAllowedError'
         ? 'Permiso de micrófono denegado. Habilítalo para usar voz.'
@@ -107,7 +199,55 @@ export function useAudioRecorder() {
     }
   }
 
+  function autoStop() {
+    // Fin de habla o tope de duración: el audio se entrega por `onAutoStop`.
+    stop()
+      .then((blob) => autoStopRef.current?.(blob))
+      .catch(() => {})
+  }
+
+  function pcmBlob() {
+    const chunks = pcmChunksRef.current
+    const total = chunks.reduce((n, c) => n + c.length, 0)
+    const range = vadRef.current?.speechRange(total) ?? null
+    trimmedRef.current = range !== null
+    // Sin voz detectada se envía todo: el VAD del backend tiene la última palabra.
+    return new Blob(range ? [slicePcmChunks(chunks, range[0], range[1])] : chunks, { type: PCM16_MIME })
+  }
+
+  function stopPcm(node: AudioWorkletNode) {
+    return new Promise<Blob>((resolve) => {
+      setState('stopping')
+      // Sin tope pendiente: un auto-stop tardío no debe volver a detener esta grabación.
+      cleanupTimers()
+      const done = () => {
+        const blob = pcmBlob()
+        finishIdle()
+        setState('idle')
+        resolve(blob)
+      }
+      // El worklet devuelve lo que tenga en buffer antes de cerrar (máx. 300 ms de espera).
+      const fallback = window.setTimeout(done, 300)
+      node.port.onmessage = (evt) => {
+        if (evt.data?.type === 'pcm') {
+          const samples = new Int16Array(evt.data.buffer)
+          pcmChunksRef.current.push(samples)
+          vadRef.current?.push(samples)
+        }
+        if (evt.data?.type === 'flushed') {
+          window.clearTimeout(fallback)
+          done()
+        }
+      }
+      node.port.postMessage('flush')
+    })
+  }
+
   function stop() {
+    const node = workletRef.current
+    if (node) return stopPcm(node)
+    trimmedRef.current = false
+
     return new Promise<Blob>((resolve, reject) => {
       const recorder = mediaRecorderRef.current
       if (!recorder || recorder.state === 'inactive') {
@@ -172,5 +312,6 @@ export function useAudioRecorder() {
     start,
     stop,
     cancel,
+    wasTrimmed: () => trimmedRef.current,
   }
 }
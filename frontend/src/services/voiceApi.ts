@@ -2,10 +2,18 @@ import { loadRuntimeConfig } from '../config'
 
 const BACKEND_URL = import.meta.env.VITE_BACKEND_URL
 
+type AudioJob = {
+  id: string
+  status: string
+  url: string
+}
+
 type VoiceTurnResponse = {
   stt_text: string
   bot_text: string
   audio_wav_base64?: string
+  // Turno en dos fases: el audio se pide aparte con fetchVoiceAudio(audio_job.url)
+  audio_job?: AudioJob
   stt_mode_used?: string
   fallback_used?: boolean
   tts_error?: string
@@ -14,6 +22,10 @@ type VoiceTurnResponse = {
 type VoiceTurnParams = {
   audioFile: File
   includeAudio?: boolean
+  audioAsync?: boolean
+  // El audio ya viene recortado por el VAD del kiosco
+  clientVad?: boolean
+  sessionId?: string
   signal?: AbortSignal
 }
 
@@ -38,22 +50,33 @@ function mergeSignals(signals: AbortSignal[]) {
   return ctrl.signal
 }
 
+async function backend() {
+  const runtime = await loadRuntimeConfig()
+  const base = (BACKEND_URL || runtime.apiBaseUrl || '').replace(/\/$/, '')
+  if (!base) throw new Error('No se encontró backend URL para voz (VITE_BACKEND_URL).')
+
+  const headers: Record<string, string> = {}
+  if (runtime.deviceId) headers['X-Device-Id'] = runtime.deviceId
+  if (runtime.kioskToken) headers['X-Kiosk-Token'] = runtime.kioskToken
+  return { base, headers }
+}
+
 export async function sendVoiceTurn({
   audioFile,
   includeAudio = true,
+  audioAsync = false,
+  clientVad = false,
+  sessionId,
   signal,
 }: VoiceTurnParams): Promise<VoiceTurnResponse> {
-  const runtime = await loadRuntimeConfig()
-  const base = (BACKEND_URL || runtime.apiBaseUrl || '').replace(/\/$/, '')
-  if (!base) throw new Error('No se encontró backend URL para voz (VITE_BACKEND_URL).')
+  const { base, headers } = await backend()
 
   const fd = new FormData()
   fd.append('audio', audioFile)
   fd.append('include_audio', includeAudio ? 'true' : 'false')
-
-  const headers: Record<string, string> = {}
-  if (runtime.deviceId) headers['X-Device-Id'] = runtime.deviceId
-  if (runtime.kioskToken) headers['X-Kiosk-Token'] = runtime.kioskToken
+  fd.append('audio_async', audioAsync ? 'true' : 'false')
+  if (clientVad) fd.append('client_vad', 'true')
+  if (sessionId) fd.append('session_id', sessionId)
 
   const timeout = timeoutSignal(30_000)
   const merged = signal ? mergeSignals([signal, timeout.signal]) : timeout.signal
@@ -75,6 +98,9 @@ export async function sendVoiceTurn({
       stt_text: String(data?.stt_text || ''),
       bot_text: String(data?.bot_text || ''),
       audio_wav_base64: data?.audio_wav_base64 ? String(data.audio_wav_base64) : undefined,
+      audio_job: data?.audio_job?.url
+        ? { id: String(data.audio_job.id), status: String(data.audio_job.status || ''), url: String(data.audio_job.url) }
+        : undefined,
       stt_mode_used: data?.stt_mode_used ? String(data.stt_mode_used) : undefined,
       fallback_used: Boolean(data?.fallback_used),
       tts_error: data?.tts_error ? String(data.tts_error) : undefined,
@@ -88,3 +114,25 @@ export async function sendVoiceTurn({
     timeout.cancel()
   }
 }
+
+/**
+ * Long-poll del audio de un turno en dos fases. Devuelve el WAV en base64, o null si el job
+ * se canceló (turno nuevo) o expiró. Abortar `signal` corta la espera.
+ */
+export async function fetchVoiceAudio(url: string, signal?: AbortSignal): Promise<string | null> {
+  const { base, headers } = await backend()
+  const deadline = Date.now() + 60_000
+
+  while (Date.now() < deadline) {
+    const res = await fetch(`${base}${url}?wait=20`, { headers, signal })
+    if (res.status === 202) continue
+    if (res.status === 404 || res.status === 410) return null
+
+    const data = await res.json().catch(() => ({}))
+    if (!res.ok) {
+      throw new Error(data?.error || data?.detail || `HTTP ${res.status}`)
+    }
+    return data?.audio_wav_base64 ? String(data.audio_wav_base64) : null
+  }
+  throw new Error('El audio de la respuesta no estuvo listo a tiempo.')
+}
@@ -16,3 +16,89 @@ export function saveState(next) {
 export function clearState() {
   try { localStorage.removeItem(KEY) } catch {}
 }
+
+// Respuestas GET con ETag (/config, /terms): se revalidan con If-None-Match y, si no hay red,
+// se usa la última copia guardada.
+const HTTP_CACHE_KEY = 'natubot_http_cache_v1'
+
+export function loadCachedResponse(url) {
+  try {
+    const all = JSON.parse(localStorage.getItem(HTTP_CACHE_KEY) || '{}')
+    return all[url] || null
+  } catch {
+    return null
+  }
+}
+
+export function saveCachedResponse(url, etag, body) {
+  try {
+    const all = JSON.parse(localStorage.getItem(HTTP_CACHE_KEY) || '{}')
+    all[url] = { etag, body }
+    localStorage.setItem(HTTP_CACHE_KEY, JSON.stringify(all))
+  } catch {}
+}
+
+// Bundle de respuestas frecuentes (/kiosk/bundle) y sus audios, en IndexedDB: no entran en
+// la cuota de localStorage y los audios se guardan como Blob, sin pasar por base64.
+const DB_NAME = 'natubot_kiosk'
+const DB_VERSION = 1
+const BUNDLE_STORE = 'answer_bundle'
+const AUDIO_STORE = 'bundle_audio'
+
+let dbPromise = null
+
+function openDb() {
+  if (typeof indexedDB === 'undefined') return Promise.reject(new Error('IndexedDB no disponible'))
+  if (!dbPromise) {
+    dbPromise = new Promise((resolve, reject) => {
+      const req = indexedDB.open(DB_NAME, DB_VERSION)
+      req.onupgradeneeded = () => {
+        const db = req.result
+        if (!db.objectStoreNames.contains(BUNDLE_STORE)) db.createObjectStore(BUNDLE_STORE)
+        if (!db.objectStoreNames.contains(AUDIO_STORE)) db.createObjectStore(AUDIO_STORE)
+      }
+      req.onsuccess = () => resolve(req.result)
+      req.onerror = () => {
+        dbPromise = null
+        reject(req.error)
+      }
+    })
+  }
+  return dbPromise
+}
+
+async function idb(storeName, mode, fn) {
+  const db = await openDb()
+  return new Promise((resolve, reject) => {
+    const tx = db.transaction(storeName, mode)
+    const req = fn(tx.objectStore(storeName))
+    tx.oncomplete = () => resolve(req?.result)
+    tx.onerror = () => reject(tx.error)
+    tx.onabort = () => reject(tx.error)
+  })
+}
+
+export async function loadAnswerBundle() {
+  try { return (await idb(BUNDLE_STORE, 'readonly', (s) => s.get('current'))) || null } catch { return null }
+}
+
+export async function saveAnswerBundle(bundle) {
+  try { await idb(BUNDLE_STORE, 'readwrite', (s) => s.put(bundle, 'current')) } catch {}
+}
+
+export async function loadBundleAudio(sha) {
+  try { return (await idb(AUDIO_STORE, 'readonly', (s) => s.get(sha))) || null } catch { return null }
+}
+
+export async function saveBundleAudio(sha, blob) {
+  try { await idb(AUDIO_STORE, 'readwrite', (s) => s.put(blob, sha)) } catch {}
+}
+
+export async function listBundleAudio() {
+  try { return (await idb(AUDIO_STORE, 'readonly', (s) => s.getAllKeys())) || [] } catch { return [] }
+}
+
+export async function deleteBundleAudio(shas) {
+  if (!shas.length) return
+  try { await idb(AUDIO_STORE, 'readwrite', (s) => { shas.forEach((sha) => s.delete(sha)) }) } catch {}
+}
@@ -0,0 +1,117 @@
+// VAD por energía para la captura PCM16 del kiosco (sin WASM ni dependencias).
+// Trabaja sobre frames de 30 ms: un frame es voz si su RMS supera el piso de ruido estimado
+// (adaptativo, sube lento y baja rápido) por SPEECH_RATIO y además un mínimo absoluto.
+// No recorta nada por sí mismo: entrega el rango [inicio, fin) de muestras con voz para que
+// el recorder corte el audio al construir el blob.
+
+const FRAME_MS = 30
+// Frames de voz seguidos para dar por empezado el habla (evita clicks y golpes al micrófono).
+const ONSET_FRAMES = 3
+// Audio previo al inicio detectado: el ataque de la primera sílaba suele quedar bajo el umbral.
+const PREROLL_MS = 300
+// Silencio que se conserva tras la última voz (el STT cierra mejor la última palabra).
+const TAIL_MS = 300
+const SPEECH_RATIO = 3.0 // ~ +10 dB sobre el piso de ruido
+const MIN_SPEECH_RMS = 0.01 // ~ -40 dBFS
+// Los primeros frames (antes de que la persona alcance a hablar) fijan el piso de ruido inicial.
+const CALIBRATION_FRAMES = 5
+
+export type EnergyVad = {
+  // Devuelve true cuando, tras haber voz, se acumulan `endSilenceMs` de silencio.
+  push: (samples: Int16Array) => boolean
+  // Rango de muestras a enviar, o null si nunca se detectó voz (el backend decide).
+  speechRange: (totalSamples: number) => [number, number] | null
+}
+
+export function createEnergyVad(sampleRate: number, endSilenceMs: number): EnergyVad {
+  const frameSamples = Math.round((sampleRate * FRAME_MS) / 1000)
+  const endSilenceFrames = Math.max(1, Math.round(endSilenceMs / FRAME_MS))
+  const carry = new Int16Array(frameSamples)
+  let carryLen = 0
+  let position = 0 // muestras procesadas en frames completos
+  let noise = 0
+  let calibrated = 0
+  let voicedRun = 0
+  let silenceFrames = 0
+  let speechStart = -1
+  let speechEnd = -1
+  let ended = false
+
+  function frameRms(frame: Int16Array) {
+    let sum = 0
+    for (let i = 0; i < frame.length; i += 1) {
+      const v = frame[i] / 32768
+      sum += v * v
+    }
+    return Math.sqrt(sum / frame.length)
+  }
+
+  function onFrame(frame: Int16Array) {
+    const rms = frameRms(frame)
+    if (calibrated < CALIBRATION_FRAMES) {
+      calibrated += 1
+      noise += (rms - noise) / calibrated
+      position += frame.length
+      return
+    }
+    const voiced = rms > Math.max(MIN_SPEECH_RMS, noise * SPEECH_RATIO)
+    const frameEnd = position + frame.length
+
+    if (voiced) {
+      voicedRun += 1
+      silenceFrames = 0
+      if (speechStart < 0 && voicedRun >= ONSET_FRAMES) {
+        const onset = frameEnd - voicedRun * frameSamples
+        speechStart = Math.max(0, onset - Math.round((sampleRate * PREROLL_MS) / 1000))
+      }
+      if (speechStart >= 0) speechEnd = frameEnd
+    } else {
+      voicedRun = 0
+      // El piso de ruido solo se adapta en silencio: baja rápido y sube lento.
+      noise = rms < noise ? 0.8 * noise + 0.2 * rms : 0.98 * noise + 0.02 * rms
+      if (speechStart >= 0) {
+        silenceFrames += 1
+        if (silenceFrames >= endSilenceFrames) ended = true
+      }
+    }
+    position = frameEnd
+  }
+
+  function push(samples: Int16Array) {
+    let offset = 0
+    while (offset < samples.length) {
+      const take = Math.min(frameSamples - carryLen, samples.length - offset)
+      carry.set(samples.subarray(offset, offset + take), carryLen)
+      carryLen += take
+      offset += take
+      if (carryLen === frameSamples) {
+        onFrame(carry)
+        carryLen = 0
+      }
+    }
+    return ended
+  }
+
+  function speechRange(totalSamples: number): [number, number] | null {
+    if (speechStart < 0) return null
+    const tail = Math.round((sampleRate * TAIL_MS) / 1000)
+    return [speechStart, Math.min(totalSamples, speechEnd + tail)]
+  }
+
+  return { push, speechRange }
+}
+
+// Concatena los chunks del worklet quedándose solo con [start, end).
+export function slicePcmChunks(chunks: Int16Array[], start: number, end: number): Int16Array {
+  const out = new Int16Array(Math.max(0, end - start))
+  let pos = 0
+  for (const chunk of chunks) {
+    const chunkEnd = pos + chunk.length
+    const from = Math.max(start, pos)
+    const to = Math.min(end, chunkEnd)
+    if (to > from) out.set(chunk.subarray(from - pos, to - pos), from - start)
+    pos = chunkEnd
+    if (pos >= end) break
+  }
+  return out
+}
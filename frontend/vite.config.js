@@ -28,7 +28,8 @@ export default defineConfig({
           {
             urlPattern: ({ url }) => url.pathname.endsWith('/terms') || url.pathname.endsWith('/config'),
             handler: 'NetworkFirst',
-            options: { cacheName: 'api-cache', networkTimeoutSeconds: 3 },
+            // Solo se guardan 200: los 304 (revalidación con ETag) los resuelve api.get.
+            options: { cacheName: 'api-cache', networkTimeoutSeconds: 3, cacheableResponse: { statuses: [200] } },
           },
         ],
       },
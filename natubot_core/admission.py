@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from .metrics import MetricsRegistry
+
+# Clases de prioridad (menor = se atiende antes)
+PRIORITY_CHAT = 0
+PRIORITY_SHORT_TTS = 1
+PRIORITY_VOICE = 2
+
+
+class AdmissionRejected(RuntimeError):
+    def __init__(self, message: str, retry_after_sec: int):
+        super().__init__(message)
+        self.retry_after_sec = retry_after_sec
+
+
+@dataclass
+class _Waiter:
+    priority: int
+    seq: int
+    stage: str
+    future: "asyncio.Future[None]"
+
+
+class AdmissionController:
+    """
+    Control de admisión para trabajo pesado (STT/TTS en CPU) con:
+    - un total de slots compartido y un límite de concurrencia por etapa,
+    - una cola de espera acotada por etapa y tiempo máximo en cola,
+    - despacho por prioridad (chat > TTS corto > turno de voz).
+
+    Vive en el event loop (sin locks): acquire/release se llaman solo desde handlers async.
+    """
+
+    def __init__(
+        self,
+        *,
+        total_slots: int,
+        stage_limits: Dict[str, int],
+        max_queue: int,
+        max_wait_sec: float,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        self.total_slots = max(1, total_slots)
+        self.stage_limits = {k: max(1, v) for k, v in stage_limits.items()}
+        self.max_queue = max(0, max_queue)
+        self.max_wait_sec = max_wait_sec
+        self.metrics = metrics
+        self._in_flight: Dict[str, int] = {k: 0 for k in self.stage_limits}
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        # EWMA del tiempo de servicio por etapa (s) para estimar espera y Retry-After
+        self._service_sec: Dict[str, float] = {k: 1.0 for k in self.stage_limits}
+
+        if metrics is not None:
+            for stage in self.stage_limits:
+                metrics.gauge(f"admission.{stage}.in_flight", lambda s=stage: self._in_flight[s])
+                metrics.gauge(f"admission.{stage}.queue_depth", lambda s=stage: self._queued(s))
+
+    def _queued(self, stage: str) -> int:
+        return sum(1 for w in self._waiters if w.stage == stage)
+
+    def _has_capacity(self, stage: str) -> bool:
+        return (
+            self._in_flight[stage] < self.stage_limits[stage]
+            and sum(self._in_flight.values()) < self.total_slots
+        )
+
+    def _estimated_wait_sec(self, stage: str, priority: int) -> float:
+        ahead = sum(1 for w in self._waiters if w.stage == stage and w.priority <= priority)
+        return (ahead + 1) * self._service_sec[stage] / self.stage_limits[stage]
+
+    def _reject(self, stage: str, reason: str, wait_estimate: float) -> AdmissionRejected:
+        if self.metrics is not None:
+            self.metrics.inc(f"admission.{stage}.rejected")
+        retry_after = max(1, int(math.ceil(wait_estimate)))
+        return AdmissionRejected(f"Servidor ocupado ({stage}): {reason}", retry_after)
+
+    def _grant(self, stage: str) -> None:
+        self._in_flight[stage] += 1
+
+    def _dispatch(self) -> None:
+        self._waiters.sort(key=lambda w: (w.priority, w.seq))
+        remaining: List[_Waiter] = []
+        for w in self._waiters:
+            if not w.future.done() and self._has_capacity(w.stage):
+                self._grant(w.stage)
+                w.future.set_result(None)
+            elif not w.future.done():
+                remaining.append(w)
+        self._waiters = remaining
+
+    def _observe_wait(self, stage: str, started: float) -> None:
+        if self.metrics is not None:
+            self.metrics.observe(f"admission.{stage}.wait_ms", (time.monotonic() - started) * 1000.0)
+
+    async def acquire(self, stage: str, priority: int, max_wait_sec: Optional[float] = None) -> None:
+        started = time.monotonic()
+        if self._has_capacity(stage):
+            self._grant(stage)
+            self._observe_wait(stage, started)
+            return
+
+        max_wait = self.max_wait_sec if max_wait_sec is None else min(self.max_wait_sec, max_wait_sec)
+        estimate = self._estimated_wait_sec(stage, priority)
+        if self._queued(stage) >= self.max_queue:
+            raise self._reject(stage, "cola llena", estimate)
+        if estimate > max_wait:
+            raise self._reject(stage, "espera estimada supera el presupuesto", estimate)
+
+        fut: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        self._waiters.append(_Waiter(priority=priority, seq=next(self._seq), stage=stage, future=fut))
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout=max(0.0, max_wait))
+        except asyncio.TimeoutError:
+            if fut.done():
+                # Se liberó un slot justo al vencer el timeout: ya es nuestro.
+                self._observe_wait(stage, started)
+                return
+            fut.cancel()
+            self._waiters = [w for w in self._waiters if w.future is not fut]
+            raise self._reject(stage, "tiempo máximo en cola excedido", estimate)
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release(stage)
+            else:
+                fut.cancel()
+                self._waiters = [w for w in self._waiters if w.future is not fut]
+            raise
+        self._observe_wait(stage, started)
+
+    def release(self, stage: str, service_sec: Optional[float] = None) -> None:
+        self._in_flight[stage] = max(0, self._in_flight[stage] - 1)
+        if service_sec is not None:
+            self._service_sec[stage] = 0.8 * self._service_sec[stage] + 0.2 * service_sec
+        self._dispatch()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            stage: {
+                "in_flight": self._in_flight[stage],
+                "limit": self.stage_limits[stage],
+                "queue_depth": self._queued(stage),
+                "avg_service_ms": round(self._service_sec[stage] * 1000.0, 1),
+            }
+            for stage in self.stage_limits
+        }
@@ -0,0 +1,333 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .log_analytics import LOG_BASENAME
+from .sessions import names_topic, normalize_text
+
+# Preguntas más largas casi nunca se repiten textuales: no vale la pena contarlas.
+MAX_QUESTION_WORDS = 16
+GLOBAL_LOCATION = ""
+AUDIO_FORMATS = ("opus", "vorbis", "wav")
+
+_QUESTION_MARK = b'"event": "question"'
+
+
+def question_key(question: str) -> str:
+    """
+    Clave de la pregunta en el bundle: texto normalizado (igual que `normalizeQuestion` en el
+    kiosco). "" si no se entiende sola ("¿y cómo se toma?") o es demasiado larga para repetirse.
+    """
+    q = normalize_text(question)
+    if not q or len(q.split()) > MAX_QUESTION_WORDS or not names_topic(q):
+        return ""
+    return q
+
+
+def dominant_version(versions: Dict[str, int]) -> str:
+    """data_version con más chunks (ChunkStore.versions())."""
+    return max(versions.items(), key=lambda kv: kv[1])[0] if versions else ""
+
+
+def compress_audio(wav: bytes, fmt: str = "opus") -> Tuple[bytes, str]:
+    """WAV → OGG (Opus/Vorbis) con soundfile; "wav" lo deja tal cual. Devuelve (bytes, mime)."""
+    if fmt == "wav":
+        return wav, "audio/wav"
+    if fmt not in AUDIO_FORMATS:
+        raise ValueError(f"Formato de audio no soportado: {fmt} (usa {', '.join(AUDIO_FORMATS)})")
+    import soundfile as sf
+
+    data, rate = sf.read(io.BytesIO(wav), dtype="float32")
+    out = io.BytesIO()
+    sf.write(out, data, rate, format="OGG", subtype=fmt.upper())
+    return out.getvalue(), "audio/ogg"
+
+
+@dataclass
+class QuestionStats:
+    count: int = 0
+    devices: Set[str] = field(default_factory=set)
+
+
+def _log_files(log_dir: Path) -> List[Path]:
+    return sorted(p for p in Path(log_dir).glob(LOG_BASENAME + "*") if p.is_file())
+
+
+def _epoch(ts: str) -> Optional[float]:
+    try:
+        return datetime.strptime(ts, "%Y-%m-%dT%H:%M:%S%z").timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def count_questions(log_dir: Path, since: float = 0.0) -> Dict[str, Dict[str, QuestionStats]]:
+    """
+    Cuenta los eventos `question` de los logs JSON-lines por ubicación del kiosco. Cada pregunta
+    suma además en GLOBAL_LOCATION (kioscos sin ubicación o ubicaciones con poco tráfico).
+    """
+    out: Dict[str, Dict[str, QuestionStats]] = defaultdict(lambda: defaultdict(QuestionStats))
+    for path in _log_files(log_dir):
+        with path.open("rb") as f:
+            for raw in f:
+                if _QUESTION_MARK not in raw:
+                    continue
+                try:
+                    ev = json.loads(raw)
+                except ValueError:
+                    continue
+                key = str(ev.get("q") or "")
+                ts = _epoch(ev.get("ts"))
+                if not key or (since and (ts is None or ts < since)):
+                    continue
+                device = str(ev.get("device_id") or "")
+                locations = {GLOBAL_LOCATION, str(ev.get("kiosk_location") or "")}
+                for loc in locations:
+                    stats = out[loc][key]
+                    stats.count += 1
+                    stats.devices.add(device)
+    return out
+
+
+def select_popular(
+    counts: Dict[str, Dict[str, QuestionStats]],
+    *,
+    top: int = 40,
+    min_count: int = 3,
+    min_devices: int = 1,
+) -> Dict[str, List[Tuple[str, int]]]:
+    """Top `top` preguntas por ubicación con al menos `min_count` repeticiones en `min_devices` kioscos."""
+    out: Dict[str, List[Tuple[str, int]]] = {}
+    for loc, questions in counts.items():
+        ranked = sorted(
+            ((k, s.count) for k, s in questions.items() if s.count >= min_count and len(s.devices) >= min_devices),
+            key=lambda kv: (-kv[1], kv[0]),
+        )[:top]
+        if ranked:
+            out[loc] = ranked
+    return out
+
+
+@dataclass
+class BundleAnswer:
+    key: str
+    answer: str
+    citations: List[Dict[str, Any]] = field(default_factory=list)
+    answer_sha: str = ""
+    audio_sha: str = ""
+    audio_mime: str = ""
+    audio_bytes: int = 0
+    data_version: str = ""
+    terms_version: str = ""
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS answers (
+    key TEXT PRIMARY KEY,
+    answer TEXT NOT NULL,
+    citations_json TEXT NOT NULL,
+    answer_sha TEXT NOT NULL,
+    audio BLOB,
+    audio_mime TEXT NOT NULL DEFAULT '',
+    audio_sha TEXT NOT NULL DEFAULT '',
+    data_version TEXT NOT NULL,
+    terms_version TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_by_audio ON answers (audio_sha);
+CREATE TABLE IF NOT EXISTS popular (
+    location TEXT NOT NULL,
+    key TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (location, key)
+);
+"""
+
+
+def _sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class AnswerBundleStore:
+    """
+    Respuestas a las preguntas más frecuentes (texto, citas y audio comprimido opcional) y el
+    ranking por ubicación, en un SQLite local. Lo llena scripts/build_answer_bundles.py.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(str(self.path), timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_meta(self, key: str, default: str = "") -> str:
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def is_fresh(self, key: str, *, data_version: str, terms_version: str, need_audio: bool) -> bool:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT data_version, terms_version, audio IS NOT NULL FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return False
+        version, terms, has_audio = row
+        return version == data_version and terms == terms_version and bool(has_audio or not need_audio)
+
+    def upsert(
+        self,
+        *,
+        key: str,
+        answer: str,
+        citations: List[Dict[str, Any]],
+        data_version: str,
+        terms_version: str,
+        audio: Optional[bytes] = None,
+        audio_mime: str = "",
+    ) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO answers (key, answer, citations_json, answer_sha, audio, audio_mime, "
+                "audio_sha, data_version, terms_version, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key, answer, json.dumps(citations, ensure_ascii=False), _sha(answer.encode("utf-8")),
+                    sqlite3.Binary(audio) if audio else None, audio_mime if audio else "",
+                    _sha(audio) if audio else "", data_version, terms_version, time.time(),
+                ),
+            )
+
+    def replace_popular(self, popular: Dict[str, List[Tuple[str, int]]]) -> None:
+        rows = [(loc, key, rank, count) for loc, ranked in popular.items() for rank, (key, count) in enumerate(ranked)]
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM popular")
+            conn.executemany("INSERT INTO popular (location, key, rank, count) VALUES (?, ?, ?, ?)", rows)
+
+    def prune(self, keep_keys: Iterable[str]) -> int:
+        """Borra respuestas a preguntas que ya no están entre las frecuentes."""
+        with self._lock, self._connect() as conn:
+            conn.execute("CREATE TEMP TABLE keep_k (key TEXT PRIMARY KEY)")
+            conn.executemany("INSERT OR IGNORE INTO keep_k VALUES (?)", [(k,) for k in keep_keys])
+            return conn.execute("DELETE FROM answers WHERE key NOT IN (SELECT key FROM keep_k)").rowcount
+
+    def load_answers(self) -> List[BundleAnswer]:
+        """Respuestas sin audio (los bytes se leen bajo demanda con audio_for)."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT key, answer, citations_json, answer_sha, audio_sha, audio_mime, COALESCE(LENGTH(audio), 0), "
+                "data_version, terms_version FROM answers"
+            ).fetchall()
+        return [
+            BundleAnswer(
+                key=r[0], answer=r[1], citations=json.loads(r[2] or "[]"), answer_sha=r[3], audio_sha=r[4],
+                audio_mime=r[5], audio_bytes=int(r[6]), data_version=r[7], terms_version=r[8],
+            )
+            for r in rows
+        ]
+
+    def load_popular(self) -> Dict[str, List[str]]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT location, key FROM popular ORDER BY location, rank").fetchall()
+        out: Dict[str, List[str]] = defaultdict(list)
+        for loc, key in rows:
+            out[loc].append(key)
+        return dict(out)
+
+    def audio_for(self, audio_sha: str) -> Optional[Tuple[bytes, str]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT audio, audio_mime FROM answers WHERE audio_sha = ? AND audio IS NOT NULL LIMIT 1",
+                (audio_sha,),
+            ).fetchone()
+        return (bytes(row[0]), row[1]) if row else None
+
+
+class AnswerBundle:
+    """
+    Bundle por ubicación que el kiosco sincroniza a IndexedDB para responder sin red las
+    preguntas frecuentes. Solo entran respuestas generadas con el `data_version` del índice
+    (si se conoce) y el TERMS_VERSION vigentes; la versión del bundle es un hash de ambos y
+    del contenido, así cambia apenas cambia cualquiera de los tres.
+    """
+
+    def __init__(self, store: AnswerBundleStore, *, data_version: str, terms_version: str):
+        self.store = store
+        self.data_version = data_version
+        self.terms_version = terms_version
+        self.built_at = store.get_meta("built_at")
+        self._answers: Dict[str, BundleAnswer] = {
+            a.key: a
+            for a in store.load_answers()
+            if a.terms_version == terms_version and (not data_version or a.data_version == data_version)
+        }
+        self._popular = {
+            loc: [k for k in keys if k in self._answers] for loc, keys in store.load_popular().items()
+        }
+        self._audio_shas = {a.audio_sha for a in self._answers.values() if a.audio_sha}
+
+    def __len__(self) -> int:
+        return len(self._answers)
+
+    def resolve(self, location: Optional[str]) -> str:
+        """Ubicaciones sin ranking propio usan el global."""
+        loc = (location or "").strip()
+        return loc if self._popular.get(loc) else GLOBAL_LOCATION
+
+    def payload(self, location: Optional[str]) -> Dict[str, Any]:
+        loc = self.resolve(location)
+        answers = [self._answers[k] for k in self._popular.get(loc, [])]
+        fingerprint = json.dumps(
+            [self.data_version, self.terms_version, [(a.key, a.answer_sha, a.audio_sha) for a in answers]]
+        )
+        return {
+            "ok": True,
+            "version": _sha(fingerprint.encode("utf-8"))[:16] if answers else "",
+            "data_version": self.data_version,
+            "terms_version": self.terms_version,
+            "location": loc or None,
+            "built_at": self.built_at,
+            "answers": [
+                {
+                    "q": a.key,
+                    "answer": a.answer,
+                    "citations": a.citations,
+                    "audio": {"sha": a.audio_sha, "mime": a.audio_mime, "bytes": a.audio_bytes} if a.audio_sha else None,
+                }
+                for a in answers
+            ],
+        }
+
+    def audio(self, audio_sha: str) -> Optional[Tuple[bytes, str]]:
+        # Solo audios del bundle vigente (no filas de otra versión que sigan en el archivo).
+        if audio_sha not in self._audio_shas:
+            return None
+        return self.store.audio_for(audio_sha)
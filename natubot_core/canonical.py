@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .sessions import normalize_text
+
+# Intenciones frecuentes del kiosco: pregunta canónica (plantilla) + frases que la disparan.
+# Los patrones se comparan contra el texto normalizado (sin tildes ni puntuación).
+DEFAULT_INTENTS: Dict[str, Dict[str, Any]] = {
+    "que_es": {
+        "question": "¿Qué es {product}?",
+        "patterns": ["que es", "que son", "en que consiste", "hablame de", "informacion de", "informacion sobre"],
+    },
+    "para_que_sirve": {
+        "question": "¿Para qué sirve {product}?",
+        "patterns": ["para que sirve", "para que sirven", "para que es", "beneficios", "que hace"],
+    },
+    "como_se_usa": {
+        "question": "¿Cómo se usa {product}?",
+        "patterns": ["como se usa", "como se toma", "como usar", "como tomar", "como lo tomo", "modo de uso", "dosis"],
+    },
+    "contraindicaciones": {
+        "question": "¿Qué contraindicaciones tiene {product}?",
+        "patterns": ["contraindicaciones", "contraindicacion", "efectos secundarios", "precauciones", "quien no debe"],
+    },
+}
+
+# Palabras de relleno que no cambian la intención ("hola, ¿me dices qué es X por favor?").
+_FILLER_WORDS = {
+    "a", "al", "de", "del", "el", "la", "las", "lo", "los", "un", "una", "y", "o", "me", "mi",
+    "te", "se", "que", "por", "favor", "hola", "dime", "dices", "puedes", "podrias", "quiero",
+    "saber", "sobre", "tiene", "tienen", "producto", "natubot", "gracias", "bueno", "oye",
+}
+# Palabras extra toleradas: más que esto sugiere una pregunta específica
+# ("¿para qué sirve X si estoy embarazada?") que debe ir por RAG.
+_MAX_EXTRA_WORDS = 1
+
+
+def text_sha(text: str) -> str:
+    return hashlib.sha256((text or "").strip().encode("utf-8")).hexdigest()
+
+
+def intents_sha(intent: Dict[str, Any]) -> str:
+    return text_sha(json.dumps(intent, sort_keys=True, ensure_ascii=False))
+
+
+def load_intents(path: Optional[Path] = None) -> Dict[str, Dict[str, Any]]:
+    """Plantillas de intención: JSON {intent: {question, patterns}} o DEFAULT_INTENTS."""
+    if path is None or not path.exists():
+        return DEFAULT_INTENTS
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if not isinstance(data, dict) or not all(isinstance(v, dict) and v.get("question") for v in data.values()):
+        raise ValueError(f"Formato inválido de intents en {path}: se espera {{intent: {{question, patterns}}}}")
+    return data
+
+
+@dataclass
+class CanonicalAnswer:
+    product_id: str
+    product_name: str
+    intent: str
+    answer: str
+    citations: List[Dict[str, Any]] = field(default_factory=list)
+    answer_sha: str = ""
+    data_version: str = ""
+    has_audio: bool = False
+    # Resumen hablado (turnos de voz) y si tiene su propio WAV.
+    spoken: str = ""
+    has_spoken_audio: bool = False
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS answers (
+    product_id TEXT NOT NULL,
+    intent TEXT NOT NULL,
+    product_name TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    citations_json TEXT NOT NULL,
+    answer_sha TEXT NOT NULL,
+    product_signature TEXT NOT NULL,
+    template_sha TEXT NOT NULL,
+    data_version TEXT NOT NULL,
+    audio_wav BLOB,
+    spoken TEXT NOT NULL DEFAULT '',
+    spoken_wav BLOB,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (product_id, intent)
+);
+CREATE INDEX IF NOT EXISTS answers_by_sha ON answers (answer_sha);
+"""
+
+# Columnas agregadas después de la primera versión del store (ALTER TABLE en stores existentes).
+_ADDED_COLUMNS = {
+    "spoken": "TEXT NOT NULL DEFAULT ''",
+    "spoken_wav": "BLOB",
+}
+
+
+class CanonicalStore:
+    """
+    Respuestas canónicas precalculadas (texto + WAV opcional) en un SQLite local.
+    Cada fila guarda la firma del producto y de la plantilla con que se generó, para
+    que el job offline solo regenere lo que cambió. `spoken`/`spoken_wav` son la variante
+    corta para turnos de voz; `answer`/`audio_wav`, la respuesta completa de pantalla.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(answers)")}
+            for column, decl in _ADDED_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE answers ADD COLUMN {column} {decl}")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Una conexión por operación: el runtime lee desde varios threads del pool.
+        conn = sqlite3.connect(str(self.path), timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_meta(self, key: str, default: str = "") -> str:
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def is_fresh(self, product_id: str, intent: str, *, product_signature: str, template_sha: str,
+                 data_version: str, need_audio: bool) -> bool:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT product_signature, template_sha, data_version, spoken != '', "
+                "audio_wav IS NOT NULL AND spoken_wav IS NOT NULL "
+                "FROM answers WHERE product_id = ? AND intent = ?",
+                (product_id, intent),
+            ).fetchone()
+        if row is None:
+            return False
+        sig, tsha, version, has_spoken, has_audio = row
+        return (
+            sig == product_signature
+            and tsha == template_sha
+            and version == data_version
+            and bool(has_spoken)
+            and bool(has_audio or not need_audio)
+        )
+
+    def upsert(
+        self,
+        *,
+        product_id: str,
+        intent: str,
+        product_name: str,
+        question: str,
+        answer: str,
+        citations: List[Dict[str, Any]],
+        product_signature: str,
+        template_sha: str,
+        data_version: str,
+        audio_wav: Optional[bytes] = None,
+        spoken: str = "",
+        spoken_wav: Optional[bytes] = None,
+    ) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO answers (product_id, intent, product_name, question, answer, "
+                "citations_json, answer_sha, product_signature, template_sha, data_version, audio_wav, "
+                "spoken, spoken_wav, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    product_id, intent, product_name, question, answer,
+                    json.dumps(citations, ensure_ascii=False), text_sha(answer),
+                    product_signature, template_sha, data_version,
+                    sqlite3.Binary(audio_wav) if audio_wav else None,
+                    spoken, sqlite3.Binary(spoken_wav) if spoken_wav else None, time.time(),
+                ),
+            )
+
+    def prune(self, keep_product_ids: Iterable[str], keep_intents: Iterable[str]) -> int:
+        """Borra productos que ya no están en el índice e intenciones retiradas."""
+        pids = list(keep_product_ids)
+        intents = list(keep_intents)
+        with self._lock, self._connect() as conn:
+            conn.execute("CREATE TEMP TABLE keep_p (product_id TEXT PRIMARY KEY)")
+            conn.executemany("INSERT OR IGNORE INTO keep_p VALUES (?)", [(p,) for p in pids])
+            conn.execute("CREATE TEMP TABLE keep_i (intent TEXT PRIMARY KEY)")
+            conn.executemany("INSERT OR IGNORE INTO keep_i VALUES (?)", [(i,) for i in intents])
+            cur = conn.execute(
+                "DELETE FROM answers WHERE product_id NOT IN (SELECT product_id FROM keep_p) "
+                "OR intent NOT IN (SELECT intent FROM keep_i)"
+            )
+            return cur.rowcount
+
+    def load_answers(self, data_version: Optional[str] = None) -> List[CanonicalAnswer]:
+        """Respuestas sin audio (el WAV se lee bajo demanda con audio_for)."""
+        sql = (
+            "SELECT product_id, product_name, intent, answer, citations_json, answer_sha, data_version, "
+            "audio_wav IS NOT NULL, spoken, spoken_wav IS NOT NULL FROM answers"
+        )
+        args: tuple = ()
+        if data_version:
+            sql += " WHERE data_version = ?"
+            args = (data_version,)
+        with self._connect() as conn:
+            rows = conn.execute(sql, args).fetchall()
+        return [
+            CanonicalAnswer(
+                product_id=r[0], product_name=r[1], intent=r[2], answer=r[3],
+                citations=json.loads(r[4] or "[]"), answer_sha=r[5], data_version=r[6], has_audio=bool(r[7]),
+                spoken=r[8] or "", has_spoken_audio=bool(r[9]),
+            )
+            for r in rows
+        ]
+
+    def audio_for(self, answer_sha: str) -> Optional[bytes]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT audio_wav FROM answers WHERE answer_sha = ? AND audio_wav IS NOT NULL LIMIT 1",
+                (answer_sha,),
+            ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def spoken_audio_for(self, answer_sha: str) -> Optional[bytes]:
+        """WAV del resumen hablado (turnos de voz)."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT spoken_wav FROM answers WHERE answer_sha = ? AND spoken_wav IS NOT NULL LIMIT 1",
+                (answer_sha,),
+            ).fetchone()
+        return bytes(row[0]) if row else None
+
+
+@dataclass
+class _ProductKey:
+    product_id: str
+    phrase: str
+
+
+class CanonicalMatcher:
+    """
+    Matcher liviano (sin LLM ni embeddings) de "intención + producto" sobre el texto
+    normalizado. Solo acepta preguntas cortas y directas; cualquier matiz extra va por RAG.
+    """
+
+    def __init__(self, answers: List[CanonicalAnswer], intents: Dict[str, Dict[str, Any]]):
+        self._answers: Dict[tuple, CanonicalAnswer] = {(a.product_id, a.intent): a for a in answers}
+        self._by_sha: Dict[str, CanonicalAnswer] = {a.answer_sha: a for a in answers}
+        # Patrones más largos primero: "para que sirve" gana sobre "que es".
+        self._patterns = sorted(
+            ((normalize_text(p), intent) for intent, spec in intents.items() for p in spec.get("patterns", [])),
+            key=lambda x: -len(x[0]),
+        )
+        names: Dict[str, str] = {}
+        for a in answers:
+            names.setdefault(a.product_id, a.product_name)
+        self._products = [
+            _ProductKey(pid, normalize_text(name))
+            for pid, name in names.items()
+            if normalize_text(name)
+        ]
+        self._products.sort(key=lambda p: -len(p.phrase))
+
+    def __len__(self) -> int:
+        return len(self._answers)
+
+    @staticmethod
+    def _contains(haystack: str, needle: str) -> bool:
+        return f" {needle} " in f" {haystack} "
+
+    def match(self, question: str, fallback_product: Optional[str] = None) -> Optional[CanonicalAnswer]:
+        """
+        `fallback_product` (nombre del producto del turno anterior) resuelve seguimientos
+        sin producto explícito: "¿y cómo se toma?".
+        """
+        q = normalize_text(question)
+        if not q:
+            return None
+
+        intent = pattern = None
+        for p, i in self._patterns:
+            if self._contains(q, p):
+                intent, pattern = i, p
+                break
+        if intent is None:
+            return None
+
+        product = next((p for p in self._products if self._contains(q, p.phrase)), None)
+        if product is None and fallback_product:
+            phrase = normalize_text(fallback_product)
+            product = next((p for p in self._products if p.phrase == phrase), None)
+        if product is None:
+            return None
+
+        rest = f" {q} ".replace(f" {pattern} ", " ").replace(f" {product.phrase} ", " ").split()
+        extra = [w for w in rest if w not in _FILLER_WORDS]
+        if len(extra) > _MAX_EXTRA_WORDS:
+            return None
+        return self._answers.get((product.product_id, intent))
+
+    def by_text(self, text: str) -> Optional[CanonicalAnswer]:
+        return self._by_sha.get(text_sha(text))
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id TEXT PRIMARY KEY,
+    product_id TEXT NOT NULL,
+    data_version TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    metadata_json TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_by_version ON chunks (data_version);
+"""
+
+# SQLite limita los parámetros por sentencia (999 en builds antiguos).
+_MAX_VARS = 900
+
+
+def _batches(items: Sequence[str], n: int = _MAX_VARS) -> Iterator[Sequence[str]]:
+    for i in range(0, len(items), n):
+        yield items[i:i + n]
+
+
+class ChunkStore:
+    """
+    Texto + metadata de cada chunk, por vector id, en un SQLite local con mmap.
+    Lo llena la ingesta (mismo `data_version` que Pinecone) y el runtime lo usa para
+    hidratar matches de queries hechas sin `include_metadata`.
+    """
+
+    def __init__(self, path: Path, mmap_bytes: int = 256 * 1024 * 1024):
+        self.path = Path(path)
+        self.mmap_bytes = int(mmap_bytes)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._tx() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # Una conexión por thread (sqlite3 no comparte conexiones entre threads del pool).
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA mmap_size={self.mmap_bytes}")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _tx(self) -> Iterator[sqlite3.Connection]:
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                yield conn
+
+    def __len__(self) -> int:
+        return int(self._conn().execute("SELECT COUNT(*) FROM chunks").fetchone()[0])
+
+    def get_meta(self, key: str, default: str = "") -> str:
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._tx() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def upsert_many(self, chunks: Iterable[Dict[str, Any]]) -> int:
+        """`chunks`: [{"id", "metadata"}] con el mismo formato que se sube a Pinecone."""
+        now = time.time()
+        rows = []
+        for c in chunks:
+            md = c.get("metadata") or {}
+            rows.append((
+                c["id"],
+                str(md.get("product_id") or ""),
+                str(md.get("data_version") or ""),
+                str(md.get("content_hash") or ""),
+                json.dumps(md, ensure_ascii=False),
+                now,
+            ))
+        with self._tx() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, product_id, data_version, content_hash, metadata_json, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def get_many(self, ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        out: Dict[str, Dict[str, Any]] = {}
+        conn = self._conn()
+        for batch in _batches(list(ids)):
+            marks = ",".join("?" * len(batch))
+            for vid, md_json in conn.execute(f"SELECT id, metadata_json FROM chunks WHERE id IN ({marks})", batch):
+                out[vid] = json.loads(md_json)
+        return out
+
+    def delete(self, ids: Sequence[str]) -> int:
+        deleted = 0
+        with self._tx() as conn:
+            for batch in _batches(list(ids)):
+                marks = ",".join("?" * len(batch))
+                deleted += conn.execute(f"DELETE FROM chunks WHERE id IN ({marks})", batch).rowcount
+        return deleted
+
+    def iter_metadata(self, batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        cur = self._conn().execute("SELECT metadata_json FROM chunks")
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                return
+            for (md_json,) in rows:
+                yield json.loads(md_json)
+
+    def all_ids(self) -> List[str]:
+        return [r[0] for r in self._conn().execute("SELECT id FROM chunks")]
+
+    def versions(self) -> Dict[str, int]:
+        rows = self._conn().execute("SELECT data_version, COUNT(*) FROM chunks GROUP BY data_version")
+        return {v: int(n) for v, n in rows}
+
+
+def consistency_report(store: ChunkStore, index_ids: Iterable[str]) -> Dict[str, Any]:
+    """Compara los ids del índice con el store: faltantes (el runtime cae a fetch) y huérfanos."""
+    index_set = set(index_ids)
+    store_set = set(store.all_ids())
+    missing = sorted(index_set - store_set)
+    orphaned = sorted(store_set - index_set)
+    return {
+        "index_ids": len(index_set),
+        "store_ids": len(store_set),
+        "missing_in_store": missing,
+        "orphaned_in_store": orphaned,
+        "data_versions": store.versions(),
+        "ok": not missing,
+    }
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import math
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .near_dedup import product_filter
+from .sessions import normalize_text
+
+# Palabras de presentación/dosis que la gente no dice al nombrar un producto.
+_FORMAT_WORDS = {
+    "mg", "mcg", "g", "ml", "ui", "iu", "x", "caps", "capsulas", "tabletas", "tabs", "softgels",
+    "gomitas", "sobres", "polvo", "unidades", "und",
+}
+_MIN_PHRASE_CHARS = 4
+_MIN_ALIAS_CHARS = 5
+_UNKNOWN_NAMES = {"unknown product name", "unknown product"}
+
+
+@dataclass(frozen=True)
+class Facet:
+    """Entidad del catálogo nombrada en la pregunta: un producto o un objetivo de salud (tag)."""
+
+    kind: str  # "product" | "goal"
+    key: str  # product_id, o el tag tal cual está en la metadata
+    label: str
+
+    def pinecone_filter(self) -> Dict[str, Any]:
+        if self.kind == "product":
+            # `product_ids` lo tienen los representantes de casi-duplicados (ver near_dedup).
+            return product_filter([self.key])
+        return {"health_goal_tags": {"$in": [self.key]}}
+
+
+@dataclass(frozen=True)
+class SubQuery:
+    facet: Facet
+    text: str
+    pinecone_filter: Dict[str, Any]
+
+
+def _as_list(value: Any) -> List[str]:
+    if isinstance(value, list):
+        return [str(v) for v in value if v]
+    if isinstance(value, str) and value.strip():
+        return [p.strip() for p in value.split(",") if p.strip()]
+    return []
+
+
+def _product_phrases(name: str) -> Set[str]:
+    """
+    Nombre completo, nombre sin presentación ("Magnesio Citrato 400 mg" → "magnesio citrato") y
+    primera palabra ("magnesio"): la gente rara vez dice el nombre entero. Las que comparten
+    varios productos ("vitamina", "omega") se descartan en CatalogVocabulary.
+    """
+    full = normalize_text(name)
+    words = [w for w in full.split() if w not in _FORMAT_WORDS and not any(ch.isdigit() for ch in w)]
+    phrases = {full, " ".join(words)}
+    if words and len(words[0]) >= _MIN_ALIAS_CHARS:
+        phrases.add(words[0])
+    return {p for p in phrases if p}
+
+
+class CatalogVocabulary:
+    """
+    Frases del catálogo (nombres de producto y health_goal_tags, normalizados sin tildes) para
+    reconocer entidades en una pregunta sin llamar al LLM. Una frase que nombra a más de un
+    producto (ej. la línea "Omega") no identifica a ninguno y se descarta.
+    """
+
+    def __init__(self, products: Dict[str, str], goals: Iterable[str] = ()):
+        owners: Dict[str, Set[Facet]] = defaultdict(set)
+        for pid, name in products.items():
+            facet = Facet("product", pid, name)
+            for phrase in _product_phrases(name):
+                owners[phrase].add(facet)
+        for tag in goals:
+            phrase = normalize_text(tag)
+            if phrase:
+                owners[phrase].add(Facet("goal", tag, tag.replace("_", " ")))
+        self._phrases: List[Tuple[str, Facet]] = sorted(
+            ((p, next(iter(fs))) for p, fs in owners.items() if len(fs) == 1 and len(p) >= _MIN_PHRASE_CHARS),
+            key=lambda x: -len(x[0]),
+        )
+
+    @classmethod
+    def from_metadata(cls, metadatas: Iterable[Dict[str, Any]]) -> "CatalogVocabulary":
+        products: Dict[str, str] = {}
+        goals: Set[str] = set()
+        for md in metadatas:
+            pid = str(md.get("product_id") or "").strip()
+            name = str(md.get("product_name") or "").strip()
+            if pid and name and normalize_text(name) not in _UNKNOWN_NAMES:
+                products.setdefault(pid, name)
+            goals.update(_as_list(md.get("health_goal_tags")))
+        return cls(products, goals)
+
+    def __len__(self) -> int:
+        return len(self._phrases)
+
+    def facets(self, question: str) -> List[Facet]:
+        """Entidades en orden de aparición; las frases más largas ganan y no se solapan."""
+        q = f" {normalize_text(question)} "
+        found: List[Tuple[int, Facet]] = []
+        for phrase, facet in self._phrases:
+            needle = f" {phrase} "
+            pos = q.find(needle)
+            if pos < 0:
+                continue
+            # Se tapa la frase (mismo largo) para que sus sub-frases no vuelvan a coincidir.
+            q = q.replace(needle, " " + "#" * len(phrase) + " ")
+            if all(f != facet for _, f in found):
+                found.append((pos, facet))
+        return [f for _, f in sorted(found, key=lambda x: x[0])]
+
+
+class QueryDecomposer:
+    """
+    Divide preguntas que nombran 2+ productos ("diferencia entre X y Y") o 2+ objetivos de salud
+    ("algo para el sueño y para la digestión") en una sub-consulta por entidad, filtrada por
+    producto o tag, para que una sola entidad no se lleve todos los `top_k` del retrieval.
+    """
+
+    def __init__(self, catalog: CatalogVocabulary, max_facets: int = 3, min_per_facet: int = 2):
+        self.catalog = catalog
+        self.max_facets = max(2, max_facets)
+        self.min_per_facet = max(1, min_per_facet)
+
+    def decompose(self, question: str, pinecone_filter: Optional[Dict[str, Any]] = None) -> List[SubQuery]:
+        """[] si la pregunta no es multi-entidad (va por el retrieval normal)."""
+        facets = self.catalog.facets(question)
+        products = [f for f in facets if f.kind == "product"]
+        goals = [f for f in facets if f.kind == "goal"]
+        group = products if len(products) >= 2 else goals if len(goals) >= 2 else []
+        out = []
+        for facet in group[: self.max_facets]:
+            flt = facet.pinecone_filter()
+            if pinecone_filter:
+                flt = {"$and": [pinecone_filter, flt]}
+            out.append(SubQuery(facet=facet, text=f"{facet.label}: {question}", pinecone_filter=flt))
+        return out
+
+    def per_facet_k(self, top_k: int, facets: int) -> int:
+        return max(self.min_per_facet, math.ceil(top_k / max(1, facets)))
+
+    def merged_k(self, top_k: int, facets: int) -> int:
+        return max(top_k, facets * self.min_per_facet)
+
+
+def interleave(groups: List[List[Any]], limit: int, key: Callable[[Any], str]) -> List[Any]:
+    """Mezcla balanceada: el 1º de cada entidad, luego el 2º, ...; sin repetir ids, hasta `limit`."""
+    out: List[Any] = []
+    seen: Set[str] = set()
+    for rank in range(max((len(g) for g in groups), default=0)):
+        for g in groups:
+            if rank < len(g) and key(g[rank]) not in seen:
+                seen.add(key(g[rank]))
+                out.append(g[rank])
+                if len(out) >= limit:
+                    return out
+    return out
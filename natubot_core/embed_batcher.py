@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, List, Optional
+
+from .metrics import metrics
+from .resilience import DeadlineExceeded
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+WAIT_MS_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+
+class _Batch:
+    def __init__(self) -> None:
+        self.texts: List[str] = []
+        self.arrivals: List[float] = []
+        self.deadlines: List[Optional[float]] = []
+        self.results: Optional[List[List[float]]] = None
+        self.error: Optional[BaseException] = None
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+class EmbedBatcher:
+    """
+    Junta llamadas `embed_query` concurrentes en un solo `embed_content` con lista.
+    El primer hilo que abre un lote es el líder: espera hasta `max_wait_ms` (o a que el
+    lote llegue a `max_batch`), envía el lote y reparte los vectores. Con menos de
+    `min_concurrency` embeds en curso la llamada va directa, sin espera: a baja carga
+    el batching queda apagado solo.
+
+    Métricas: histogramas embed_batch.size y embed_batch.wait_ms (espera agregada por
+    llamada) y contadores embed_batch.batches / embed_batch.direct.
+    """
+
+    def __init__(
+        self,
+        embed_many: Callable[[List[str], Optional[float]], List[List[float]]],
+        max_batch: int = 16,
+        max_wait_ms: float = 8.0,
+        min_concurrency: int = 4,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.embed_many = embed_many
+        self.max_batch = max(1, max_batch)
+        self.max_wait_sec = max(0.0, max_wait_ms) / 1000.0
+        self.min_concurrency = max(1, min_concurrency)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._open: Optional[_Batch] = None
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        now = self.clock()
+        with self._lock:
+            self._inflight += 1
+            batch = self._open
+            direct = batch is None and self._inflight < self.min_concurrency
+            if not direct:
+                leader = batch is None
+                if leader:
+                    batch = self._open = _Batch()
+                index = len(batch.texts)
+                batch.texts.append(text)
+                batch.arrivals.append(now)
+                batch.deadlines.append(now + timeout if timeout else None)
+                if len(batch.texts) >= self.max_batch:
+                    self._close(batch)
+        try:
+            if direct:
+                metrics.inc("embed_batch.direct")
+                return self.embed_many([text], timeout)[0]
+            if leader:
+                self._lead(batch)
+            elif not batch.done.wait(timeout + self.max_wait_sec if timeout else None):
+                raise DeadlineExceeded("gemini.embed: timeout esperando el lote de embeddings")
+            if batch.error is not None:
+                raise batch.error
+            return batch.results[index]
+        finally:
+            with self._lock:
+                self._inflight -= 1
+
+    def _close(self, batch: _Batch) -> None:
+        # Con el lock tomado: el lote deja de aceptar textos.
+        if self._open is batch:
+            self._open = None
+        batch.full.set()
+
+    def _lead(self, batch: _Batch) -> None:
+        batch.full.wait(self.max_wait_sec)
+        with self._lock:
+            self._close(batch)
+        sent_at = self.clock()
+        deadlines = [d for d in batch.deadlines if d is not None]
+        timeout = max(0.001, min(deadlines) - sent_at) if deadlines else None
+        metrics.inc("embed_batch.batches")
+        metrics.observe("embed_batch.size", len(batch.texts), buckets=BATCH_SIZE_BUCKETS)
+        for arrived in batch.arrivals:
+            metrics.observe("embed_batch.wait_ms", (sent_at - arrived) * 1000.0, buckets=WAIT_MS_BUCKETS)
+        try:
+            results = self.embed_many(batch.texts, timeout)
+            if len(results) != len(batch.texts):
+                raise RuntimeError(f"embed_content devolvió {len(results)} vectores para {len(batch.texts)} textos")
+            batch.results = results
+        except BaseException as e:
+            batch.error = e
+        finally:
+            batch.done.set()
@@ -1,26 +1,251 @@
 from __future__ import annotations
 
-from typing import List
+import hashlib
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from google import genai
 from google.genai import types
 
+from .embed_batcher import EmbedBatcher
+from .metrics import metrics
+from .resilience import CircuitBreaker, DeadlineExceeded, is_timeout_error
+
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+# Parte del presupuesto de `generate` que puede gastar crear/renovar el caché de contexto;
+# si no alcanza, el system_instruction va inline y la generación conserva el resto.
+CONTEXT_CACHE_TIMEOUT_SHARE = 0.25
+
+def _http_options(timeout: Optional[float]) -> Optional[types.HttpOptions]:
+    # HttpOptions.timeout va en milisegundos.
+    return types.HttpOptions(timeout=max(1, int(timeout * 1000))) if timeout else None
+
+def _guarded(breaker: Optional[CircuitBreaker], fn: Callable[[], Any], what: str) -> Any:
+    def _call() -> Any:
+        try:
+            return fn()
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            if is_timeout_error(e):
+                raise DeadlineExceeded(f"{what}: timeout del upstream") from e
+            raise
+    return breaker.call(_call) if breaker is not None else _call()
+
+def _record_usage(resp: Any) -> Dict[str, int]:
+    usage = getattr(resp, "usage_metadata", None)
+    if usage is None:
+        return {}
+    out: Dict[str, int] = {}
+    for key, name, value in (
+        ("prompt_tokens", "gemini.prompt_tokens", usage.prompt_token_count),
+        ("cached_tokens", "gemini.cached_tokens", usage.cached_content_token_count),
+        ("output_tokens", "gemini.output_tokens", usage.candidates_token_count),
+    ):
+        if value is not None:
+            metrics.observe(name, value, buckets=TOKEN_BUCKETS)
+            out[key] = int(value)
+    return out
+
+@dataclass
+class _CachedInstruction:
+    name: str
+    expires_at: float
+
+class ContextCache:
+    """
+    Cached content explícito de Gemini para los system_instruction estáticos (uno por
+    texto y modelo: el caché solo sirve para el modelo con que se creó).
+    Se renueva el TTL `refresh_margin_sec` antes de expirar; si crear o renovar falla
+    (ej. el preámbulo no llega al mínimo de tokens del modelo) se reintenta tras
+    `retry_after_sec` y mientras tanto el instruction va inline.
+    La llamada remota va fuera del lock y una sola por clave a la vez (single-flight): las
+    demás esperan su resultado hasta `timeout` y, si no llega, usan el caché vigente o inline.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        model: str,
+        ttl_sec: float = 3600,
+        refresh_margin_sec: float = 300,
+        retry_after_sec: float = 300,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.client = client
+        self.model = model
+        self.ttl_sec = ttl_sec
+        self.refresh_margin_sec = min(refresh_margin_sec, ttl_sec / 2)
+        self.retry_after_sec = retry_after_sec
+        self.clock = clock
+        self._entries: Dict[str, _CachedInstruction] = {}
+        self._failed_until: Dict[str, float] = {}
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, system_instruction: str, model: Optional[str]) -> str:
+        return hashlib.sha256(f"{model or self.model}\n{system_instruction}".encode("utf-8")).hexdigest()
+
+    def _usable(self, entry: Optional[_CachedInstruction], now: float) -> Optional[str]:
+        return entry.name if entry is not None and now < entry.expires_at else None
+
+    def name_for(
+        self, system_instruction: str, model: Optional[str] = None, timeout: Optional[float] = None
+    ) -> Optional[str]:
+        """
+        Nombre del cached content vigente para `system_instruction`, o None (va inline).
+        `timeout` acota tanto la llamada remota como la espera de la que ya está en curso.
+        """
+        key = self._key(system_instruction, model)
+        with self._lock:
+            now = self.clock()
+            entry = self._entries.get(key)
+            if entry is not None and now < entry.expires_at - self.refresh_margin_sec:
+                return entry.name
+            if self._failed_until.get(key, 0.0) > now:
+                return self._usable(entry, now)
+            flight = self._inflight.get(key)
+            owner = flight is None
+            if owner:
+                flight = self._inflight[key] = Future()
+        if not owner:
+            try:
+                return flight.result(timeout=timeout)
+            except FutureTimeout:
+                metrics.inc("gemini.cache_timeouts")
+                with self._lock:
+                    return self._usable(self._entries.get(key), self.clock())
+
+        name: Optional[str] = None
+        try:
+            name = self._refresh(key, entry, now, system_instruction, model, timeout)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.set_result(name)
+        return name
+
+    def _refresh(
+        self,
+        key: str,
+        entry: Optional[_CachedInstruction],
+        now: float,
+        system_instruction: str,
+        model: Optional[str],
+        timeout: Optional[float],
+    ) -> Optional[str]:
+        ttl = f"{int(self.ttl_sec)}s"
+        try:
+            if entry is not None and now < entry.expires_at:
+                self.client.caches.update(
+                    name=entry.name,
+                    config=types.UpdateCachedContentConfig(ttl=ttl, http_options=_http_options(timeout)),
+                )
+                metrics.inc("gemini.cache_refreshes")
+                name = entry.name
+            else:
+                cached = self.client.caches.create(
+                    model=model or self.model,
+                    config=types.CreateCachedContentConfig(
+                        system_instruction=system_instruction,
+                        ttl=ttl,
+                        display_name=f"natubot-{key[:12]}",
+                        http_options=_http_options(timeout),
+                    ),
+                )
+                metrics.inc("gemini.cache_creates")
+                name = cached.name
+        except Exception as e:
+            metrics.inc("gemini.cache_timeouts" if is_timeout_error(e) else "gemini.cache_errors")
+            with self._lock:
+                self._failed_until[key] = now + self.retry_after_sec
+                if entry is not None and now < entry.expires_at:
+                    return entry.name
+                self._entries.pop(key, None)
+            return None
+        with self._lock:
+            self._entries[key] = _CachedInstruction(name=name, expires_at=now + self.ttl_sec)
+            self._failed_until.pop(key, None)
+        return name
+
+    def invalidate(self, system_instruction: str, model: Optional[str] = None) -> None:
+        with self._lock:
+            self._entries.pop(self._key(system_instruction, model), None)
+
 class GeminiClient:
-    def __init__(self, api_key: str, chat_model: str, embed_model: str, embed_dim: int):
-        self.client = genai.Client(api_key=api_key)
+    def __init__(
+        self,
+        api_key: str,
+        chat_model: str,
+        embed_model: str,
+        embed_dim: int,
+        embed_breaker: Optional[CircuitBreaker] = None,
+        generate_breaker: Optional[CircuitBreaker] = None,
+        model_breakers: Optional[Dict[str, CircuitBreaker]] = None,
+        context_cache_ttl_sec: float = 0.0,
+        context_cache_refresh_sec: float = 300,
+        client: Any = None,
+        embed_batch_max: int = 0,
+        embed_batch_wait_ms: float = 8.0,
+        embed_batch_min_concurrency: int = 4,
+    ):
+        """
+        `context_cache_ttl_sec` > 0 activa el caché explícito de los system_instruction.
+        `embed_batch_max` > 1 junta `embed_query` concurrentes en un solo request (EmbedBatcher).
+        `model_breakers` da a otros modelos (tiers de ModelRouter) su propio breaker de generate;
+        los que no estén usan `generate_breaker`.
+        `client` permite inyectar un fake con la misma interfaz que `genai.Client`.
+        """
+        self.client = client if client is not None else genai.Client(api_key=api_key)
         self.chat_model = chat_model
         self.embed_model = embed_model
         self.embed_dim = embed_dim
-
-    def embed_query(self, text: str) -> List[float]:
-        res = self.client.models.embed_content(
-            model=self.embed_model,
-            contents=text,
-            config=types.EmbedContentConfig(
-                task_type="RETRIEVAL_QUERY",
-                output_dimensionality=self.embed_dim,
-            ),
+        self.embed_breaker = embed_breaker
+        self.generate_breaker = generate_breaker
+        self.model_breakers = dict(model_breakers or {})
+        self.context_cache = (
+            ContextCache(
+                self.client,
+                chat_model,
+                ttl_sec=context_cache_ttl_sec,
+                refresh_margin_sec=context_cache_refresh_sec,
+            )
+            if context_cache_ttl_sec > 0
+            else None
         )
-        return res.embeddings[0].values
+        self.embed_batcher = (
+            EmbedBatcher(
+                self.embed_queries,
+                max_batch=embed_batch_max,
+                max_wait_ms=embed_batch_wait_ms,
+                min_concurrency=embed_batch_min_concurrency,
+            )
+            if embed_batch_max > 1
+            else None
+        )
+
+    def embed_query(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        if self.embed_batcher is not None:
+            return self.embed_batcher.embed(text, timeout)
+        return self.embed_queries([text], timeout)[0]
+
+    def embed_queries(self, texts: List[str], timeout: Optional[float] = None) -> List[List[float]]:
+        """Varias consultas (RETRIEVAL_QUERY) en un solo request."""
+        def _call():
+            return self.client.models.embed_content(
+                model=self.embed_model,
+                contents=texts,
+                config=types.EmbedContentConfig(
+                    task_type="RETRIEVAL_QUERY",
+                    output_dimensionality=self.embed_dim,
+                    http_options=_http_options(timeout),
+                ),
+            )
+        res = _guarded(self.embed_breaker, _call, "gemini.embed")
+        return [e.values for e in res.embeddings]
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         res = self.client.models.embed_content(
@@ -33,13 +258,86 @@ class GeminiClient:
         )
         return [e.values for e in res.embeddings]
 
-    def generate(self, prompt: str, temperature: float = 0.2, max_output_tokens: int = 800) -> str:
-        resp = self.client.models.generate_content(
+    def generate_breaker_for(self, model: str) -> Optional[CircuitBreaker]:
+        return self.model_breakers.get(model, self.generate_breaker)
+
+    def generate(
+        self,
+        prompt: str,
+        temperature: float = 0.2,
+        max_output_tokens: int = 800,
+        timeout: Optional[float] = None,
+        system_instruction: Optional[str] = None,
+        model: Optional[str] = None,
+    ) -> str:
+        """
+        `system_instruction` (parte estática del prompt) va en el config o, con caché de
+        contexto, como `cached_content`; `prompt` queda solo con la parte dinámica.
+        `model` reemplaza a `chat_model` (tiers de ModelRouter).
+        """
+        text, _ = self.generate_with_usage(
+            prompt,
+            temperature=temperature,
+            max_output_tokens=max_output_tokens,
+            timeout=timeout,
+            system_instruction=system_instruction,
+            model=model,
+        )
+        return text
+
+    def generate_with_usage(
+        self,
+        prompt: str,
+        temperature: float = 0.2,
+        max_output_tokens: int = 800,
+        timeout: Optional[float] = None,
+        system_instruction: Optional[str] = None,
+        model: Optional[str] = None,
+    ) -> Tuple[str, Dict[str, int]]:
+        """Como `generate`, más los tokens del `usage_metadata` (prompt/cached/output)."""
+        model = model or self.chat_model
+
+        def _generate(cached_name: Optional[str], timeout: Optional[float]):
+            return self.client.models.generate_content(
+                model=model,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    temperature=temperature,
+                    max_output_tokens=max_output_tokens,
+                    system_instruction=None if cached_name else system_instruction,
+                    cached_content=cached_name,
+                    http_options=_http_options(timeout),
+                ),
+            )
+
+        def _call():
+            cached_name = None
+            remaining = timeout
+            if system_instruction and self.context_cache is not None:
+                started = time.monotonic()
+                cache_timeout = timeout * CONTEXT_CACHE_TIMEOUT_SHARE if timeout else None
+                cached_name = self.context_cache.name_for(system_instruction, model, timeout=cache_timeout)
+                if timeout:
+                    remaining = max(0.001, timeout - (time.monotonic() - started))
+            if cached_name is None:
+                return _generate(None, remaining)
+            try:
+                return _generate(cached_name, remaining)
+            except Exception as e:
+                if is_timeout_error(e):
+                    raise
+                # Caché borrado o expirado del lado de Gemini: se recrea en la próxima llamada.
+                metrics.inc("gemini.cache_errors")
+                self.context_cache.invalidate(system_instruction, model)
+                return _generate(None, remaining)
+
+        resp = _guarded(self.generate_breaker_for(model), _call, "gemini.generate")
+        usage = _record_usage(resp)
+        return (resp.text or "").strip(), usage
+
+    def ping(self, timeout: Optional[float] = None) -> None:
+        # Metadata del modelo: valida key + conectividad sin consumir tokens.
+        self.client.models.get(
             model=self.chat_model,
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                temperature=temperature,
-                max_output_tokens=max_output_tokens,
-            ),
+            config=types.GetModelConfig(http_options=_http_options(timeout)),
         )
-        return (resp.text or "").strip()
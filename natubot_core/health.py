@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+
+@dataclass
+class ProbeResult:
+    ok: bool
+    latency_ms: float
+    checked_at: float
+    error: Optional[str] = None
+    detail: Optional[Dict[str, Any]] = None
+    deep: bool = False
+
+
+@dataclass
+class _Probe:
+    name: str
+    check: Callable[[], Any]
+    critical: bool = True
+    deep_check: Optional[Callable[[], Any]] = None
+    result: Optional[ProbeResult] = None
+
+
+class DependencyProber:
+    """
+    Chequea dependencias (Pinecone, Gemini, STT/TTS) en un hilo de fondo y guarda
+    el último resultado en memoria para que `/health` no haga llamadas remotas.
+    """
+
+    def __init__(self, interval_sec: float = 30.0, stale_after_sec: float = 120.0):
+        self.interval_sec = max(1.0, float(interval_sec))
+        self.stale_after_sec = max(self.interval_sec, float(stale_after_sec))
+        self._probes: Dict[str, _Probe] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(
+        self,
+        name: str,
+        check: Callable[[], Any],
+        *,
+        critical: bool = True,
+        deep_check: Optional[Callable[[], Any]] = None,
+    ) -> None:
+        with self._lock:
+            self._probes[name] = _Probe(name=name, check=check, critical=critical, deep_check=deep_check)
+
+    def _run_probe(self, probe: _Probe, deep: bool) -> ProbeResult:
+        fn = probe.deep_check if (deep and probe.deep_check is not None) else probe.check
+        start = time.perf_counter()
+        try:
+            detail = fn()
+            result = ProbeResult(
+                ok=True,
+                latency_ms=(time.perf_counter() - start) * 1000.0,
+                checked_at=time.time(),
+                detail=detail if isinstance(detail, dict) else None,
+                deep=deep,
+            )
+        except Exception as e:
+            result = ProbeResult(
+                ok=False,
+                latency_ms=(time.perf_counter() - start) * 1000.0,
+                checked_at=time.time(),
+                error=str(e) or e.__class__.__name__,
+                deep=deep,
+            )
+        with self._lock:
+            probe.result = result
+        return result
+
+    def run_once(self, deep: bool = False) -> None:
+        with self._lock:
+            probes = list(self._probes.values())
+        for probe in probes:
+            self._run_probe(probe, deep)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval_sec)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="natubot-health-prober", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            probes = [(p.name, p.critical, p.result) for p in self._probes.values()]
+
+        ok = True
+        starting = False
+        checks: Dict[str, Any] = {}
+        for name, critical, r in probes:
+            if r is None:
+                # Todavía no corrió (arranque del worker): no es una falla, se reporta aparte.
+                checks[name] = {"ok": None, "status": "starting", "critical": critical}
+                starting = starting or critical
+                continue
+
+            age = now - r.checked_at
+            stale = age > self.stale_after_sec
+            entry: Dict[str, Any] = {
+                "ok": r.ok,
+                "status": "stale" if stale else ("up" if r.ok else "down"),
+                "critical": critical,
+                "latency_ms": round(r.latency_ms, 1),
+                "checked_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(r.checked_at)),
+                "age_sec": round(age, 1),
+                "deep": r.deep,
+            }
+            if r.error:
+                entry["error"] = r.error
+            if r.detail:
+                entry["detail"] = r.detail
+            checks[name] = entry
+            if critical and (not r.ok or stale):
+                ok = False
+
+        return {"ok": ok, "starting": starting, "checks": checks}
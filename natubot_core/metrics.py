@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Sequence
+
+DEFAULT_MS_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Histogram:
+    """Histograma de buckets fijos + muestra reciente para percentiles aproximados."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_MS_BUCKETS, recent: int = 512):
+        self.bounds = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self._recent: Deque[float] = deque(maxlen=recent)
+
+    def observe(self, value: float) -> None:
+        idx = len(self.bounds)
+        for i, b in enumerate(self.bounds):
+            if value <= b:
+                idx = i
+                break
+        self.counts[idx] += 1
+        self.total += 1
+        self.sum += value
+        self._recent.append(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        recent: List[float] = sorted(self._recent)
+
+        def pct(p: float) -> float:
+            if not recent:
+                return 0.0
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))], 2)
+
+        labels = [f"le_{b:g}" for b in self.bounds] + ["inf"]
+        return {
+            "count": self.total,
+            "sum": round(self.sum, 2),
+            "p50": pct(0.50),
+            "p95": pct(0.95),
+            "max": round(recent[-1], 2) if recent else 0.0,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class MetricsRegistry:
+    """Registro en memoria (por proceso) de contadores, histogramas y gauges; se sirve en /metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._gauges: Dict[str, Callable[[], Any]] = {}
+
+    def inc(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = DEFAULT_MS_BUCKETS) -> None:
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = Histogram(buckets)
+            hist.observe(value)
+
+    def gauge(self, name: str, fn: Callable[[], Any]) -> None:
+        with self._lock:
+            self._gauges[name] = fn
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: h.snapshot() for k, h in self._histograms.items()}
+            gauges = dict(self._gauges)
+
+        gauge_values: Dict[str, Any] = {}
+        for name, fn in gauges.items():
+            try:
+                gauge_values[name] = fn()
+            except Exception as e:
+                gauge_values[name] = f"error: {e}"
+        return {"counters": counters, "histograms": histograms, "gauges": gauge_values}
+
+
+# Singleton por proceso (mismo patrón que los clientes en app.main)
+metrics = MetricsRegistry()
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from .gemini_client import GeminiClient
+from .logging_utils import log_event
+from .metrics import metrics
+from .profiling import propagate
+from .resilience import DeadlineExceeded, RequestCancelled
+
+LATENCY_MS_BUCKETS = (250, 500, 1000, 1500, 2000, 3000, 5000, 8000, 12000, 20000)
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    """Modelo de un tier + presupuesto de latencia antes de hedgear + precio USD por millón de tokens."""
+
+    name: str
+    model: str
+    latency_budget_ms: float
+    input_usd_per_mtok: float = 0.0
+    output_usd_per_mtok: float = 0.0
+
+    def cost_usd(self, usage: Dict[str, int]) -> float:
+        return (
+            usage.get("prompt_tokens", 0) * self.input_usd_per_mtok
+            + usage.get("output_tokens", 0) * self.output_usd_per_mtok
+        ) / 1_000_000
+
+
+@dataclass(frozen=True)
+class RoutingFeatures:
+    question_words: int
+    score_margin: Optional[float]
+    distinct_products: int
+    contexts: int
+    voice: bool
+
+
+def routing_features(question: str, contexts: List[Dict[str, Any]], voice: bool = False) -> RoutingFeatures:
+    """Señales baratas (sin LLM): largo de la pregunta, margen top1-top2 del retrieval y productos."""
+    scores = sorted((float(c["score"]) for c in contexts if c.get("score") is not None), reverse=True)
+    products = {
+        (c.get("metadata") or {}).get("product_id") or (c.get("metadata") or {}).get("product_name")
+        for c in contexts
+    }
+    products.discard(None)
+    return RoutingFeatures(
+        question_words=len((question or "").split()),
+        score_margin=round(scores[0] - scores[1], 4) if len(scores) >= 2 else None,
+        distinct_products=len(products),
+        contexts=len(contexts),
+        voice=voice,
+    )
+
+
+@dataclass(frozen=True)
+class RoutingPolicy:
+    max_question_words: int = 14
+    min_score_margin: float = 0.03
+    max_products: int = 1
+    # En voz la respuesta es corta y la latencia pesa más: se tolera un margen de score menor.
+    voice_min_score_margin: float = 0.0
+
+
+class ModelRouter:
+    """
+    Elige tier rápido o completo para `generate` con señales del turno (ver RoutingPolicy):
+    pregunta corta, un solo producto y un retrieval claro (margen top1-top2) van al tier
+    rápido; comparaciones entre productos o preguntas largas al completo.
+    Con `hedge`, si el tier elegido supera su `latency_budget_ms` se lanza el otro y gana
+    el primero que responde (el perdedor termina en segundo plano y se contabiliza igual).
+    Si el tier elegido falla antes, se reintenta en el otro con el tiempo que quede.
+
+    Métricas por tier: llm.<tier>.calls / errors / cost_usd / latency_ms, llm.route.<tier>,
+    llm.hedges, llm.hedge_wins y llm.failovers. Cada decisión se registra como evento `llm_route`.
+    """
+
+    def __init__(
+        self,
+        gemini: GeminiClient,
+        fast: ModelTier,
+        full: ModelTier,
+        executor: Executor,
+        policy: RoutingPolicy = RoutingPolicy(),
+        hedge: bool = True,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.gemini = gemini
+        self.fast = fast
+        self.full = full
+        self.executor = executor
+        self.policy = policy
+        self.hedge = hedge
+        self.logger = logger
+
+    def choose(self, features: RoutingFeatures) -> Tuple[ModelTier, str]:
+        p = self.policy
+        if features.distinct_products > p.max_products:
+            return self.full, "multi_producto"
+        if features.question_words > p.max_question_words:
+            return self.full, "pregunta_larga"
+        min_margin = p.voice_min_score_margin if features.voice else p.min_score_margin
+        if features.score_margin is not None and features.score_margin < min_margin:
+            return self.full, "retrieval_ambiguo"
+        return self.fast, "voz_simple" if features.voice else "simple"
+
+    def _call(self, tier: ModelTier, kwargs: Dict[str, Any]) -> Tuple[str, Dict[str, int]]:
+        started = time.monotonic()
+        metrics.inc(f"llm.{tier.name}.calls")
+        try:
+            text, usage = self.gemini.generate_with_usage(model=tier.model, **kwargs)
+        except Exception:
+            metrics.inc(f"llm.{tier.name}.errors")
+            raise
+        finally:
+            metrics.observe(
+                f"llm.{tier.name}.latency_ms", (time.monotonic() - started) * 1000.0, buckets=LATENCY_MS_BUCKETS
+            )
+        metrics.inc(f"llm.{tier.name}.cost_usd", tier.cost_usd(usage))
+        return text, usage
+
+    def generate(
+        self,
+        prompt: str,
+        *,
+        features: RoutingFeatures,
+        temperature: float = 0.2,
+        max_output_tokens: int = 800,
+        timeout: Optional[float] = None,
+        system_instruction: Optional[str] = None,
+    ) -> Tuple[str, str]:
+        """(texto, nombre del tier que respondió)."""
+        primary, reason = self.choose(features)
+        secondary = self.full if primary is self.fast else self.fast
+        metrics.inc(f"llm.route.{primary.name}")
+        kwargs = {
+            "prompt": prompt,
+            "temperature": temperature,
+            "max_output_tokens": max_output_tokens,
+            "timeout": timeout,
+            "system_instruction": system_instruction,
+        }
+        started = time.monotonic()
+        futures: Dict[Future, ModelTier] = {self.executor.submit(propagate(self._call), primary, kwargs): primary}
+
+        budget_sec = primary.latency_budget_ms / 1000.0
+        hedged = False
+        if self.hedge and (timeout is None or timeout > budget_sec):
+            done, _ = wait(futures, timeout=budget_sec)
+            if not done:
+                hedged = True
+                metrics.inc("llm.hedges")
+                remaining = None if timeout is None else max(0.001, timeout - (time.monotonic() - started))
+                futures[self.executor.submit(propagate(self._call), secondary, dict(kwargs, timeout=remaining))] = secondary
+
+        winner: Optional[ModelTier] = None
+        text = ""
+        usage: Dict[str, int] = {}
+        error: Optional[BaseException] = None
+        failover = False
+        pending = set(futures)
+        while pending and winner is None:
+            remaining = None if timeout is None else timeout - (time.monotonic() - started)
+            if remaining is not None and remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for f in done:
+                try:
+                    text, usage = f.result()
+                    winner = futures[f]
+                    break
+                except RequestCancelled:
+                    raise
+                except Exception as e:
+                    error = error or e
+            if winner is None and not pending and secondary not in futures.values():
+                # Error rápido del tier elegido (no timeout): el otro tier con lo que quede del presupuesto.
+                remaining = None if timeout is None else timeout - (time.monotonic() - started)
+                if remaining is None or remaining > 0:
+                    failover = True
+                    metrics.inc("llm.failovers")
+                    f = self.executor.submit(propagate(self._call), secondary, dict(kwargs, timeout=remaining))
+                    futures[f] = secondary
+                    pending = {f}
+
+        if hedged and winner is secondary:
+            metrics.inc("llm.hedge_wins")
+        if self.logger is not None:
+            log_event(
+                self.logger,
+                {
+                    "ts": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                    "event": "llm_route",
+                    "tier": primary.name,
+                    "reason": reason,
+                    "features": asdict(features),
+                    "hedged": hedged,
+                    "failover": failover,
+                    "winner": winner.name if winner is not None else None,
+                    "latency_ms": int((time.monotonic() - started) * 1000),
+                    "prompt_tokens": usage.get("prompt_tokens"),
+                    "output_tokens": usage.get("output_tokens"),
+                    "cost_usd": winner.cost_usd(usage) if winner is not None else None,
+                },
+            )
+        if winner is None:
+            if error is not None:
+                raise error
+            raise DeadlineExceeded("gemini.generate: timeout (ningún tier respondió)")
+        return text, winner.name
@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .sessions import normalize_text
+
+_PRIME = (1 << 31) - 1
+# Listas de metadata que se unen al absorber un duplicado (filtros por producto/tag siguen funcionando).
+_UNION_FIELDS = ("health_goal_tags", "ingredient_tags", "source_pages")
+_MAX_DUPLICATE_IDS = 100
+
+
+@dataclass(frozen=True)
+class NearDupConfig:
+    """
+    MinHash + LSH sobre shingles de `shingle_words` palabras (texto normalizado, sin tildes).
+    Con `bands` x `rows` = `num_perm`, un par con Jaccard J es candidato con probabilidad
+    1 - (1 - J^rows)^bands; los candidatos se confirman con la similitud estimada por la firma
+    completa (>= `threshold`) y, con `same_numbers`, solo si ambos textos tienen exactamente
+    los mismos números: "2 cápsulas" y "3 cápsulas" no son el mismo párrafo de dosis.
+    """
+
+    threshold: float = 0.9
+    num_perm: int = 128
+    bands: int = 16
+    shingle_words: int = 3
+    same_numbers: bool = True
+    seed: int = 17
+
+    @property
+    def rows(self) -> int:
+        return self.num_perm // self.bands
+
+
+def _shingle_hashes(tokens: Sequence[str], k: int) -> np.ndarray:
+    if len(tokens) <= k:
+        grams = {" ".join(tokens)}
+    else:
+        grams = {" ".join(tokens[i : i + k]) for i in range(len(tokens) - k + 1)}
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little") for g in grams),
+        dtype=np.uint64,
+        count=len(grams),
+    )
+
+
+class MinHasher:
+    def __init__(self, config: NearDupConfig):
+        if config.num_perm % config.bands:
+            raise ValueError("num_perm debe ser múltiplo de bands")
+        self.config = config
+        rng = np.random.default_rng(config.seed)
+        # Permutaciones h(x) = (a*x + b) mod p con x < 2^32 y a, b < 2^31: cabe en uint64.
+        self.a = rng.integers(1, _PRIME, size=config.num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _PRIME, size=config.num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        tokens = normalize_text(text).split()
+        hashes = _shingle_hashes(tokens, self.config.shingle_words)
+        if hashes.size == 0:
+            return np.full(self.config.num_perm, _PRIME, dtype=np.uint64)
+        return ((np.outer(self.a, hashes) + self.b[:, None]) % _PRIME).min(axis=1)
+
+    def bands(self, signature: np.ndarray) -> List[bytes]:
+        r = self.config.rows
+        return [signature[i * r : (i + 1) * r].tobytes() for i in range(self.config.bands)]
+
+
+def _numbers(text: str) -> Tuple[str, ...]:
+    return tuple(sorted(t for t in normalize_text(text).split() if any(ch.isdigit() for ch in t)))
+
+
+def _merge_list(values: List[Any]) -> List[str]:
+    seen: Dict[str, None] = {}
+    for v in values:
+        for x in v if isinstance(v, list) else [v]:
+            if x not in (None, ""):
+                seen.setdefault(str(x), None)
+    return list(seen)
+
+
+def _merge_cluster(rep: Dict[str, Any], members: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Representante con la unión de productos/tags del cluster; ids absorbidos en `near_duplicate_ids`."""
+    everyone = [rep] + members
+    md = dict(rep["metadata"])
+    md["product_ids"] = _merge_list([c["metadata"].get("product_id") for c in everyone])
+    md["product_names"] = _merge_list([c["metadata"].get("product_name") for c in everyone])
+    for key in _UNION_FIELDS:
+        merged = _merge_list([c["metadata"].get(key) for c in everyone])
+        if merged:
+            md[key] = merged
+    md["near_duplicate_ids"] = [c["id"] for c in members][:_MAX_DUPLICATE_IDS]
+    md["near_duplicate_count"] = len(members)
+    return {**rep, "metadata": md}
+
+
+def product_filter(product_ids: Sequence[str]) -> Dict[str, Any]:
+    """Filtro Pinecone por producto que también encuentra representantes de clusters (`product_ids`)."""
+    ids = [str(p) for p in product_ids]
+    if len(ids) == 1:
+        return {"$or": [{"product_id": {"$eq": ids[0]}}, {"product_ids": {"$in": ids}}]}
+    return {"$or": [{"product_id": {"$in": ids}}, {"product_ids": {"$in": ids}}]}
+
+
+def _product_filter_values(cond: Any) -> Optional[List[str]]:
+    if isinstance(cond, (str, int)):
+        return [str(cond)]
+    if isinstance(cond, dict) and len(cond) == 1:
+        if "$eq" in cond and isinstance(cond["$eq"], (str, int)):
+            return [str(cond["$eq"])]
+        if "$in" in cond and isinstance(cond["$in"], list) and cond["$in"]:
+            return [str(v) for v in cond["$in"]]
+    return None
+
+
+def expand_product_filter(flt: Any) -> Any:
+    """
+    Reescribe igualdades `product_id` (`X`, `{"$eq": X}`, `{"$in": [...]}`) con `product_filter`:
+    el chunk que sobrevive a un cluster conserva el `product_id` de su representante, así que un filtro
+    plano por el producto absorbido no lo encontraría. Otros operadores quedan igual; idempotente.
+    """
+    if not isinstance(flt, dict):
+        return flt
+    out: Dict[str, Any] = {}
+    extra: List[Dict[str, Any]] = []
+    for key, cond in flt.items():
+        if key in ("$and", "$or") and isinstance(cond, list):
+            if key == "$or" and any(isinstance(c, dict) and "product_ids" in c for c in cond):
+                out[key] = cond  # ya expandido
+            else:
+                out[key] = [expand_product_filter(c) for c in cond]
+            continue
+        values = _product_filter_values(cond) if key == "product_id" else None
+        if values is None:
+            out[key] = cond
+        else:
+            extra.append(product_filter(values))
+    if not extra:
+        return out
+    if not out and len(extra) == 1:
+        return extra[0]
+    return {"$and": ([out] if out else []) + extra}
+
+
+def collapse_near_duplicates(
+    chunks: List[Dict[str, Any]],
+    config: NearDupConfig = NearDupConfig(),
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Agrupa chunks `{id, text, metadata}` casi idénticos y devuelve (chunks a indexar, clusters).
+    El representante de cada cluster es el texto más largo (cubre a los demás); los clusters se
+    arman alrededor del representante, sin encadenar (A~B y B~C no juntan A con C si A !~ C).
+    El orden de salida respeta el de entrada.
+    """
+    hasher = MinHasher(config)
+    texts = [str(c.get("text") or (c.get("metadata") or {}).get("text") or "") for c in chunks]
+    sigs = [hasher.signature(t) for t in texts]
+    numbers = [_numbers(t) if config.same_numbers else () for t in texts]
+
+    buckets: Dict[Tuple[int, bytes], List[int]] = defaultdict(list)
+    for i, sig in enumerate(sigs):
+        for band, key in enumerate(hasher.bands(sig)):
+            buckets[(band, key)].append(i)
+
+    order = sorted(range(len(chunks)), key=lambda i: (-len(texts[i]), i))
+    assigned: Dict[int, int] = {}
+    clusters: Dict[int, List[int]] = {}
+    for i in order:
+        if i in assigned:
+            continue
+        assigned[i] = i
+        members: List[int] = []
+        candidates = set()
+        for band, key in enumerate(hasher.bands(sigs[i])):
+            candidates.update(buckets[(band, key)])
+        for j in sorted(candidates):
+            if j in assigned or numbers[j] != numbers[i]:
+                continue
+            if float(np.mean(sigs[i] == sigs[j])) >= config.threshold:
+                assigned[j] = i
+                members.append(j)
+        if members:
+            clusters[i] = members
+
+    kept: List[Dict[str, Any]] = []
+    for i, c in enumerate(chunks):
+        if assigned[i] != i:
+            continue
+        kept.append(_merge_cluster(c, [chunks[j] for j in clusters[i]]) if i in clusters else c)
+
+    report = [
+        {
+            "representative": chunks[i]["id"],
+            "size": 1 + len(members),
+            "products": len(_merge_list([chunks[k]["metadata"].get("product_id") for k in [i] + members])),
+            "absorbed": [chunks[j]["id"] for j in members],
+            "min_similarity": round(min(float(np.mean(sigs[i] == sigs[j])) for j in members), 3),
+            "text": texts[i][:160],
+        }
+        for i, members in sorted(clusters.items(), key=lambda kv: -len(kv[1]))
+    ]
+    return kept, report
+
+
+def savings_report(
+    before: List[Dict[str, Any]],
+    after: List[Dict[str, Any]],
+    clusters: List[Dict[str, Any]],
+    *,
+    embed_dim: int = 768,
+    embed_batch_size: int = 32,
+    config: Optional[NearDupConfig] = None,
+) -> Dict[str, Any]:
+    """Ahorro estimado: textos/llamadas de embedding, vectores y bytes del índice (valores float32 + metadata + id)."""
+
+    def record_bytes(c: Dict[str, Any]) -> int:
+        md = json.dumps(c.get("metadata") or {}, ensure_ascii=False).encode("utf-8")
+        return embed_dim * 4 + len(md) + len(str(c.get("id", "")).encode("utf-8"))
+
+    bytes_before = sum(record_bytes(c) for c in before)
+    bytes_after = sum(record_bytes(c) for c in after)
+    calls_before = math.ceil(len(before) / embed_batch_size) if before else 0
+    calls_after = math.ceil(len(after) / embed_batch_size) if after else 0
+    return {
+        "config": None if config is None else {"threshold": config.threshold, "num_perm": config.num_perm,
+                                               "bands": config.bands, "shingle_words": config.shingle_words},
+        "chunks_before": len(before),
+        "chunks_after": len(after),
+        "clusters": len(clusters),
+        "absorbed": len(before) - len(after),
+        "embed_texts_saved": len(before) - len(after),
+        "embed_calls_before": calls_before,
+        "embed_calls_after": calls_after,
+        "embed_chars_saved": sum(len(str(c.get("text") or "")) for c in before)
+        - sum(len(str(c.get("text") or "")) for c in after),
+        "index_bytes_before": bytes_before,
+        "index_bytes_after": bytes_after,
+        "index_saved_ratio": round(1 - bytes_after / bytes_before, 4) if bytes_before else 0.0,
+        "top_clusters": clusters[:20],
+    }
@@ -1,17 +1,37 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+import os
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence
 
 from pinecone import Pinecone
 from pinecone.grpc import PineconeGRPC as PineconeGRPC
 
+from .near_dedup import expand_product_filter
+from .resilience import CircuitBreaker, DeadlineExceeded, is_timeout_error
+
 class PineconeClients:
-    def __init__(self, api_key: str, index_name: str, index_host: str = ""):
+    def __init__(self, api_key: str, index_name: str, index_host: str = "",
+                 query_breaker: Optional[CircuitBreaker] = None):
         self.ctrl = Pinecone(api_key=api_key)
         self.index_name = index_name
         self.index_host = index_host
-        self.grpc = PineconeGRPC(api_key=api_key)
-        self.index = self.grpc.Index(host=self.resolve_host())
+        self.query_breaker = query_breaker
+        self._api_key = api_key
+        self._host = ""
+        self._connect()
+
+    def _connect(self) -> None:
+        self._host = self._host or self.resolve_host()
+        self.grpc = PineconeGRPC(api_key=self._api_key)
+        self._index = self.grpc.Index(host=self._host)
+        self._pid = os.getpid()
+
+    @property
+    def index(self) -> Any:
+        # Un canal gRPC no sobrevive a un fork (app/serve.py): el proceso hijo abre el suyo.
+        if self._pid != os.getpid():
+            self._connect()
+        return self._index
 
     def resolve_host(self) -> str:
         if self.index_host:
@@ -29,11 +49,27 @@ class PineconeClients:
             )
         return host
 
+    def _guarded(self, what: str, fn: Callable[[], Any]) -> Any:
+        """Llamada al índice tras el breaker (si hay); timeouts del upstream -> DeadlineExceeded."""
+
+        def _call() -> Any:
+            try:
+                return fn()
+            except Exception as e:
+                if is_timeout_error(e):
+                    raise DeadlineExceeded(f"pinecone.{what}: timeout del upstream") from e
+                raise
+
+        if self.query_breaker is not None:
+            return self.query_breaker.call(_call)
+        return _call()
+
     def stats(self, namespace: str) -> Any:
         return self.index.describe_index_stats(namespace=namespace)
 
     def query(self, *, namespace: str, vector, top_k: int, include_metadata: bool = True,
-              include_values: bool = False, filter: Optional[Dict[str, Any]] = None) -> Any:
+              include_values: bool = False, filter: Optional[Dict[str, Any]] = None,
+              timeout: Optional[float] = None) -> Any:
         kwargs: Dict[str, Any] = dict(
             namespace=namespace,
             vector=vector,
@@ -42,5 +78,32 @@ class PineconeClients:
             include_values=include_values,
         )
         if filter:
-            kwargs["filter"] = filter
-        return self.index.query(**kwargs)
+            # Filtros por `product_id` también alcanzan a los chunks fusionados por near_dedup.
+            kwargs["filter"] = expand_product_filter(filter)
+        if timeout:
+            kwargs["timeout"] = timeout
+        return self._guarded("query", lambda: self.index.query(**kwargs))
+
+    def list_ids(self, *, namespace: str, prefix: Optional[str] = None) -> Iterator[str]:
+        """Todos los ids del namespace (paginado por el SDK). Uso offline/batch."""
+        kwargs: Dict[str, Any] = {"namespace": namespace}
+        if prefix:
+            kwargs["prefix"] = prefix
+        for page in self.index.list(**kwargs):
+            for item in page.vectors:
+                yield item.id
+
+    def fetch_metadata(self, *, namespace: str, ids: Sequence[str], batch_size: int = 100,
+                       timeout: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """Metadata por id; en runtime hidrata los ids que faltan en el store local (mismo breaker que query)."""
+        out: Dict[str, Dict[str, Any]] = {}
+        ids = list(ids)
+        kwargs: Dict[str, Any] = {"namespace": namespace}
+        if timeout:
+            kwargs["timeout"] = timeout
+        for i in range(0, len(ids), batch_size):
+            batch = ids[i:i + batch_size]
+            res = self._guarded("fetch", lambda: self.index.fetch(ids=batch, **kwargs))
+            for vid, vec in (getattr(res, "vectors", None) or {}).items():
+                out[vid] = dict(getattr(vec, "metadata", None) or {})
+        return out
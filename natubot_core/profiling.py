@@ -0,0 +1,347 @@
+from __future__ import annotations
+
+import contextvars
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .logging_utils import log_event
+from .metrics import metrics
+
+FORMATS = ("collapsed", "speedscope")
+
+_current: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar("natubot_profile", default=None)
+
+
+class RequestProfile:
+    """Muestras de stack de los hilos que atienden un request (los que entraron por `propagate`)."""
+
+    def __init__(self, request_id: str, path: str):
+        self.request_id = request_id
+        self.path = path
+        self.started = time.monotonic()
+        self.elapsed_ms = 0.0
+        # ident -> entradas anidadas (un hilo del pool puede volver a entrar al mismo perfil).
+        self.threads: Counter = Counter()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._lock = threading.Lock()
+
+    def enter(self) -> int:
+        ident = threading.get_ident()
+        with self._lock:
+            self.threads[ident] += 1
+        return ident
+
+    def leave(self, ident: int) -> None:
+        with self._lock:
+            self.threads[ident] -= 1
+            if self.threads[ident] <= 0:
+                del self.threads[ident]
+
+    def thread_ids(self) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self.threads)
+
+
+def propagate(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Envuelve `fn` para correrla en otro hilo (pools de LLM, retrieval, especulación, TTS) con
+    el contexto del llamador: si el request se está perfilando, ese hilo también se muestrea y
+    el perfil muestra el trabajo real en vez de solo la espera en `Future.result`.
+    """
+    ctx = contextvars.copy_context()
+    profile = ctx.get(_current)
+
+    def run(*args: Any, **kwargs: Any) -> Any:
+        if profile is None:
+            return ctx.run(fn, *args, **kwargs)
+        ident = profile.enter()
+        try:
+            return ctx.run(fn, *args, **kwargs)
+        finally:
+            profile.leave(ident)
+
+    return run
+
+
+class SamplingProfiler:
+    """
+    Profiler estadístico por request: un hilo muestrea `sys._current_frames()` cada
+    `interval_ms` mientras haya requests perfilados en curso (sin instrumentar llamadas,
+    el costo no depende de cuánto código corra el request). Se perfila una fracción
+    `sample_rate` de los requests; si el request tarda más de `slow_ms` se guarda el
+    perfil en `out_dir` como stacks colapsados (flamegraph.pl, speedscope) o JSON de
+    speedscope, con el `request_id` en el nombre. La carpeta se poda a `max_files`
+    archivos y `max_total_mb` (primero los más antiguos). Se muestrean los hilos que
+    entran con `propagate`: el del threadpool del request y los de los pools a los que
+    delega (LLM, retrieval, especulación, `run_with_timeout`).
+
+    `enabled`, `sample_rate` y `slow_ms` se cambian en runtime con `configure`.
+    Métricas: profiling.sampled, profiling.saved, profiling.discarded_fast y
+    profiling.sampler_ms (tiempo del hilo muestreador).
+    """
+
+    def __init__(
+        self,
+        out_dir: Path,
+        *,
+        enabled: bool = False,
+        sample_rate: float = 0.05,
+        slow_ms: float = 3000.0,
+        interval_ms: float = 10.0,
+        fmt: str = "collapsed",
+        max_files: int = 200,
+        max_total_mb: float = 50.0,
+        max_depth: int = 96,
+        logger: Optional[logging.Logger] = None,
+        rng: Callable[[], float] = random.random,
+    ):
+        self.out_dir = out_dir
+        self.interval_sec = max(1.0, interval_ms) / 1000.0
+        self.max_files = max(1, max_files)
+        self.max_total_bytes = int(max(0.1, max_total_mb) * 1024 * 1024)
+        self.max_depth = max_depth
+        self.logger = logger
+        self.rng = rng
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.slow_ms = 0.0
+        self.fmt = "collapsed"
+        self._lock = threading.Lock()
+        self._active: Dict[str, RequestProfile] = {}
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._labels: Dict[Any, str] = {}
+        self.configure(enabled=enabled, sample_rate=sample_rate, slow_ms=slow_ms, fmt=fmt)
+
+    def configure(
+        self,
+        enabled: Optional[bool] = None,
+        sample_rate: Optional[float] = None,
+        slow_ms: Optional[float] = None,
+        fmt: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        if fmt is not None and fmt not in FORMATS:
+            raise ValueError(f"Formato de perfil no soportado: {fmt} (usa {' | '.join(FORMATS)})")
+        with self._lock:
+            if enabled is not None:
+                self.enabled = bool(enabled)
+            if sample_rate is not None:
+                self.sample_rate = min(1.0, max(0.0, float(sample_rate)))
+            if slow_ms is not None:
+                self.slow_ms = max(0.0, float(slow_ms))
+            if fmt is not None:
+                self.fmt = fmt
+        return self.status()
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            active = len(self._active)
+        files = self._dump_files()
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "slow_ms": self.slow_ms,
+            "interval_ms": self.interval_sec * 1000.0,
+            "format": self.fmt,
+            "active": active,
+            "dir": str(self.out_dir),
+            "files": len(files),
+            "bytes": sum(size for _, size, _ in files),
+        }
+
+    # --- ciclo de vida por request -------------------------------------------------------
+
+    def start(self, request_id: str, path: str) -> Optional[contextvars.Token]:
+        """Decide si se perfila el request; si sí, lo deja como perfil actual del contexto."""
+        if not self.enabled or self.rng() >= self.sample_rate:
+            return None
+        profile = RequestProfile(request_id, path)
+        with self._lock:
+            self._active[request_id] = profile
+            self._ensure_thread()
+        self._wake.set()
+        metrics.inc("profiling.sampled")
+        return _current.set(profile)
+
+    def bind(self, fn: Callable[[], Any]) -> Callable[[], Any]:
+        """Envuelve `fn` para que el hilo que la ejecute quede muestreado bajo el perfil actual."""
+        return propagate(fn)
+
+    def finish(self, token: Optional[contextvars.Token]) -> Optional[RequestProfile]:
+        """Cierra el perfil del request; lo devuelve solo si hay que guardarlo (ver `save`)."""
+        if token is None:
+            return None
+        profile = _current.get()
+        _current.reset(token)
+        if profile is None:
+            return None
+        with self._lock:
+            self._active.pop(profile.request_id, None)
+        profile.elapsed_ms = (time.monotonic() - profile.started) * 1000.0
+        if profile.elapsed_ms < self.slow_ms or not profile.samples:
+            metrics.inc("profiling.discarded_fast")
+            return None
+        return profile
+
+    def save(self, profile: RequestProfile, status: int) -> Optional[Path]:
+        """Escribe el perfil y poda la carpeta (I/O bloqueante: fuera del event loop)."""
+        elapsed_ms = profile.elapsed_ms
+        try:
+            path = self._write(profile, elapsed_ms)
+            self._prune()
+        except Exception:
+            metrics.inc("profiling.write_errors")
+            return None
+        metrics.inc("profiling.saved")
+        if self.logger is not None:
+            log_event(
+                self.logger,
+                {
+                    "ts": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                    "event": "profile_saved",
+                    "request_id": profile.request_id,
+                    "path": profile.path,
+                    "status": status,
+                    "elapsed_ms": int(elapsed_ms),
+                    "samples": profile.samples,
+                    "file": path.name,
+                },
+            )
+        return path
+
+    # --- muestreo --------------------------------------------------------------------------
+
+    def _ensure_thread(self) -> None:
+        # Con el lock tomado.
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                idle = not self._active
+                if idle:
+                    self._wake.clear()
+            if idle:
+                self._wake.wait()
+                continue
+            t0 = time.perf_counter()
+            self._sample()
+            busy = time.perf_counter() - t0
+            metrics.inc("profiling.sampler_ms", busy * 1000.0)
+            time.sleep(max(0.0, self.interval_sec - busy))
+
+    def _label(self, code: Any) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            filename = code.co_filename.replace("\\", "/")
+            for marker, keep_dir in (("/site-packages/", False), ("/natubot_core/", True), ("/app/", True)):
+                idx = filename.rfind(marker)
+                if idx >= 0:
+                    filename = filename[idx + 1 :] if keep_dir else filename[idx + len(marker) :]
+                    break
+            else:
+                filename = filename.rsplit("/", 1)[-1]
+            # `;` separa frames en el formato colapsado.
+            label = f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ",")
+            if len(self._labels) < 50_000:
+                self._labels[code] = label
+        return label
+
+    def _stack(self, frame: Any) -> Tuple[str, ...]:
+        out: List[str] = []
+        while frame is not None and len(out) < self.max_depth:
+            out.append(self._label(frame.f_code))
+            frame = frame.f_back
+        out.reverse()
+        return tuple(out)
+
+    def _sample(self) -> None:
+        with self._lock:
+            profiles = list(self._active.values())
+        targets = [(p, idents) for p in profiles for idents in [p.thread_ids()] if idents]
+        if not targets:
+            return
+        frames = sys._current_frames()
+        for profile, idents in targets:
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is not None:
+                    profile.stacks[self._stack(frame)] += 1
+                    profile.samples += 1
+
+    # --- salida y retención ----------------------------------------------------------------
+
+    def _write(self, profile: RequestProfile, elapsed_ms: float) -> Path:
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%dT%H%M%S")
+        base = f"{stamp}_{profile.request_id}_{int(elapsed_ms)}ms"
+        interval_ms = self.interval_sec * 1000.0
+        if self.fmt == "speedscope":
+            path = self.out_dir / f"{base}.speedscope.json"
+            frame_index: Dict[str, int] = {}
+            samples, weights = [], []
+            for stack, count in profile.stacks.most_common():
+                samples.append([frame_index.setdefault(f, len(frame_index)) for f in stack])
+                weights.append(round(count * interval_ms, 3))
+            doc = {
+                "$schema": "https://www.speedscope.app/file-format-schema.json",
+                "exporter": "natubot",
+                "name": f"{profile.path} {profile.request_id}",
+                "activeProfileIndex": 0,
+                "shared": {"frames": [{"name": f} for f in frame_index]},
+                "profiles": [
+                    {
+                        "type": "sampled",
+                        "name": f"{profile.path} {profile.request_id} ({int(elapsed_ms)} ms)",
+                        "unit": "milliseconds",
+                        "startValue": 0,
+                        "endValue": round(sum(weights), 3),
+                        "samples": samples,
+                        "weights": weights,
+                    }
+                ],
+            }
+            data = json.dumps(doc, ensure_ascii=False)
+        else:
+            path = self.out_dir / f"{base}.collapsed"
+            data = "".join(f"{';'.join(stack)} {count}\n" for stack, count in profile.stacks.most_common())
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(data, encoding="utf-8")
+        tmp.replace(path)
+        return path
+
+    def _dump_files(self) -> List[Tuple[float, int, Path]]:
+        if not self.out_dir.exists():
+            return []
+        out = []
+        for p in self.out_dir.iterdir():
+            if p.suffix in {".collapsed", ".json"} and p.is_file():
+                try:
+                    st = p.stat()
+                except OSError:
+                    continue
+                out.append((st.st_mtime, st.st_size, p))
+        out.sort()
+        return out
+
+    def _prune(self) -> None:
+        files = self._dump_files()
+        total = sum(size for _, size, _ in files)
+        while files and (len(files) > self.max_files or total > self.max_total_bytes):
+            _, size, oldest = files.pop(0)
+            try:
+                oldest.unlink()
+                metrics.inc("profiling.pruned")
+            except OSError:
+                pass
+            total -= size
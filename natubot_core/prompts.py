@@ -1,13 +1,26 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
 
-def build_prompt(user_question: str, contexts: List[Dict[str, Any]], bot_name: str = "NatuBot") -> str:
-    """Prompt con evidencia numerada y tono animado (kiosco)."""
+_SAFETY_RULES = (
+    "1) NO eres médico. No diagnostiques ni prescribas tratamientos.\n"
+    "2) NO prometas curas ni resultados garantizados.\n"
+    "3) Responde SOLO con base en la evidencia proporcionada.\n"
+    "4) Si la evidencia no es suficiente, dilo claramente y sugiere consultar a un profesional de salud.\n"
+)
+
+
+def _evidence_block(contexts: List[Dict[str, Any]]) -> str:
     evidence_lines = []
     for i, c in enumerate(contexts, start=1):
         md = c.get("metadata") or {}
         product = md.get("product_name") or md.get("product_id") or "Producto"
+        names = md.get("product_names")
+        if isinstance(names, list) and len(names) > 1:
+            # Chunk representante de un párrafo casi idéntico en varios productos (near_dedup).
+            product = ", ".join(names)
         section = md.get("section") or "info"
         text = (md.get("text") or "").strip()
         source_pdf = md.get("source_pdf") or ""
@@ -22,7 +35,20 @@ def build_prompt(user_question: str, contexts: List[Dict[str, Any]], bot_name: s
         )
 
     evidence = "\n---\n".join(evidence_lines).strip()
+    return evidence if evidence else "(sin evidencia recuperada)"
+
 
+def _history_block(history: str) -> str:
+    if not history or not history.strip():
+        return ""
+    return (
+        "CONVERSACIÓN PREVIA (resumen; úsala solo para entender a qué se refiere la pregunta):\n"
+        f"{history.strip()}\n\n"
+    )
+
+
+def system_instruction(bot_name: str = "NatuBot") -> str:
+    """Parte estática del prompt (rol, tono, reglas): va como `system_instruction` o en caché."""
     return (
         f"Eres {bot_name}, el asistente informativo de Sistema Natural.\n"
         "Estilo y tono:\n"
@@ -31,13 +57,111 @@ def build_prompt(user_question: str, contexts: List[Dict[str, Any]], bot_name: s
         "- Mantén un enfoque práctico: qué es, para qué se usa y cómo se usa (si aplica).\n"
         "- Evita lenguaje técnico innecesario.\n\n"
         "Reglas de seguridad (obligatorio):\n"
-        "1) NO eres médico. No diagnostiques ni prescribas tratamientos.\n"
-        "2) NO prometas curas ni resultados garantizados.\n"
-        "3) Responde SOLO con base en la evidencia proporcionada.\n"
-        "4) Si la evidencia no es suficiente, dilo claramente y sugiere consultar a un profesional de salud.\n"
-        "5) Incluye referencias [1], [2], etc. cuando cites información.\n\n"
+        f"{_SAFETY_RULES}"
+        "5) Incluye referencias [1], [2], etc. cuando cites información."
+    )
+
+
+def build_user_prompt(user_question: str, contexts: List[Dict[str, Any]], history: str = "") -> str:
+    """Parte dinámica: resumen de sesión + evidencia numerada + pregunta."""
+    return (
+        f"{_history_block(history)}"
         "EVIDENCIA (RAG):\n"
-        f"{evidence if evidence else '(sin evidencia recuperada)'}\n\n"
+        f"{_evidence_block(contexts)}\n\n"
         f"PREGUNTA DEL USUARIO: {user_question}\n\n"
         "RESPUESTA (en español):"
     )
+
+
+def build_prompt(
+    user_question: str,
+    contexts: List[Dict[str, Any]],
+    bot_name: str = "NatuBot",
+    history: str = "",
+) -> str:
+    """Prompt con evidencia numerada y tono animado (kiosco). `history`: resumen compacto de la sesión."""
+    return f"{system_instruction(bot_name)}\n\n{build_user_prompt(user_question, contexts, history)}"
+
+
+@dataclass(frozen=True)
+class VoiceAnswerProfile:
+    """
+    Respuesta para turnos de voz: prompt en estilo hablado (sin markdown ni referencias),
+    tope de tokens corto y dos partes: resumen para TTS (`spoken_max_words`) + texto de pantalla.
+    """
+
+    max_output_tokens: int = 320
+    spoken_max_words: int = 45
+    temperature: float = 0.2
+
+
+def voice_system_instruction(bot_name: str = "NatuBot", spoken_max_words: int = 45) -> str:
+    """Parte estática del prompt de voz (estilo hablado, reglas y formato HABLADO:/PANTALLA:)."""
+    return (
+        f"Eres {bot_name}, el asistente informativo de Sistema Natural. Tu respuesta se escucha en voz alta en un kiosco.\n"
+        "Estilo y tono:\n"
+        "- Habla como en una conversación: cercano, animado y con frases cortas.\n"
+        "- Sin viñetas, listas, títulos, emojis ni markdown (nada de *, # o guiones).\n"
+        "- Sin referencias como [1], nombres de archivos ni números de página.\n"
+        "- Escribe números y medidas como se dicen (\"dos veces al día\").\n\n"
+        "Reglas de seguridad (obligatorio):\n"
+        f"{_SAFETY_RULES}\n"
+        "Formato de salida (obligatorio, dos partes):\n"
+        f"HABLADO: dos o tres frases, máximo {spoken_max_words} palabras, que responden directamente la pregunta.\n"
+        "PANTALLA: la respuesta completa pero breve (máximo 120 palabras) para leer en pantalla, en párrafos cortos."
+    )
+
+
+_VOICE_PART = re.compile(r"^\s*\**\s*(HABLADO|PANTALLA)\s*\**\s*:\s*", re.IGNORECASE | re.MULTILINE)
+_CITATION = re.compile(r"\s*\[\d+(?:\s*[,-]\s*\d+)*\]")
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+", re.MULTILINE)
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+
+def to_spoken_text(text: str) -> str:
+    """Quita referencias [n], viñetas y markdown; une líneas en frases (lo que lee el TTS)."""
+    t = _CITATION.sub("", text or "")
+    t = _BULLET.sub("", t)
+    t = re.sub(r"[*_#`>|]+", "", t)
+    lines = [ln.strip() for ln in t.splitlines() if ln.strip()]
+    joined = " ".join(ln if ln[-1] in ".!?…:;," else ln + "." for ln in lines)
+    return re.sub(r"\s{2,}", " ", joined).strip()
+
+
+def _limit_words(text: str, max_words: int) -> str:
+    """Frases completas hasta `max_words` (al menos la primera, recortada si hace falta)."""
+    out: List[str] = []
+    count = 0
+    for sentence in _SENTENCE_END.split(text):
+        n = len(sentence.split())
+        if out and count + n > max_words:
+            break
+        out.append(sentence)
+        count += n
+    if count > max_words:
+        return " ".join(" ".join(out).split()[:max_words]).rstrip(",;:") + "."
+    return " ".join(out)
+
+
+def _drop_cut_sentence(text: str) -> str:
+    # Con tope de tokens la última frase puede quedar a medias: se descarta si hay algo antes.
+    t = text.rstrip()
+    if not t or t[-1] in ".!?…":
+        return t
+    cut = max(t.rfind(". "), t.rfind("! "), t.rfind("? "), t.rfind("\n"))
+    return t[: cut + 1].rstrip() if cut > 0 else t
+
+
+def split_voice_answer(raw: str, spoken_max_words: int = 45) -> Tuple[str, str]:
+    """(resumen hablado, texto de pantalla) a partir de la salida HABLADO:/PANTALLA: del modelo."""
+    parts: Dict[str, str] = {}
+    matches = list(_VOICE_PART.finditer(raw or ""))
+    for i, m in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(raw)
+        parts[m.group(1).lower()] = raw[m.end():end].strip()
+
+    # Sin marcadores (el modelo ignoró el formato): todo es pantalla y el resumen sale de ahí.
+    screen = parts.get("pantalla", "") if matches else (raw or "").strip()
+    screen = _CITATION.sub("", _drop_cut_sentence(screen))
+    spoken = _limit_words(to_spoken_text(_drop_cut_sentence(parts.get("hablado") or screen)), spoken_max_words)
+    return spoken, screen or spoken
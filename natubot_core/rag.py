@@ -1,10 +1,31 @@
 from __future__ import annotations
 
+from concurrent.futures import Executor
 from typing import Any, Dict, List, Optional, Tuple
 
+from .chunk_store import ChunkStore
+from .decompose import QueryDecomposer, SubQuery, interleave
 from .gemini_client import GeminiClient
 from .pinecone_client import PineconeClients
-from .prompts import build_prompt
+from .prompts import (
+    VoiceAnswerProfile,
+    build_user_prompt,
+    split_voice_answer,
+    system_instruction,
+    voice_system_instruction,
+)
+from .metrics import metrics
+from .model_router import ModelRouter, routing_features
+from .profiling import propagate
+from .rerank import RerankConfig, select_diverse
+from .resilience import CircuitOpenError, Deadline, DeadlineExceeded, RequestCancelled, stage_timeout
+from .sessions import SessionStore, is_follow_up
+from .speculative import SpeculativeRetrieval
+
+DEGRADED_ANSWER = (
+    "En este momento no puedo consultar la información de productos. "
+    "Por favor intenta de nuevo en unos minutos o consulta con un asesor de la tienda."
+)
 
 def retrieve_context(
     *,
@@ -14,24 +35,157 @@ def retrieve_context(
     namespace: str,
     top_k: int,
     pinecone_filter: Optional[Dict[str, Any]] = None,
+    deadline: Optional[Deadline] = None,
+    chunk_store: Optional[ChunkStore] = None,
+    rerank: Optional[RerankConfig] = None,
+    decomposer: Optional[QueryDecomposer] = None,
+    executor: Optional[Executor] = None,
 ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
-    qvec = gemini.embed_query(question)
+    """
+    Con `chunk_store` la query pide solo ids + scores (sin los ~12 KB de metadata por
+    match) y el texto se hidrata localmente; ids ausentes del store se piden con fetch.
+    Con `rerank` (solo junto a `chunk_store`) se sobre-piden candidatos con vectores y solo los
+    elegidos por corte de score + MMR (máx. `top_k`) se hidratan y llegan al prompt; las citas
+    son exactamente esos.
+    Con `decomposer`, una pregunta que nombra varios productos/objetivos se resuelve con una
+    sub-consulta filtrada por entidad (embeddings en un solo request, queries en `executor`)
+    y los resultados se intercalan para que cada entidad tenga su parte del contexto.
+    """
+    if chunk_store is None and rerank is not None:
+        # Sin store local cada candidato extra trae su metadata completa (y su vector) por la
+        # red: el over-fetch costaría más de lo que ahorra el prompt.
+        metrics.inc("rag.rerank_skipped")
+        rerank = None
+    matches: List[Any] = []
+    subqueries = decomposer.decompose(question, pinecone_filter) if decomposer is not None else []
+    if subqueries:
+        matches = _decomposed_matches(
+            subqueries,
+            gemini=gemini,
+            pinecone=pinecone,
+            namespace=namespace,
+            top_k=top_k,
+            decomposer=decomposer,
+            executor=executor,
+            deadline=deadline,
+            chunk_store=chunk_store,
+            rerank=rerank,
+        )
+        if not matches:
+            # Filtros sin resultados (tag mal escrito en la metadata, etc.): query normal.
+            metrics.inc("rag.decomposed_empty")
+    if not matches:
+        qvec = gemini.embed_query(question, timeout=stage_timeout(deadline, "embed"))
+        matches = _query_matches(
+            qvec,
+            pinecone=pinecone,
+            namespace=namespace,
+            top_k=top_k,
+            pinecone_filter=pinecone_filter,
+            deadline=deadline,
+            chunk_store=chunk_store,
+            rerank=rerank,
+        )
+    if chunk_store is None:
+        contexts = [{"id": m.id, "score": m.score, "metadata": m.metadata or {}} for m in matches]
+    else:
+        contexts = _hydrate(matches, chunk_store=chunk_store, pinecone=pinecone, namespace=namespace, deadline=deadline)
+    return contexts, citations_for(contexts)
+
+def _query_matches(
+    qvec: List[float],
+    *,
+    pinecone: PineconeClients,
+    namespace: str,
+    top_k: int,
+    pinecone_filter: Optional[Dict[str, Any]],
+    deadline: Optional[Deadline],
+    chunk_store: Optional[ChunkStore],
+    rerank: Optional[RerankConfig],
+) -> List[Any]:
     res = pinecone.query(
         namespace=namespace,
         vector=qvec,
-        top_k=top_k,
-        include_metadata=True,
-        include_values=False,
+        top_k=rerank.fetch_k(top_k) if rerank is not None else top_k,
+        include_metadata=chunk_store is None,
+        include_values=rerank is not None,
         filter=pinecone_filter,
+        timeout=stage_timeout(deadline, "query"),
     )
 
     matches = getattr(res, "matches", []) or []
-    contexts: List[Dict[str, Any]] = []
-    citations: List[Dict[str, Any]] = []
+    if rerank is not None and matches:
+        picked = select_diverse(
+            qvec,
+            [float(m.score or 0.0) for m in matches],
+            [list(getattr(m, "values", None) or []) for m in matches],
+            top_k=top_k,
+            config=rerank,
+        )
+        metrics.observe("rag.rerank_candidates", len(matches), buckets=(5, 10, 15, 20, 30, 50))
+        metrics.observe("rag.rerank_selected", len(picked), buckets=(1, 2, 3, 5, 8, 10))
+        matches = [matches[i] for i in picked]
+    return matches
 
-    for i, m in enumerate(matches, start=1):
-        md = m.metadata or {}
-        contexts.append({"id": m.id, "score": m.score, "metadata": md})
+def _decomposed_matches(
+    subqueries: List[SubQuery],
+    *,
+    gemini: GeminiClient,
+    pinecone: PineconeClients,
+    namespace: str,
+    top_k: int,
+    decomposer: QueryDecomposer,
+    executor: Optional[Executor],
+    deadline: Optional[Deadline],
+    chunk_store: Optional[ChunkStore],
+    rerank: Optional[RerankConfig],
+) -> List[Any]:
+    vectors = gemini.embed_queries([sq.text for sq in subqueries], timeout=stage_timeout(deadline, "embed"))
+    per_facet = decomposer.per_facet_k(top_k, len(subqueries))
+
+    def run(i: int) -> List[Any]:
+        return _query_matches(
+            vectors[i],
+            pinecone=pinecone,
+            namespace=namespace,
+            top_k=per_facet,
+            pinecone_filter=subqueries[i].pinecone_filter,
+            deadline=deadline,
+            chunk_store=chunk_store,
+            rerank=rerank,
+        )
+
+    if executor is None:
+        groups = [run(i) for i in range(len(subqueries))]
+    else:
+        futures = [executor.submit(propagate(run), i) for i in range(len(subqueries))]
+        groups = [f.result() for f in futures]
+    metrics.inc("rag.decomposed")
+    metrics.observe("rag.decomposed_facets", len(subqueries), buckets=(2, 3, 4, 5))
+    return interleave(groups, limit=decomposer.merged_k(top_k, len(subqueries)), key=lambda m: m.id)
+
+def _hydrate(
+    matches: List[Any],
+    *,
+    chunk_store: ChunkStore,
+    pinecone: PineconeClients,
+    namespace: str,
+    deadline: Optional[Deadline] = None,
+) -> List[Dict[str, Any]]:
+    ids = [m.id for m in matches]
+    found = chunk_store.get_many(ids)
+    missing = [i for i in ids if i not in found]
+    metrics.inc("chunk_store.hits", len(ids) - len(missing))
+    if missing:
+        metrics.inc("chunk_store.misses", len(missing))
+        found.update(pinecone.fetch_metadata(namespace=namespace, ids=missing, timeout=stage_timeout(deadline, "query")))
+    return [{"id": m.id, "score": m.score, "metadata": found.get(m.id) or {}} for m in matches]
+
+def citations_for(contexts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    citations: List[Dict[str, Any]] = []
+    for i, c in enumerate(contexts, start=1):
+        md = c.get("metadata") or {}
+        score = c.get("score")
         citations.append(
             {
                 "rank": i,
@@ -40,10 +194,10 @@ def retrieve_context(
                 "section": md.get("section"),
                 "source_pdf": md.get("source_pdf"),
                 "source_pages": md.get("source_pages"),
-                "score": float(m.score) if m.score is not None else None,
+                "score": float(score) if score is not None else None,
             }
         )
-    return contexts, citations
+    return citations
 
 def answer_with_rag(
     *,
@@ -54,15 +208,116 @@ def answer_with_rag(
     top_k: int,
     bot_name: str,
     pinecone_filter: Optional[Dict[str, Any]] = None,
+    deadline: Optional[Deadline] = None,
+    generate_reserve_sec: float = 0.0,
+    degraded_answer: str = DEGRADED_ANSWER,
+    sessions: Optional[SessionStore] = None,
+    session_id: Optional[str] = None,
+    chunk_store: Optional[ChunkStore] = None,
+    rerank: Optional[RerankConfig] = None,
+    voice_profile: Optional[VoiceAnswerProfile] = None,
+    speculative: Optional[SpeculativeRetrieval] = None,
+    router: Optional[ModelRouter] = None,
+    decomposer: Optional[QueryDecomposer] = None,
+    executor: Optional[Executor] = None,
 ) -> Dict[str, Any]:
-    contexts, citations = retrieve_context(
-        question=question,
-        gemini=gemini,
-        pinecone=pinecone,
-        namespace=namespace,
-        top_k=top_k,
-        pinecone_filter=pinecone_filter,
-    )
-    prompt = build_prompt(question, contexts, bot_name=bot_name)
-    answer = gemini.generate(prompt)
-    return {"answer": answer, "citations": citations, "used_context": bool(contexts)}
+    """
+    Si un upstream tiene el circuito abierto o se agota el deadline, responde con
+    `degraded_answer` (sin citas) en vez de fallar. La cancelación del cliente se propaga.
+    `generate_reserve_sec` deja tiempo del deadline para etapas posteriores (ej. TTS).
+    Con `sessions` + `session_id`, una pregunta de seguimiento sobre el mismo producto
+    reutiliza los contextos del turno anterior (sin embed ni query) y el prompt recibe
+    un resumen compacto de la conversación. `chunk_store`, `rerank`, `decomposer` y `executor` se
+    pasan a retrieve_context.
+    Con `voice_profile` se usa el prompt hablado con tope de tokens corto: `answer` es el texto de
+    pantalla y `spoken_answer` el resumen que va al TTS.
+    `speculative` (turnos de voz) aporta el retrieval lanzado con el transcript parcial si
+    coincide con `question`; el seguimiento de sesión tiene prioridad.
+    Con `router` el modelo (tier rápido o completo) se elige por turno; `model_tier` indica cuál respondió.
+    """
+    state = sessions.get(session_id) if sessions is not None else None
+    contexts = None
+    if state is not None and state.pinecone_filter == pinecone_filter and is_follow_up(question, state):
+        contexts = sessions.cached_contexts(state)
+    reused_context = contexts is not None
+    prefetched = None
+    if not reused_context and speculative is not None:
+        prefetched = speculative.resolve(question, timeout=deadline.remaining() if deadline is not None else None)
+    if reused_context:
+        metrics.inc("rag.session_context_reused")
+    else:
+        metrics.inc("rag.speculative_reused" if prefetched is not None else "rag.retrievals")
+
+    try:
+        if prefetched is not None:
+            contexts, citations = prefetched
+        elif contexts is None:
+            contexts, citations = retrieve_context(
+                question=question,
+                gemini=gemini,
+                pinecone=pinecone,
+                namespace=namespace,
+                top_k=top_k,
+                pinecone_filter=pinecone_filter,
+                deadline=deadline,
+                chunk_store=chunk_store,
+                rerank=rerank,
+                decomposer=decomposer,
+                executor=executor,
+            )
+        else:
+            contexts = contexts[:top_k]
+            citations = citations_for(contexts)
+        history = sessions.history_summary(state, bot_name=bot_name) if sessions is not None else ""
+        timeout = stage_timeout(deadline, "generate", generate_reserve_sec)
+        model_tier = None
+
+        def generate(prompt: str, **kwargs: Any) -> str:
+            nonlocal model_tier
+            if router is None:
+                return gemini.generate(prompt, **kwargs)
+            features = routing_features(question, contexts, voice=voice_profile is not None)
+            text, model_tier = router.generate(prompt, features=features, **kwargs)
+            return text
+
+        spoken_answer = None
+        if voice_profile is not None:
+            raw = generate(
+                build_user_prompt(question, contexts, history=history),
+                temperature=voice_profile.temperature,
+                max_output_tokens=voice_profile.max_output_tokens,
+                timeout=timeout,
+                system_instruction=voice_system_instruction(bot_name, voice_profile.spoken_max_words),
+            )
+            spoken_answer, answer = split_voice_answer(raw, voice_profile.spoken_max_words)
+            metrics.inc("rag.voice_answers")
+        else:
+            answer = generate(
+                build_user_prompt(question, contexts, history=history),
+                timeout=timeout,
+                system_instruction=system_instruction(bot_name),
+            )
+    except RequestCancelled:
+        raise
+    except (CircuitOpenError, DeadlineExceeded) as e:
+        return {
+            "answer": degraded_answer,
+            "citations": [],
+            "used_context": False,
+            "degraded": True,
+            "degraded_reason": str(e),
+        }
+    if sessions is not None and session_id:
+        sessions.record(session_id, question=question, answer=answer, contexts=contexts, pinecone_filter=pinecone_filter)
+    result = {
+        "answer": answer,
+        "citations": citations,
+        "used_context": bool(contexts),
+        "degraded": False,
+        "reused_context": reused_context,
+    }
+    if spoken_answer is not None:
+        result["spoken_answer"] = spoken_answer
+    if model_tier is not None:
+        result["model_tier"] = model_tier
+    return result
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import List, Sequence
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class RerankConfig:
+    """
+    Over-fetch + diversidad antes del prompt:
+    - se piden `top_k * fetch_multiplier` candidatos (tope `max_candidates`) con sus vectores,
+    - se descarta la cola débil (salto de score > `score_gap` o score < `min_score_ratio` * mejor),
+    - MMR elige hasta `top_k` chunks relevantes y no redundantes (`lambda_` = peso de relevancia).
+    """
+
+    fetch_multiplier: int = 3
+    max_candidates: int = 30
+    lambda_: float = 0.7
+    score_gap: float = 0.08
+    min_score_ratio: float = 0.75
+    min_keep: int = 2
+
+    def fetch_k(self, top_k: int) -> int:
+        return max(top_k, min(self.max_candidates, top_k * max(1, self.fetch_multiplier)))
+
+
+def score_gap_cutoff(scores: Sequence[float], *, score_gap: float, min_score_ratio: float, min_keep: int = 1) -> int:
+    """Cuántos candidatos (ordenados por score desc) conservar antes de diversificar."""
+    s = np.asarray(scores, dtype=np.float32)
+    n = int(s.size)
+    if n <= min_keep:
+        return n
+    floor = float(s[0]) * min_score_ratio if s[0] > 0 else -np.inf
+    gaps = s[:-1] - s[1:]
+    for i in range(max(1, min_keep), n):
+        if gaps[i - 1] > score_gap or s[i] < floor:
+            return i
+    return n
+
+
+def mmr_select(query_vec: Sequence[float], candidate_vecs: np.ndarray, k: int, lambda_: float = 0.7) -> List[int]:
+    """
+    Maximal Marginal Relevance vectorizado: en cada paso elige el candidato que maximiza
+    lambda * sim(q, c) - (1 - lambda) * max sim(c, ya elegidos). Devuelve índices en orden de elección.
+    """
+    c = np.asarray(candidate_vecs, dtype=np.float32)
+    n = c.shape[0]
+    if n == 0 or k <= 0:
+        return []
+    q = np.asarray(query_vec, dtype=np.float32)
+    c = c / (np.linalg.norm(c, axis=1, keepdims=True) + 1e-12)
+    q = q / (np.linalg.norm(q) + 1e-12)
+
+    relevance = c @ q
+    pairwise = c @ c.T
+    max_sim = np.full(n, -np.inf, dtype=np.float32)
+    chosen = np.zeros(n, dtype=bool)
+    order: List[int] = []
+    for _ in range(min(k, n)):
+        if order:
+            mmr = lambda_ * relevance - (1.0 - lambda_) * max_sim
+        else:
+            mmr = relevance.copy()
+        mmr[chosen] = -np.inf
+        i = int(np.argmax(mmr))
+        order.append(i)
+        chosen[i] = True
+        max_sim = np.maximum(max_sim, pairwise[i])
+    return order
+
+
+def select_diverse(
+    query_vec: Sequence[float],
+    scores: Sequence[float],
+    vectors: Sequence[Sequence[float]],
+    *,
+    top_k: int,
+    config: RerankConfig,
+) -> List[int]:
+    """Índices de los candidatos (ordenados por score desc) que van al prompt."""
+    keep = score_gap_cutoff(
+        scores, score_gap=config.score_gap, min_score_ratio=config.min_score_ratio, min_keep=config.min_keep
+    )
+    pool = [i for i in range(keep) if vectors[i]]
+    if not pool:
+        return list(range(min(top_k, keep)))
+    picked = mmr_select(query_vec, np.asarray([vectors[i] for i in pool], dtype=np.float32), top_k, config.lambda_)
+    return [pool[i] for i in picked]
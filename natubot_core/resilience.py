@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from .profiling import propagate
+
+
+class DeadlineExceeded(RuntimeError):
+    """El presupuesto de tiempo de la solicitud (o de una etapa) se agotó."""
+
+
+class RequestCancelled(DeadlineExceeded):
+    """La solicitud fue cancelada (ej. el kiosco se desconectó)."""
+
+
+class CircuitOpenError(RuntimeError):
+    """El circuit breaker del upstream está abierto: se falla rápido sin llamar."""
+
+
+class Deadline:
+    """
+    Deadline por solicitud, repartido en presupuestos por etapa
+    (embed -> query -> generate -> tts). El timeout de una etapa es
+    min(presupuesto de la etapa, tiempo restante).
+    """
+
+    def __init__(self, total_sec: float, budgets: Optional[Dict[str, float]] = None):
+        self.total_sec = float(total_sec)
+        self.budgets = dict(budgets or {})
+        self._expires_at = time.monotonic() + self.total_sec
+        self._cancelled = threading.Event()
+        self.cancel_reason = ""
+
+    def remaining(self) -> float:
+        return max(0.0, self._expires_at - time.monotonic())
+
+    def cancel(self, reason: str = "cancelada") -> None:
+        self.cancel_reason = reason
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def expired(self) -> bool:
+        return self.cancelled or self.remaining() <= 0.0
+
+    def check(self, stage: str) -> None:
+        if self.cancelled:
+            raise RequestCancelled(f"{stage}: solicitud cancelada ({self.cancel_reason})")
+        if self.remaining() <= 0.0:
+            raise DeadlineExceeded(f"{stage}: deadline de {self.total_sec:.0f}s agotado")
+
+    def timeout_for(self, stage: str, reserve_sec: float = 0.0) -> float:
+        """Timeout para `stage`, dejando `reserve_sec` para etapas posteriores."""
+        self.check(stage)
+        available = self.remaining() - max(0.0, reserve_sec)
+        budget = self.budgets.get(stage)
+        timeout = min(budget, available) if budget is not None else available
+        if timeout <= 0.0:
+            raise DeadlineExceeded(f"{stage}: sin presupuesto de tiempo restante")
+        return timeout
+
+
+def stage_timeout(deadline: Optional[Deadline], stage: str, reserve_sec: float = 0.0) -> Optional[float]:
+    return deadline.timeout_for(stage, reserve_sec=reserve_sec) if deadline is not None else None
+
+
+def is_timeout_error(err: BaseException) -> bool:
+    if isinstance(err, (TimeoutError, FutureTimeoutError, DeadlineExceeded)):
+        return True
+    name = type(err).__name__.lower()
+    msg = str(err).lower()
+    return "timeout" in name or "deadline_exceeded" in msg or "timed out" in msg
+
+
+# Pool compartido para trabajo local sin timeout nativo (ej. TTS en CPU).
+_timeout_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="natubot-timeout")
+
+
+def run_with_timeout(fn: Callable[[], Any], timeout: Optional[float]) -> Any:
+    """
+    Ejecuta `fn` y corta la espera tras `timeout` segundos. El hilo no se puede
+    interrumpir: `fn` debe revisar su propio flag de parada para liberar CPU.
+    """
+    if timeout is None:
+        return fn()
+    fut = _timeout_pool.submit(propagate(fn))
+    try:
+        return fut.result(timeout=timeout)
+    except FutureTimeoutError as e:
+        fut.cancel()
+        raise DeadlineExceeded(f"timeout tras {timeout:.1f}s") from e
+
+
+class CircuitBreaker:
+    """
+    Breaker por upstream con ventana deslizante de resultados. Se abre cuando la
+    tasa de errores o de llamadas lentas supera el umbral; tras `open_sec` deja
+    pasar una llamada de prueba (half-open) para decidir si vuelve a cerrar.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_ms: Optional[float] = None,
+        slow_rate: float = 0.5,
+        open_sec: float = 30.0,
+    ):
+        self.name = name
+        self.min_calls = max(1, min_calls)
+        self.failure_rate = failure_rate
+        self.slow_call_ms = slow_call_ms
+        self.slow_rate = slow_rate
+        self.open_sec = open_sec
+        self._outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=max(self.min_calls, window))
+        self._state = "closed"
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def _before_call(self) -> None:
+        with self._lock:
+            if self._state == "closed":
+                return
+            if self._state == "open" and (time.monotonic() - self._opened_at) >= self.open_sec:
+                self._state = "half_open"
+                self._trial_in_flight = False
+            if self._state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            raise CircuitOpenError(f"Circuito '{self.name}' abierto: upstream degradado.")
+
+    def _record(self, *, failed: bool, elapsed_ms: float) -> None:
+        slow = self.slow_call_ms is not None and elapsed_ms > self.slow_call_ms
+        with self._lock:
+            if self._state == "half_open":
+                self._trial_in_flight = False
+                if failed or slow:
+                    self._trip()
+                else:
+                    self._state = "closed"
+                    self._outcomes.clear()
+                return
+
+            self._outcomes.append((failed, slow))
+            n = len(self._outcomes)
+            if n < self.min_calls:
+                return
+            failures = sum(1 for f, _ in self._outcomes if f)
+            slows = sum(1 for _, s in self._outcomes if s)
+            if failures / n >= self.failure_rate or slows / n >= self.slow_rate:
+                self._trip()
+
+    def _trip(self) -> None:
+        self._state = "open"
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        self._before_call()
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except RequestCancelled:
+            # Cancelación del cliente: no dice nada sobre la salud del upstream.
+            with self._lock:
+                self._trial_in_flight = False
+            raise
+        except Exception:
+            self._record(failed=True, elapsed_ms=(time.perf_counter() - start) * 1000.0)
+            raise
+        self._record(failed=False, elapsed_ms=(time.perf_counter() - start) * 1000.0)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            n = len(self._outcomes)
+            return {
+                "state": self._state,
+                "window_calls": n,
+                "failures": sum(1 for f, _ in self._outcomes if f),
+                "slow_calls": sum(1 for _, s in self._outcomes if s),
+            }
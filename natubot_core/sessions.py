@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# Vocabulario genérico de preguntas de kiosco. Una pregunta corta que solo usa estas
+# palabras ("¿y cómo se toma?", "¿tiene contraindicaciones?") no introduce un tema nuevo.
+_GENERIC_WORDS = {
+    "ademas", "algun", "alguna", "antes", "ayuda", "cada", "cuales", "cuando", "cuanto",
+    "cuanta", "cuantas", "cuantos", "debo", "despues", "dosis", "efecto", "efectos",
+    "embarazada", "embarazadas", "entonces", "esto", "estos", "estas", "puede", "pueden",
+    "puedo", "mejor", "ninos", "noche", "otros", "precio", "producto", "recomienda",
+    "recomendada", "recomendado", "secundarios", "seguro", "sirve", "sirven", "tambien",
+    "tiene", "tienen", "tomar", "tomarlo", "tomarla", "tomarlos", "tomo", "usarlo",
+    "usarla", "contraindicaciones", "contraindicacion", "ingredientes", "ingrediente",
+    "dias", "veces", "comida", "comidas", "ayunas", "manana", "tarde", "donde", "comprar",
+    "viene", "presentacion", "cuesta", "funciona", "demora", "tarda", "mucho", "diario",
+    "diaria", "tiempo", "persona", "personas", "mayores", "adultos",
+}
+_MAX_FOLLOW_UP_WORDS = 8
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas, sin tildes ni puntuación, espacios colapsados."""
+    t = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii").lower()
+    t = re.sub(r"[^a-z0-9 ]+", " ", t)
+    return re.sub(r"\s+", " ", t).strip()
+
+
+@dataclass
+class SessionTurn:
+    question: str
+    answer: str
+
+
+@dataclass
+class SessionState:
+    """Estado compacto por sesión: últimos turnos + ids/scores del último retrieval."""
+
+    session_id: str
+    turns: Deque[SessionTurn]
+    chunk_refs: List[Tuple[str, Optional[float]]] = field(default_factory=list)
+    product_names: List[str] = field(default_factory=list)
+    pinecone_filter: Optional[Dict[str, Any]] = None
+    updated_at: float = field(default_factory=time.monotonic)
+
+
+class SessionStore:
+    """
+    Sesiones en memoria con TTL + LRU. El texto de los chunks no se guarda por sesión:
+    vive en un LRU compartido por id (muchas sesiones consultan los mismos productos).
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        ttl_sec: float = 900.0,
+        max_turns: int = 3,
+        max_answer_chars: int = 200,
+        max_chunks: int = 2000,
+    ):
+        self.max_sessions = max(1, max_sessions)
+        self.ttl_sec = ttl_sec
+        self.max_turns = max(1, max_turns)
+        self.max_answer_chars = max_answer_chars
+        self.max_chunks = max(1, max_chunks)
+        self._sessions: "OrderedDict[str, SessionState]" = OrderedDict()
+        self._chunks: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: Optional[str]) -> Optional[SessionState]:
+        if not session_id:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                return None
+            if now - state.updated_at > self.ttl_sec:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return state
+
+    def cached_contexts(self, state: SessionState) -> Optional[List[Dict[str, Any]]]:
+        """Rehidrata los contextos del último retrieval; None si algún chunk salió del LRU."""
+        if not state.chunk_refs:
+            return None
+        out: List[Dict[str, Any]] = []
+        with self._lock:
+            for chunk_id, score in state.chunk_refs:
+                md = self._chunks.get(chunk_id)
+                if md is None:
+                    return None
+                self._chunks.move_to_end(chunk_id)
+                out.append({"id": chunk_id, "score": score, "metadata": md})
+        return out
+
+    def record(
+        self,
+        session_id: str,
+        *,
+        question: str,
+        answer: str,
+        contexts: List[Dict[str, Any]],
+        pinecone_filter: Optional[Dict[str, Any]] = None,
+        product_names: Optional[List[str]] = None,
+    ) -> None:
+        """
+        `product_names` sin `contexts` registra un turno respondido sin retrieval (respuesta
+        canónica): se recuerda el producto, pero el siguiente turno vuelve a consultar el índice.
+        """
+        now = time.monotonic()
+        short_answer = answer.strip()
+        if len(short_answer) > self.max_answer_chars:
+            short_answer = short_answer[: self.max_answer_chars].rstrip() + "…"
+
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = SessionState(session_id=session_id, turns=deque(maxlen=self.max_turns))
+                self._sessions[session_id] = state
+            self._sessions.move_to_end(session_id)
+            state.turns.append(SessionTurn(question=question.strip(), answer=short_answer))
+            state.updated_at = now
+
+            if contexts:
+                state.chunk_refs = [(c["id"], c.get("score")) for c in contexts]
+                state.product_names = sorted(
+                    {str((c.get("metadata") or {}).get("product_name") or "") for c in contexts} - {""}
+                )
+                state.pinecone_filter = pinecone_filter
+                for c in contexts:
+                    self._chunks[c["id"]] = c.get("metadata") or {}
+                    self._chunks.move_to_end(c["id"])
+                while len(self._chunks) > self.max_chunks:
+                    self._chunks.popitem(last=False)
+            elif product_names is not None:
+                state.chunk_refs = []
+                state.product_names = sorted(set(product_names) - {""})
+                state.pinecone_filter = pinecone_filter
+
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def history_summary(self, state: Optional[SessionState], bot_name: str = "NatuBot") -> str:
+        if state is None or not state.turns:
+            return ""
+        lines = []
+        with self._lock:
+            turns = list(state.turns)
+        for t in turns:
+            lines.append(f"Usuario: {t.question}")
+            lines.append(f"{bot_name}: {t.answer}")
+        return "\n".join(lines)
+
+
+def is_follow_up(question: str, state: Optional[SessionState]) -> bool:
+    """
+    True si la pregunta parece referirse al mismo producto del turno anterior: fuera de los
+    nombres de productos de la sesión no nombra nada nuevo ("¿y cómo se toma?", "¿la calendula
+    sirve para niños?"). Si nombra otro producto o tema ("¿es mejor la calendula o el ginkgo?")
+    es un tema nuevo y va por retrieval.
+    """
+    if state is None or not state.chunk_refs:
+        return False
+    q = normalize_text(question)
+    if not q:
+        return False
+    words = q.split()
+    session_words = {w for name in state.product_names for w in normalize_text(name).split()}
+    remaining = [w for w in words if w not in session_words]
+    if names_topic(" ".join(remaining)):
+        return False
+    if len(remaining) < len(words):
+        return True
+    return len(words) <= _MAX_FOLLOW_UP_WORDS
+
+
+def names_topic(question: str) -> bool:
+    """
+    True si la pregunta nombra algo propio (producto, síntoma, ingrediente...) y se entiende
+    sin el turno anterior. Palabras cortas (artículos, pronombres, "se", "y") no cuentan.
+    """
+    return any(len(w) >= 5 and w not in _GENERIC_WORDS for w in normalize_text(question).split())
@@ -22,6 +22,30 @@ class Settings:
     gemini_chat_model: str = os.getenv("GEMINI_CHAT_MODEL", "gemini-2.0-flash")
     gemini_embed_model: str = os.getenv("GEMINI_EMBED_MODEL", "gemini-embedding-001")
     embed_dim: int = int(os.getenv("EMBED_DIM", "768"))
+    # Caché explícito de contexto para el system_instruction estático (mínimo de tokens según modelo)
+    gemini_context_cache_enabled: bool = _get_bool("GEMINI_CONTEXT_CACHE_ENABLED", "false")
+    gemini_context_cache_ttl_sec: float = float(os.getenv("GEMINI_CONTEXT_CACHE_TTL_SEC", "3600"))
+    gemini_context_cache_refresh_sec: float = float(os.getenv("GEMINI_CONTEXT_CACHE_REFRESH_SEC", "300"))
+    # Micro-batching de embeddings de consulta concurrentes (se apaga solo a baja carga)
+    embed_batch_enabled: bool = _get_bool("EMBED_BATCH_ENABLED", "true")
+    embed_batch_max_size: int = int(os.getenv("EMBED_BATCH_MAX_SIZE", "16"))
+    embed_batch_max_wait_ms: float = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "8"))
+    embed_batch_min_concurrency: int = int(os.getenv("EMBED_BATCH_MIN_CONCURRENCY", "4"))
+
+    # Tiers de modelo: preguntas simples al modelo rápido, el resto a GEMINI_CHAT_MODEL (+ hedging)
+    model_tiering_enabled: bool = _get_bool("MODEL_TIERING_ENABLED", "false")
+    gemini_fast_model: str = os.getenv("GEMINI_FAST_MODEL", "gemini-2.0-flash-lite")
+    tier_max_question_words: int = int(os.getenv("TIER_MAX_QUESTION_WORDS", "14"))
+    tier_min_score_margin: float = float(os.getenv("TIER_MIN_SCORE_MARGIN", "0.03"))
+    tier_max_products: int = int(os.getenv("TIER_MAX_PRODUCTS", "1"))
+    tier_fast_budget_ms: float = float(os.getenv("TIER_FAST_BUDGET_MS", "2500"))
+    tier_full_budget_ms: float = float(os.getenv("TIER_FULL_BUDGET_MS", "6000"))
+    tier_hedge_enabled: bool = _get_bool("TIER_HEDGE_ENABLED", "true")
+    # Precio USD por millón de tokens (entrada/salida) para los contadores de costo
+    tier_fast_usd_in: float = float(os.getenv("TIER_FAST_USD_IN", "0.075"))
+    tier_fast_usd_out: float = float(os.getenv("TIER_FAST_USD_OUT", "0.30"))
+    tier_full_usd_in: float = float(os.getenv("TIER_FULL_USD_IN", "0.10"))
+    tier_full_usd_out: float = float(os.getenv("TIER_FULL_USD_OUT", "0.40"))
 
     # Pinecone
     pinecone_api_key: str = os.getenv("PINECONE_API_KEY", "")
@@ -34,6 +58,103 @@ class Settings:
     max_top_k: int = int(os.getenv("MAX_TOP_K", "10"))
     cors_allow_origins: str = os.getenv("CORS_ALLOW_ORIGINS", "*")
 
+    # Deadlines por solicitud (el kiosco aborta a los 30s) + presupuestos por etapa
+    chat_deadline_sec: float = float(os.getenv("CHAT_DEADLINE_SEC", "20"))
+    voice_deadline_sec: float = float(os.getenv("VOICE_DEADLINE_SEC", "28"))
+    embed_timeout_sec: float = float(os.getenv("EMBED_TIMEOUT_SEC", "4"))
+    query_timeout_sec: float = float(os.getenv("QUERY_TIMEOUT_SEC", "4"))
+    generate_timeout_sec: float = float(os.getenv("GENERATE_TIMEOUT_SEC", "15"))
+    tts_timeout_sec: float = float(os.getenv("TTS_TIMEOUT_SEC", "10"))
+    voice_tts_reserve_sec: float = float(os.getenv("VOICE_TTS_RESERVE_SEC", "5"))
+
+    # Límites de upload de voz (el frontend corta a los 20s: MAX_TURN_MS)
+    voice_max_turn_sec: float = float(os.getenv("VOICE_MAX_TURN_SEC", "20"))
+    voice_max_upload_bytes: int = int(os.getenv("VOICE_MAX_UPLOAD_BYTES", "4000000"))
+    voice_upload_spool_bytes: int = int(os.getenv("VOICE_UPLOAD_SPOOL_BYTES", "1000000"))
+
+    # Perfil de respuesta para voz: "voice" (prompt hablado, resumen corto para TTS) | "text"
+    voice_answer_profile: str = os.getenv("VOICE_ANSWER_PROFILE", "voice").strip().lower()
+    voice_max_output_tokens: int = int(os.getenv("VOICE_MAX_OUTPUT_TOKENS", "320"))
+    voice_spoken_max_words: int = int(os.getenv("VOICE_SPOKEN_MAX_WORDS", "45"))
+    # Turno en dos fases: responde con el texto y un job de audio (GET /api/voice/audio/{id})
+    voice_audio_async: bool = _get_bool("VOICE_AUDIO_ASYNC", "false")
+    tts_job_workers: int = int(os.getenv("TTS_JOB_WORKERS", "1"))
+    tts_job_ttl_sec: float = float(os.getenv("TTS_JOB_TTL_SEC", "120"))
+    tts_job_max_jobs: int = int(os.getenv("TTS_JOB_MAX_JOBS", "200"))
+    tts_job_max_wait_sec: float = float(os.getenv("TTS_JOB_MAX_WAIT_SEC", "25"))
+
+    # Retrieval especulativo: embed+query con el transcript parcial de Vosk mientras termina el STT
+    speculative_retrieval_enabled: bool = _get_bool("SPECULATIVE_RETRIEVAL_ENABLED", "true")
+    speculative_min_words: int = int(os.getenv("SPECULATIVE_MIN_WORDS", "2"))
+    speculative_stable_updates: int = int(os.getenv("SPECULATIVE_STABLE_UPDATES", "2"))
+    speculative_min_overlap: float = float(os.getenv("SPECULATIVE_MIN_OVERLAP", "0.6"))
+    speculative_workers: int = int(os.getenv("SPECULATIVE_WORKERS", "4"))
+
+    # Circuit breakers por upstream (Gemini embed/generate, Pinecone query)
+    breaker_window: int = int(os.getenv("BREAKER_WINDOW", "20"))
+    breaker_min_calls: int = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+    breaker_failure_rate: float = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+    breaker_slow_rate: float = float(os.getenv("BREAKER_SLOW_RATE", "0.5"))
+    breaker_open_sec: float = float(os.getenv("BREAKER_OPEN_SEC", "30"))
+    embed_slow_ms: float = float(os.getenv("EMBED_SLOW_MS", "2000"))
+    query_slow_ms: float = float(os.getenv("QUERY_SLOW_MS", "2000"))
+    generate_slow_ms: float = float(os.getenv("GENERATE_SLOW_MS", "10000"))
+    degraded_message: str = os.getenv(
+        "DEGRADED_MESSAGE",
+        "En este momento no puedo consultar la información de productos. "
+        "Por favor intenta de nuevo en unos minutos o consulta con un asesor de la tienda.",
+    )
+
+    # Admisión: slots compartidos + límite/cola por etapa (chat > TTS corto > voz)
+    admission_total_slots: int = int(os.getenv("ADMISSION_TOTAL_SLOTS", "6"))
+    admission_chat_limit: int = int(os.getenv("ADMISSION_CHAT_LIMIT", "6"))
+    admission_tts_limit: int = int(os.getenv("ADMISSION_TTS_LIMIT", "2"))
+    admission_voice_limit: int = int(os.getenv("ADMISSION_VOICE_LIMIT", "2"))
+    admission_max_queue: int = int(os.getenv("ADMISSION_MAX_QUEUE", "8"))
+    admission_max_wait_sec: float = float(os.getenv("ADMISSION_MAX_WAIT_SEC", "8"))
+    short_tts_chars: int = int(os.getenv("SHORT_TTS_CHARS", "300"))
+
+    # Sesiones de conversación (seguimientos reutilizan el retrieval anterior)
+    session_max: int = int(os.getenv("SESSION_MAX", "1000"))
+    session_ttl_sec: float = float(os.getenv("SESSION_TTL_SEC", "900"))
+    session_max_turns: int = int(os.getenv("SESSION_MAX_TURNS", "3"))
+
+    # Rerank: over-fetch con vectores + corte por salto de score + MMR (diversidad)
+    rerank_enabled: bool = _get_bool("RERANK_ENABLED", "false")
+    rerank_fetch_multiplier: int = int(os.getenv("RERANK_FETCH_MULTIPLIER", "3"))
+    rerank_max_candidates: int = int(os.getenv("RERANK_MAX_CANDIDATES", "30"))
+    rerank_lambda: float = float(os.getenv("RERANK_LAMBDA", "0.7"))
+    rerank_score_gap: float = float(os.getenv("RERANK_SCORE_GAP", "0.08"))
+    rerank_min_score_ratio: float = float(os.getenv("RERANK_MIN_SCORE_RATIO", "0.75"))
+    rerank_min_keep: int = int(os.getenv("RERANK_MIN_KEEP", "2"))
+
+    # Preguntas multi-producto/objetivo: una sub-consulta filtrada por entidad (vocabulario del chunk store)
+    query_decomposition_enabled: bool = _get_bool("QUERY_DECOMPOSITION_ENABLED", "true")
+    query_decomposition_max_facets: int = int(os.getenv("QUERY_DECOMPOSITION_MAX_FACETS", "3"))
+    query_decomposition_min_per_facet: int = int(os.getenv("QUERY_DECOMPOSITION_MIN_PER_FACET", "2"))
+    query_decomposition_workers: int = int(os.getenv("QUERY_DECOMPOSITION_WORKERS", "8"))
+
+    # Store local de texto de chunks (las queries a Pinecone van sin metadata)
+    chunk_store_enabled: bool = _get_bool("CHUNK_STORE_ENABLED", "true")
+    chunk_store_path: str = os.getenv("CHUNK_STORE_PATH", "data/chunks.sqlite")
+
+    # Respuestas canónicas precalculadas (scripts/precompute_canonical_answers.py)
+    canonical_enabled: bool = _get_bool("CANONICAL_ENABLED", "true")
+    canonical_store_path: str = os.getenv("CANONICAL_STORE_PATH", "data/canonical_answers.sqlite")
+    canonical_intents_file: str = os.getenv("CANONICAL_INTENTS_FILE", "")
+    # Si se define, solo se sirven respuestas generadas con este data_version del índice
+    canonical_data_version: str = os.getenv("CANONICAL_DATA_VERSION", "")
+
+    # Bundle de respuestas frecuentes para el caché local del kiosco (scripts/build_answer_bundles.py)
+    answer_bundle_enabled: bool = _get_bool("ANSWER_BUNDLE_ENABLED", "true")
+    answer_bundle_path: str = os.getenv("ANSWER_BUNDLE_PATH", "data/answer_bundles.sqlite")
+    # Registra cada pregunta (normalizada) en los logs para elegir las frecuentes
+    answer_bundle_log_questions: bool = _get_bool("ANSWER_BUNDLE_LOG_QUESTIONS", "true")
+    # data_version del índice vigente; vacío = el dominante del store de chunks
+    answer_bundle_data_version: str = os.getenv("ANSWER_BUNDLE_DATA_VERSION", "")
+    # Cada cuánto el kiosco revalida el bundle (publicado en /config)
+    answer_bundle_sync_sec: int = int(os.getenv("ANSWER_BUNDLE_SYNC_SEC", "900"))
+
     # Kiosk: Terms (versioned)
     terms_version: str = os.getenv("TERMS_VERSION", "2026-01-12_v1")
     terms_file: str = os.getenv("TERMS_FILE", "terms_es.md")
@@ -45,6 +166,8 @@ class Settings:
     # Kiosk: Auth/registry
     require_kiosk_auth: bool = _get_bool("REQUIRE_KIOSK_AUTH", "true")
     kiosk_registry_file: str = os.getenv("KIOSK_REGISTRY_FILE", "kiosks.json")
+    # Endpoints /admin/* (header X-Admin-Token); vacío = desactivados
+    admin_token: str = os.getenv("ADMIN_TOKEN", "")
 
     # UI config
     bot_name: str = os.getenv("BOT_NAME", "NatuBot")
@@ -63,6 +186,22 @@ class Settings:
     log_dir: str = os.getenv("LOG_DIR", "logs")
     log_level: str = os.getenv("LOG_LEVEL", "INFO")
 
+    # Profiler por muestreo: perfila una fracción de /chat y turnos de voz y guarda los lentos
+    profiling_enabled: bool = _get_bool("PROFILING_ENABLED", "false")
+    profiling_sample_rate: float = float(os.getenv("PROFILING_SAMPLE_RATE", "0.05"))
+    profiling_slow_ms: float = float(os.getenv("PROFILING_SLOW_MS", "3000"))
+    profiling_interval_ms: float = float(os.getenv("PROFILING_INTERVAL_MS", "10"))
+    profiling_format: str = os.getenv("PROFILING_FORMAT", "collapsed").strip().lower()  # collapsed | speedscope
+    profiling_dir: str = os.getenv("PROFILING_DIR", "logs/profiles")
+    profiling_max_files: int = int(os.getenv("PROFILING_MAX_FILES", "200"))
+    profiling_max_mb: float = float(os.getenv("PROFILING_MAX_MB", "50"))
+
+    # Health: prober en segundo plano (/health sirve desde memoria)
+    health_probe_interval_sec: float = float(os.getenv("HEALTH_PROBE_INTERVAL_SEC", "30"))
+    health_stale_after_sec: float = float(os.getenv("HEALTH_STALE_AFTER_SEC", "120"))
+    health_probe_timeout_sec: float = float(os.getenv("HEALTH_PROBE_TIMEOUT_SEC", "5"))
+    health_allow_deep: bool = _get_bool("HEALTH_ALLOW_DEEP", "false")
+
     # Speech pipeline
     stt_mode: str = os.getenv("STT_MODE", "local").strip().lower()
     tts_mode: str = os.getenv("TTS_MODE", "silero").strip().lower()
@@ -72,17 +211,33 @@ class Settings:
 
     models_dir: str = os.getenv("MODELS_DIR", "models")
     vosk_model_path: str = os.getenv("VOSK_MODEL_PATH", "models/vosk-es")
+    vosk_chunk_bytes: int = int(os.getenv("VOSK_CHUNK_BYTES", "4000"))
+    # Gramática del catálogo (scripts/build_stt_vocabulary.py); sin el archivo, vocabulario abierto
+    vosk_grammar_enabled: bool = _get_bool("VOSK_GRAMMAR_ENABLED", "true")
+    vosk_vocabulary_path: str = os.getenv("VOSK_VOCABULARY_PATH", "data/stt_vocabulary.json")
+    vosk_grammar_min_confidence: float = float(os.getenv("VOSK_GRAMMAR_MIN_CONFIDENCE", "0.75"))
+    vosk_grammar_max_unk_ratio: float = float(os.getenv("VOSK_GRAMMAR_MAX_UNK_RATIO", "0.2"))
+    # Ambos reconocedores en la misma pasada: fallback sin re-decodificar, doble CPU por turno
+    vosk_grammar_parallel: bool = _get_bool("VOSK_GRAMMAR_PARALLEL", "false")
 
     audio_sample_rate: int = int(os.getenv("AUDIO_SAMPLE_RATE", "16000"))
     vad_enabled: bool = _get_bool("VAD_ENABLED", "true")
     vad_aggressiveness: int = int(os.getenv("VAD_AGGRESSIVENESS", "2"))
     vad_frame_ms: int = int(os.getenv("VAD_FRAME_MS", "30"))
     vad_end_silence_ms: int = int(os.getenv("VAD_END_SILENCE_MS", "800"))
+    # El kiosco corta el turno y recorta el silencio inicial; con client_vad=true no se re-recorta
+    vad_client_enabled: bool = _get_bool("VAD_CLIENT_ENABLED", "true")
 
     silero_language: str = os.getenv("SILERO_LANGUAGE", "es")
     silero_speaker: str = os.getenv("SILERO_SPEAKER", "v3_es")
     tts_chunk_chars: int = int(os.getenv("TTS_CHUNK_CHARS", "700"))
 
+    # Servidor preforked (python -m app.serve): Vosk/Silero se cargan una vez antes del fork
+    serve_workers: int = int(os.getenv("SERVE_WORKERS", "1"))
+    serve_preload: bool = _get_bool("SERVE_PRELOAD", "true")
+    # Hilos intra-op de torch por worker (0 = núcleos / workers)
+    torch_num_threads: int = int(os.getenv("TORCH_NUM_THREADS", "0"))
+
 def get_settings() -> Settings:
     s = Settings()
     missing = []
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from .metrics import metrics
+from .profiling import propagate
+from .sessions import normalize_text
+
+Retrieval = Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]
+
+# Palabras que no cambian el tema de la consulta: no cuentan para decidir si el
+# transcript final "es la misma pregunta" que el parcial con el que se especuló.
+_STOPWORDS = {
+    "a", "al", "con", "de", "del", "el", "en", "es", "la", "las", "le", "lo", "los", "me", "mi",
+    "o", "para", "por", "que", "se", "si", "su", "te", "un", "una", "y", "eh", "este", "pues",
+    "bueno", "hola", "oye", "favor", "dime", "quiero", "saber",
+}
+
+
+def content_tokens(text: str) -> FrozenSet[str]:
+    return frozenset(w for w in normalize_text(text).split() if w not in _STOPWORDS)
+
+
+def token_overlap(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Jaccard entre palabras de contenido (0 si alguno está vacío)."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class _Attempt:
+    text: str
+    tokens: FrozenSet[str]
+    started: float
+    future: Optional[Future] = None
+    finished: Optional[float] = None
+
+
+@dataclass
+class SpeculativeRetrieval:
+    """
+    Retrieval especulativo para un turno de voz. El STT llama `on_partial` con el
+    transcript parcial acumulado; cuando el parcial se estabiliza (solo crece durante
+    `stable_updates` actualizaciones y tiene `min_words` palabras de contenido) se lanza
+    `retrieve(texto)` en `executor`. Al terminar el STT, `resolve(final)` reutiliza el
+    intento más parecido si el solapamiento de palabras llega a `min_overlap`; si no,
+    lo descarta y el turno hace el retrieval normal.
+
+    Métricas: speculative.started / hits / misses / errors / unused y
+    speculative.saved_ms (tiempo de retrieval que corrió en paralelo al STT).
+    """
+
+    retrieve: Callable[[str], Optional[Retrieval]]
+    executor: Executor
+    min_words: int = 2
+    stable_updates: int = 2
+    min_overlap: float = 0.6
+    max_attempts: int = 2
+    clock: Callable[[], float] = time.monotonic
+    _attempts: List[_Attempt] = field(default_factory=list, init=False)
+    _last_words: List[str] = field(default_factory=list, init=False)
+    _stable: int = field(default=0, init=False)
+    _closed: bool = field(default=False, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def on_partial(self, text: str) -> None:
+        words = normalize_text(text).split()
+        with self._lock:
+            if self._closed:
+                return
+            grew = bool(self._last_words) and words[: len(self._last_words)] == self._last_words
+            self._stable = self._stable + 1 if grew else 0
+            self._last_words = words
+            if self._stable < self.stable_updates or len(self._attempts) >= self.max_attempts:
+                return
+            tokens = content_tokens(text)
+            if len(tokens) < self.min_words:
+                return
+            # Un nuevo intento solo si el parcial ya cambió de tema respecto al anterior.
+            if self._attempts and token_overlap(tokens, self._attempts[-1].tokens) >= self.min_overlap:
+                return
+            attempt = _Attempt(text=text, tokens=tokens, started=self.clock())
+            attempt.future = self.executor.submit(propagate(self._run), attempt)
+            self._attempts.append(attempt)
+        metrics.inc("speculative.started")
+
+    def _run(self, attempt: _Attempt) -> Optional[Retrieval]:
+        try:
+            return self.retrieve(attempt.text)
+        finally:
+            attempt.finished = self.clock()
+
+    def resolve(self, final_text: str, timeout: Optional[float] = None) -> Optional[Retrieval]:
+        """(contexts, citations) del intento que coincide con el transcript final, o None."""
+        with self._lock:
+            self._closed = True
+            attempts = list(self._attempts)
+        if not attempts:
+            return None
+
+        final_tokens = content_tokens(final_text)
+        best = max(attempts, key=lambda a: token_overlap(a.tokens, final_tokens))
+        if token_overlap(best.tokens, final_tokens) < self.min_overlap:
+            metrics.inc("speculative.misses")
+            self._cancel(attempts)
+            return None
+        self._cancel([a for a in attempts if a is not best])
+
+        resolved_at = self.clock()
+        try:
+            result = best.future.result(timeout=timeout)
+        except Exception:
+            metrics.inc("speculative.errors")
+            return None
+        if result is None:
+            metrics.inc("speculative.misses")
+            return None
+        metrics.inc("speculative.hits")
+        finished = best.finished if best.finished is not None else self.clock()
+        metrics.observe("speculative.saved_ms", max(0.0, (min(finished, resolved_at) - best.started) * 1000.0))
+        return result
+
+    def close(self) -> None:
+        """Fin del turno sin `resolve` (respuesta canónica, seguimiento de sesión, error)."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            attempts = list(self._attempts)
+        if attempts:
+            metrics.inc("speculative.unused")
+        self._cancel(attempts)
+
+    @staticmethod
+    def _cancel(attempts: List[_Attempt]) -> None:
+        # Solo cancela lo que aún está en cola; lo que ya corre termina y se descarta.
+        for a in attempts:
+            if a.future is not None:
+                a.future.cancel()
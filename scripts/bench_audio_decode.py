@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import argparse
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.speech.audio_utils import normalize_audio_bytes, pcm16_to_wav_bytes  # noqa: E402
+
+
+def _cpu_ms() -> float:
+    # CPU propio + hijos (ffmpeg corre como subproceso)
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    kids = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (own.ru_utime + own.ru_stime + kids.ru_utime + kids.ru_stime) * 1000.0
+
+
+def _synthetic_pcm(seconds: float, rate: int) -> bytes:
+    # Tono + ruido: suficiente para medir decode/resample (no es una prueba de STT).
+    t = np.arange(int(seconds * rate)) / rate
+    rng = np.random.default_rng(0)
+    sig = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(t.size)
+    return (np.clip(sig, -1, 1) * 32767).astype("<i2").tobytes()
+
+
+def _measure(label: str, payload: bytes, *, source_name: str, content_type=None, runs: int) -> None:
+    normalize_audio_bytes(payload, source_name=source_name, content_type=content_type)  # warm-up
+    cpu0, wall0 = _cpu_ms(), time.perf_counter()
+    for _ in range(runs):
+        normalize_audio_bytes(payload, source_name=source_name, content_type=content_type)
+    cpu = (_cpu_ms() - cpu0) / runs
+    wall = (time.perf_counter() - wall0) * 1000.0 / runs
+    print(f"{label:<28}{len(payload) / 1024:>10.1f} KB{wall:>12.1f} ms{cpu:>12.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bytes subidos y CPU de decode por turno según formato de upload")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    pcm48 = _synthetic_pcm(args.seconds, 48000)
+    pcm16 = _synthetic_pcm(args.seconds, 16000)
+
+    print(f"Turno sintético de {args.seconds:.0f}s, promedio de {args.runs} corridas")
+    print(f"{'formato':<28}{'upload':>13}{'wall':>15}{'cpu':>15}")
+
+    if shutil.which("ffmpeg"):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "in.wav"
+            dst = Path(tmp) / "turn.webm"
+            src.write_bytes(pcm16_to_wav_bytes(pcm48, sample_rate=48000))
+            subprocess.run(
+                ["ffmpeg", "-y", "-loglevel", "error", "-i", str(src), "-c:a", "libopus", str(dst)], check=True
+            )
+            _measure("webm/opus 48k (ffmpeg)", dst.read_bytes(), source_name="turn.webm", runs=args.runs)
+    else:
+        print("(ffmpeg no encontrado: se omite webm/opus)")
+
+    _measure("wav 48k (decode+resample)", pcm16_to_wav_bytes(pcm48, sample_rate=48000), source_name="turn.wav", runs=args.runs)
+    _measure(
+        "pcm 16k crudo (fast path)",
+        pcm16,
+        source_name="turn.pcm",
+        content_type="audio/pcm;rate=16000;channels=1",
+        runs=args.runs,
+    )
+
+
+if __name__ == "__main__":
+    main()
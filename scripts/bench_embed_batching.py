@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from natubot_core.gemini_client import GeminiClient  # noqa: E402
+from natubot_core.metrics import metrics  # noqa: E402
+
+
+class FakeEmbedAPI:
+    """
+    Fake local de `models.embed_content`: latencia = RTT + costo por texto, con un tope de
+    conexiones simultáneas (como el pool HTTP del cliente / la cuota por proyecto).
+    """
+
+    def __init__(self, rtt_ms: float, per_item_ms: float, connections: int, dim: int):
+        self.rtt_sec = rtt_ms / 1000.0
+        self.per_item_sec = per_item_ms / 1000.0
+        self.dim = dim
+        self.slots = threading.Semaphore(connections)
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.models = SimpleNamespace(embed_content=self._embed_content)
+
+    def _embed_content(self, *, model: str, contents: Any, config: Any) -> Any:
+        texts = contents if isinstance(contents, list) else [contents]
+        with self._lock:
+            self.calls += 1
+        with self.slots:
+            time.sleep(self.rtt_sec + self.per_item_sec * len(texts))
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=[float(len(t))] * self.dim) for t in texts])
+
+
+def _pct(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    v = sorted(values)
+    return v[min(len(v) - 1, int(p * len(v)))]
+
+
+def run(rate: float, seconds: float, *, batch_max: int, args: argparse.Namespace) -> Dict[str, Any]:
+    api = FakeEmbedAPI(args.rtt_ms, args.per_item_ms, args.connections, dim=8)
+    gemini = GeminiClient(
+        api_key="",
+        chat_model="fake-model",
+        embed_model="fake-embed",
+        embed_dim=8,
+        client=api,
+        embed_batch_max=batch_max,
+        embed_batch_wait_ms=args.max_wait_ms,
+        embed_batch_min_concurrency=args.min_concurrency,
+    )
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def one(i: int) -> None:
+        t0 = time.perf_counter()
+        vec = gemini.embed_query(f"pregunta {i}", timeout=4.0)
+        assert vec[0] == float(len(f"pregunta {i}"))  # cada waiter recibe su propio vector
+        with lock:
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+
+    before = metrics.snapshot()
+    rng = random.Random(7)
+    n = 0
+    with ThreadPoolExecutor(max_workers=256) as pool:
+        t_end = time.perf_counter() + seconds
+        while time.perf_counter() < t_end:
+            pool.submit(one, n)
+            n += 1
+            time.sleep(rng.expovariate(rate))
+    after = metrics.snapshot()
+
+    size = after["histograms"].get("embed_batch.size", {"count": 0, "sum": 0})
+    size0 = before["histograms"].get("embed_batch.size", {"count": 0, "sum": 0})
+    batches = size["count"] - size0["count"]
+    return {
+        "requests": n,
+        "calls": api.calls,
+        "p50": _pct(latencies, 0.5),
+        "p95": _pct(latencies, 0.95),
+        "mean_batch": (size["sum"] - size0["sum"]) / batches if batches else 1.0,
+        "direct": after["counters"].get("embed_batch.direct", 0) - before["counters"].get("embed_batch.direct", 0),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="embed_query con y sin micro-batching contra un fake local del API (llegadas Poisson)"
+    )
+    parser.add_argument("--rates", default="1,5,20,60,150", help="Requests/s a simular, separados por coma")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duración por escenario")
+    parser.add_argument("--rtt-ms", type=float, default=120.0)
+    parser.add_argument("--per-item-ms", type=float, default=2.0)
+    parser.add_argument("--connections", type=int, default=10, help="Requests simultáneos que acepta el upstream")
+    parser.add_argument("--max-size", type=int, default=16, help="EMBED_BATCH_MAX_SIZE")
+    parser.add_argument("--max-wait-ms", type=float, default=8.0, help="EMBED_BATCH_MAX_WAIT_MS")
+    parser.add_argument("--min-concurrency", type=int, default=4, help="EMBED_BATCH_MIN_CONCURRENCY")
+    args = parser.parse_args()
+
+    print(
+        f"fake: RTT {args.rtt_ms:.0f} ms + {args.per_item_ms:.0f} ms/texto, {args.connections} conexiones | "
+        f"lote máx {args.max_size}, espera máx {args.max_wait_ms:.0f} ms"
+    )
+    print(f"{'req/s':>6}  {'modo':<9}{'requests':>9}{'llamadas':>9}{'lote medio':>11}{'directas':>9}{'p50 ms':>8}{'p95 ms':>8}")
+    for rate in [float(r) for r in args.rates.split(",") if r.strip()]:
+        for label, batch_max in (("sin lote", 0), ("lote", args.max_size)):
+            r = run(rate, args.seconds, batch_max=batch_max, args=args)
+            print(
+                f"{rate:>6.0f}  {label:<9}{r['requests']:>9}{r['calls']:>9}{r['mean_batch']:>11.1f}"
+                f"{r['direct']:>9.0f}{r['p50']:>8.0f}{r['p95']:>8.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from natubot_core.chunk_store import ChunkStore  # noqa: E402
+from natubot_core.gemini_client import GeminiClient  # noqa: E402
+from natubot_core.pinecone_client import PineconeClients  # noqa: E402
+from natubot_core.prompts import build_prompt  # noqa: E402
+from natubot_core.rag import retrieve_context  # noqa: E402
+from natubot_core.rerank import RerankConfig  # noqa: E402
+from natubot_core.settings import get_settings  # noqa: E402
+
+DEFAULT_QUERIES = [
+    "¿Para qué sirve la caléndula?",
+    "¿Qué me recomiendas para dormir mejor?",
+    "¿Cómo se toma el omega 3?",
+    "¿Qué contraindicaciones tiene el ginkgo?",
+    "Tengo problemas de digestión, ¿qué producto me sirve?",
+    "¿Qué productos ayudan con el estrés?",
+    "¿Hay algo natural para las articulaciones?",
+    "¿Qué ingredientes tiene el producto para el colesterol?",
+]
+
+
+def _pct(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    v = sorted(values)
+    return v[min(len(v) - 1, int(p * len(v)))]
+
+
+def run(
+    *,
+    label: str,
+    queries: List[str],
+    gemini: GeminiClient,
+    pinecone: PineconeClients,
+    settings,
+    top_k: int,
+    rerank: Optional[RerankConfig],
+    chunk_store: Optional[ChunkStore],
+    generate: bool,
+) -> Dict[str, Any]:
+    prompt_chars: List[int] = []
+    n_contexts: List[int] = []
+    n_products: List[int] = []
+    retrieve_ms: List[float] = []
+    total_ms: List[float] = []
+    for q in queries:
+        t0 = time.perf_counter()
+        contexts, citations = retrieve_context(
+            question=q,
+            gemini=gemini,
+            pinecone=pinecone,
+            namespace=settings.pinecone_namespace,
+            top_k=top_k,
+            chunk_store=chunk_store,
+            rerank=rerank,
+        )
+        t1 = time.perf_counter()
+        prompt = build_prompt(q, contexts, bot_name=settings.bot_name)
+        if generate:
+            gemini.generate(prompt)
+        t2 = time.perf_counter()
+        assert len(citations) == len(contexts)
+
+        prompt_chars.append(len(prompt))
+        n_contexts.append(len(contexts))
+        n_products.append(len({(c.get("metadata") or {}).get("product_id") for c in contexts}))
+        retrieve_ms.append((t1 - t0) * 1000.0)
+        total_ms.append((t2 - t0) * 1000.0)
+
+    return {
+        "label": label,
+        "prompt_chars_avg": statistics.mean(prompt_chars),
+        "contexts_avg": statistics.mean(n_contexts),
+        "products_avg": statistics.mean(n_products),
+        "retrieve_p50": _pct(retrieve_ms, 0.5),
+        "retrieve_p95": _pct(retrieve_ms, 0.95),
+        "total_p50": _pct(total_ms, 0.5),
+        "total_p95": _pct(total_ms, 0.95),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark: retrieval top_k directo vs over-fetch + MMR")
+    parser.add_argument("--queries", default=None, help="Archivo con una pregunta por línea")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=1, help="Repeticiones del set de preguntas")
+    parser.add_argument("--no-generate", action="store_true", help="No llamar a Gemini generate (solo retrieval + prompt)")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        queries = [line.strip() for line in Path(args.queries).read_text(encoding="utf-8").splitlines() if line.strip()]
+    queries = queries * max(1, args.repeat)
+
+    gemini = GeminiClient(
+        api_key=settings.gemini_api_key,
+        chat_model=settings.gemini_chat_model,
+        embed_model=settings.gemini_embed_model,
+        embed_dim=settings.embed_dim,
+    )
+    pinecone = PineconeClients(
+        api_key=settings.pinecone_api_key,
+        index_name=settings.pinecone_index_name,
+        index_host=settings.pinecone_index_host,
+    )
+    store_path = Path(settings.chunk_store_path)
+    if not store_path.is_absolute():
+        store_path = PROJECT_ROOT / store_path
+    chunk_store = ChunkStore(store_path) if store_path.exists() else None
+
+    rerank = RerankConfig(
+        fetch_multiplier=settings.rerank_fetch_multiplier,
+        max_candidates=settings.rerank_max_candidates,
+        lambda_=settings.rerank_lambda,
+        score_gap=settings.rerank_score_gap,
+        min_score_ratio=settings.rerank_min_score_ratio,
+        min_keep=settings.rerank_min_keep,
+    )
+    common = dict(
+        queries=queries, gemini=gemini, pinecone=pinecone, settings=settings, top_k=args.top_k,
+        chunk_store=chunk_store, generate=not args.no_generate,
+    )
+    if chunk_store is None:
+        print("[warn] sin store de chunks el retrieval ignora el rerank: ambas filas medirán lo mismo")
+    rows = [
+        run(label=f"top_k={args.top_k}", rerank=None, **common),
+        run(label=f"mmr (fetch {rerank.fetch_k(args.top_k)})", rerank=rerank, **common),
+    ]
+
+    print(f"{len(queries)} preguntas | chunk store: {'sí' if chunk_store else 'no'} | generate: {not args.no_generate}")
+    header = f"{'modo':<22}{'prompt chars':>14}{'ctx':>6}{'prod':>6}{'ret p50':>10}{'ret p95':>10}{'e2e p50':>10}{'e2e p95':>10}"
+    print(header)
+    for r in rows:
+        print(
+            f"{r['label']:<22}{r['prompt_chars_avg']:>14.0f}{r['contexts_avg']:>6.1f}{r['products_avg']:>6.1f}"
+            f"{r['retrieve_p50']:>10.0f}{r['retrieve_p95']:>10.0f}{r['total_p50']:>10.0f}{r['total_p95']:>10.0f}"
+        )
+    base, mmr = rows
+    if base["prompt_chars_avg"]:
+        print(f"Reducción de prompt: {100.0 * (1 - mmr['prompt_chars_avg'] / base['prompt_chars_avg']):.1f}%")
+
+
+if __name__ == "__main__":
+    main()
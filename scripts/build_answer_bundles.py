@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from natubot_core.answer_bundle import (  # noqa: E402
+    AUDIO_FORMATS,
+    GLOBAL_LOCATION,
+    AnswerBundleStore,
+    compress_audio,
+    count_questions,
+    dominant_version,
+    select_popular,
+)
+from natubot_core.canonical import CanonicalMatcher, CanonicalStore, load_intents  # noqa: E402
+from natubot_core.chunk_store import ChunkStore  # noqa: E402
+from natubot_core.gemini_client import GeminiClient  # noqa: E402
+from natubot_core.pinecone_client import PineconeClients  # noqa: E402
+from natubot_core.rag import answer_with_rag  # noqa: E402
+from natubot_core.settings import get_settings  # noqa: E402
+
+
+def _resolve(path: str) -> Path:
+    p = Path(path)
+    return p if p.is_absolute() else PROJECT_ROOT / p
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Arma el bundle de respuestas frecuentes por ubicación a partir de los logs (eventos `question`)"
+    )
+    parser.add_argument("--store", default=None, help="Ruta del SQLite (default: ANSWER_BUNDLE_PATH)")
+    parser.add_argument("--log-dir", default=None, help="Directorio de logs (default: LOG_DIR)")
+    parser.add_argument("--days", type=float, default=14.0, help="Ventana de tráfico a considerar")
+    parser.add_argument("--top", type=int, default=40, help="Preguntas por ubicación")
+    parser.add_argument("--min-count", type=int, default=3, help="Repeticiones mínimas de una pregunta")
+    parser.add_argument("--min-devices", type=int, default=1, help="Kioscos distintos mínimos por pregunta")
+    parser.add_argument("--audio-format", choices=AUDIO_FORMATS, default="opus", help="Compresión del audio")
+    parser.add_argument("--no-audio", action="store_true", help="Solo texto (el kiosco pide /api/tts si hay red)")
+    parser.add_argument("--data-version", default=None, help="data_version del índice (default: el del store de chunks)")
+    parser.add_argument("--force", action="store_true", help="Regenerar aunque la respuesta esté al día")
+    parser.add_argument("--dry-run", action="store_true", help="Solo lista las preguntas frecuentes")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    since = time.time() - args.days * 86400 if args.days > 0 else 0.0
+    counts = count_questions(_resolve(args.log_dir or settings.log_dir), since=since)
+    popular = select_popular(counts, top=args.top, min_count=args.min_count, min_devices=args.min_devices)
+    keys = sorted({k for ranked in popular.values() for k, _ in ranked})
+    print(f"Ubicaciones: {len(popular)} | preguntas frecuentes distintas: {len(keys)}")
+    for loc, ranked in sorted(popular.items()):
+        print(f"  {loc or '(global)'}: {len(ranked)} (top: {ranked[0][0]!r} x{ranked[0][1]})")
+    if args.dry_run:
+        for k, n in popular.get(GLOBAL_LOCATION, []):
+            print(f"    {n:>5}  {k}")
+        return
+
+    chunk_store_path = _resolve(settings.chunk_store_path)
+    chunk_store = ChunkStore(chunk_store_path) if settings.chunk_store_enabled and chunk_store_path.exists() else None
+    data_version = (
+        args.data_version
+        or settings.answer_bundle_data_version
+        or (dominant_version(chunk_store.versions()) if chunk_store is not None else "")
+    )
+    if not data_version:
+        print("[warn] data_version desconocido: el bundle se servirá sin comprobar la versión del índice")
+
+    store = AnswerBundleStore(_resolve(args.store or settings.answer_bundle_path))
+
+    # Las preguntas que calzan con una respuesta canónica reutilizan su texto y audio.
+    canonical_store = canonical = None
+    canonical_path = _resolve(settings.canonical_store_path)
+    if settings.canonical_enabled and canonical_path.exists():
+        intents_path = settings.canonical_intents_file
+        canonical_store = CanonicalStore(canonical_path)
+        canonical = CanonicalMatcher(
+            canonical_store.load_answers(data_version or None),
+            load_intents(_resolve(intents_path) if intents_path else None),
+        )
+
+    gemini = GeminiClient(
+        api_key=settings.gemini_api_key,
+        chat_model=settings.gemini_chat_model,
+        embed_model=settings.gemini_embed_model,
+        embed_dim=settings.embed_dim,
+    )
+    pinecone = PineconeClients(
+        api_key=settings.pinecone_api_key,
+        index_name=settings.pinecone_index_name,
+        index_host=settings.pinecone_index_host,
+    )
+
+    tts = None
+    if not args.no_audio:
+        from app.speech.tts_silero import SileroTTS
+
+        tts = SileroTTS(
+            language=settings.silero_language,
+            speaker=settings.silero_speaker,
+            sample_rate=settings.audio_sample_rate,
+            chunk_chars=settings.tts_chunk_chars,
+        )
+
+    generated = skipped = failed = 0
+    for key in keys:
+        if not args.force and store.is_fresh(
+            key, data_version=data_version, terms_version=settings.terms_version, need_audio=tts is not None
+        ):
+            skipped += 1
+            continue
+
+        wav = None
+        hit = canonical.match(key) if canonical is not None else None
+        if hit is not None:
+            answer, citations = hit.answer, hit.citations
+            wav = canonical_store.audio_for(hit.answer_sha) if tts is not None and hit.has_audio else None
+        else:
+            # Sin sesión ni filtro: la misma respuesta que recibiría un kiosco recién abierto.
+            result = answer_with_rag(
+                question=key,
+                gemini=gemini,
+                pinecone=pinecone,
+                namespace=settings.pinecone_namespace,
+                top_k=settings.default_top_k,
+                bot_name=settings.bot_name,
+                chunk_store=chunk_store,
+            )
+            if result.get("degraded") or not result.get("used_context") or not result["answer"]:
+                failed += 1
+                print(f"  [skip] {key!r}: sin contexto o respuesta degradada")
+                continue
+            answer, citations = result["answer"], result["citations"]
+
+        audio = mime = None
+        if tts is not None:
+            try:
+                audio, mime = compress_audio(wav or tts.synthesize(answer), args.audio_format)
+            except Exception as e:
+                print(f"  [warn] {key!r}: audio falló ({e}); se guarda solo texto")
+
+        store.upsert(
+            key=key,
+            answer=answer,
+            citations=citations,
+            data_version=data_version,
+            terms_version=settings.terms_version,
+            audio=audio,
+            audio_mime=mime or "",
+        )
+        generated += 1
+        print(f"  [ok] {key!r}{' (canónica)' if hit is not None else ''}")
+
+    store.replace_popular(popular)
+    removed = store.prune(keys)
+    store.set_meta("data_version", data_version)
+    store.set_meta("terms_version", settings.terms_version)
+    store.set_meta("built_at", time.strftime("%Y-%m-%dT%H:%M:%S%z"))
+
+    print(f"Listo: {generated} generadas, {skipped} al día, {failed} sin generar, {removed} eliminadas.")
+    print("Reinicia el backend para publicar el bundle nuevo.")
+
+
+if __name__ == "__main__":
+    main()
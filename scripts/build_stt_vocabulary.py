@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterator
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.speech.vocabulary import build_vocabulary, save_vocabulary  # noqa: E402
+from natubot_core.canonical import load_intents  # noqa: E402
+from natubot_core.settings import get_settings  # noqa: E402
+
+
+def _resolve(path: str) -> Path:
+    p = Path(path)
+    return p if p.is_absolute() else PROJECT_ROOT / p
+
+
+def chunks_from_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
+    """Salida del notebook de ingesta (`rag_contract_v1.jsonl`: {id, text, metadata})."""
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        md = dict(row.get("metadata") or row)
+        md.setdefault("text", row.get("text") or "")
+        yield md
+
+
+def chunks_from_store(path: Path) -> Iterator[Dict[str, Any]]:
+    from natubot_core.chunk_store import ChunkStore
+
+    store = ChunkStore(path)
+    ids = store.all_ids()
+    for i in range(0, len(ids), 500):
+        yield from store.get_many(ids[i : i + 500]).values()
+
+
+def chunks_from_index(settings) -> Iterator[Dict[str, Any]]:
+    from natubot_core.pinecone_client import PineconeClients
+
+    pinecone = PineconeClients(
+        api_key=settings.pinecone_api_key,
+        index_name=settings.pinecone_index_name,
+        index_host=settings.pinecone_index_host,
+    )
+    ids = list(pinecone.list_ids(namespace=settings.pinecone_namespace))
+    yield from pinecone.fetch_metadata(namespace=settings.pinecone_namespace, ids=ids).values()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Genera la gramática de Vosk (productos, ingredientes y frases de kiosco) desde el catálogo ingerido"
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--chunks-jsonl", default=None, help="rag_contract_v1.jsonl del notebook de ingesta")
+    source.add_argument("--store", default=None, help="SQLite de chunks (default: CHUNK_STORE_PATH)")
+    source.add_argument("--from-index", action="store_true", help="Lee la metadata desde Pinecone (fetch)")
+    parser.add_argument("--out", default=None, help="Archivo de salida (default: VOSK_VOCABULARY_PATH)")
+    parser.add_argument("--intents", default=None, help="JSON de intenciones (default: CANONICAL_INTENTS_FILE)")
+    parser.add_argument("--text-words", type=int, default=300, help="Palabras más frecuentes de los textos a incluir")
+    parser.add_argument("--extra", action="append", default=[], help="Frase adicional (repetible)")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    if args.chunks_jsonl:
+        chunks = chunks_from_jsonl(_resolve(args.chunks_jsonl))
+    elif args.from_index:
+        chunks = chunks_from_index(settings)
+    else:
+        store_path = _resolve(args.store or settings.chunk_store_path)
+        if not store_path.exists():
+            sys.exit(f"No existe el store de chunks {store_path}; usa --chunks-jsonl o --from-index.")
+        chunks = chunks_from_store(store_path)
+
+    intents_path = args.intents or settings.canonical_intents_file
+    intents = load_intents(_resolve(intents_path) if intents_path else None)
+
+    vocab = build_vocabulary(chunks, intents=intents, extra_phrases=args.extra, text_words=args.text_words)
+    out = _resolve(args.out or settings.vosk_vocabulary_path)
+    save_vocabulary(vocab, out)
+    print(
+        f"Vocabulario ({vocab['data_version'] or 'sin data_version'}): {len(vocab['products'])} productos, "
+        f"{len(vocab['ingredients'])} ingredientes, {len(vocab['health_goals'])} objetivos, "
+        f"{len(vocab['phrases'])} entradas de gramática → {out}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from natubot_core.chunk_store import ChunkStore, consistency_report  # noqa: E402
+from natubot_core.pinecone_client import PineconeClients  # noqa: E402
+from natubot_core.settings import get_settings  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Verifica que el store local de chunks cubra todos los ids del índice")
+    parser.add_argument("--store", default=None, help="Ruta del SQLite (default: CHUNK_STORE_PATH)")
+    parser.add_argument("--sync", action="store_true", help="Trae de Pinecone (fetch) los chunks faltantes")
+    parser.add_argument("--prune", action="store_true", help="Borra del store los ids que ya no están en el índice")
+    parser.add_argument("--json", action="store_true", help="Imprime el reporte completo en JSON")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    store_path = Path(args.store or settings.chunk_store_path)
+    if not store_path.is_absolute():
+        store_path = PROJECT_ROOT / store_path
+    store = ChunkStore(store_path)
+    pinecone = PineconeClients(
+        api_key=settings.pinecone_api_key,
+        index_name=settings.pinecone_index_name,
+        index_host=settings.pinecone_index_host,
+    )
+    namespace = settings.pinecone_namespace
+
+    index_ids = list(pinecone.list_ids(namespace=namespace))
+    report = consistency_report(store, index_ids)
+
+    if args.sync and report["missing_in_store"]:
+        fetched = pinecone.fetch_metadata(namespace=namespace, ids=report["missing_in_store"])
+        store.upsert_many({"id": vid, "metadata": md} for vid, md in fetched.items())
+        print(f"Sincronizados desde Pinecone: {len(fetched)}")
+    if args.prune and report["orphaned_in_store"]:
+        print(f"Eliminados del store: {store.delete(report['orphaned_in_store'])}")
+    if args.sync or args.prune:
+        report = consistency_report(store, index_ids)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"Índice ({namespace}): {report['index_ids']} ids | store: {report['store_ids']} ids")
+        print(f"data_version en store: {report['data_versions']}")
+        print(f"Faltantes en store: {len(report['missing_in_store'])}")
+        for vid in report["missing_in_store"][:20]:
+            print(f"  - {vid}")
+        print(f"Huérfanos en store: {len(report['orphaned_in_store'])}")
+
+    sys.exit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import argparse
+import re
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from natubot_core.gemini_client import GeminiClient  # noqa: E402
+from natubot_core.metrics import metrics  # noqa: E402
+from natubot_core.prompts import build_prompt, build_user_prompt, system_instruction  # noqa: E402
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+QUESTIONS = [
+    "¿Para qué sirve la caléndula?",
+    "¿Cómo se toma la moringa y cuántas veces al día?",
+    "¿El colágeno hidrolizado tiene contraindicaciones?",
+    "¿Qué ingredientes tiene el té de manzanilla?",
+]
+
+
+def count_tokens(text: str) -> int:
+    # Aproximación (palabras + signos); alcanza para comparar configuraciones entre sí.
+    return len(_TOKEN.findall(text or ""))
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeGenAI:
+    """
+    Fake local de `genai.Client` (models.generate_content + caches.create/update) con
+    `usage_metadata` como el API real: el system_instruction y el cached content cuentan
+    como prompt tokens; los del caché además en `cached_content_token_count`.
+    """
+
+    def __init__(self, clock: FakeClock, min_cache_tokens: int = 0):
+        self.clock = clock
+        self.min_cache_tokens = min_cache_tokens
+        self.cached: Dict[str, Dict[str, Any]] = {}
+        self.models = SimpleNamespace(generate_content=self._generate_content)
+        self.caches = SimpleNamespace(create=self._create, update=self._update)
+
+    @staticmethod
+    def _ttl(config: Any) -> float:
+        return float(str(config.ttl).rstrip("s"))
+
+    def _create(self, *, model: str, config: Any) -> Any:
+        tokens = count_tokens(config.system_instruction)
+        if tokens < self.min_cache_tokens:
+            raise RuntimeError(f"400 INVALID_ARGUMENT: cached content needs at least {self.min_cache_tokens} tokens")
+        name = f"cachedContents/fake-{len(self.cached) + 1}"
+        self.cached[name] = {"tokens": tokens, "expires": self.clock() + self._ttl(config)}
+        return SimpleNamespace(name=name)
+
+    def _update(self, *, name: str, config: Any) -> Any:
+        entry = self.cached.get(name)
+        if entry is None or entry["expires"] <= self.clock():
+            raise RuntimeError(f"404 NOT_FOUND: {name}")
+        entry["expires"] = self.clock() + self._ttl(config)
+        return SimpleNamespace(name=name)
+
+    def _generate_content(self, *, model: str, contents: str, config: Any) -> Any:
+        if config.cached_content and config.system_instruction:
+            raise RuntimeError("400 INVALID_ARGUMENT: cached_content y system_instruction son excluyentes")
+        cached_tokens = 0
+        if config.cached_content:
+            entry = self.cached.get(config.cached_content)
+            if entry is None or entry["expires"] <= self.clock():
+                raise RuntimeError(f"404 NOT_FOUND: {config.cached_content}")
+            cached_tokens = entry["tokens"]
+        prompt_tokens = count_tokens(contents) + count_tokens(config.system_instruction or "") + cached_tokens
+        usage = SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            cached_content_token_count=cached_tokens or None,
+            candidates_token_count=120,
+        )
+        return SimpleNamespace(text="Respuesta de prueba.", usage_metadata=usage)
+
+
+def _contexts(n: int, chars: int) -> List[Dict[str, Any]]:
+    body = ("La caléndula se usa tradicionalmente en cremas y tés para calmar la piel irritada. " * 40)[:chars]
+    return [
+        {
+            "metadata": {
+                "product_name": f"Producto {i}",
+                "section": "uso",
+                "text": body,
+                "source_pdf": f"ficha_{i}.pdf",
+                "source_pages": [i],
+            }
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def run(
+    mode: str,
+    *,
+    requests: int,
+    interval_sec: float,
+    contexts: List[Dict[str, Any]],
+    ttl_sec: float,
+    refresh_sec: float,
+    min_cache_tokens: int,
+    bot_name: str,
+) -> Dict[str, Any]:
+    clock = FakeClock()
+    fake = FakeGenAI(clock, min_cache_tokens=min_cache_tokens)
+    gemini = GeminiClient(
+        api_key="",
+        chat_model="fake-model",
+        embed_model="fake-embed",
+        embed_dim=8,
+        context_cache_ttl_sec=ttl_sec if mode == "cached" else 0.0,
+        context_cache_refresh_sec=refresh_sec,
+        client=fake,
+    )
+    if gemini.context_cache is not None:
+        gemini.context_cache.clock = clock
+
+    before = metrics.snapshot()
+    for i in range(requests):
+        q = QUESTIONS[i % len(QUESTIONS)]
+        if mode == "legacy":
+            gemini.generate(build_prompt(q, contexts, bot_name=bot_name))
+        else:
+            gemini.generate(build_user_prompt(q, contexts), system_instruction=system_instruction(bot_name))
+        clock.now += interval_sec
+    after = metrics.snapshot()
+
+    def delta_hist(name: str) -> Dict[str, float]:
+        h1 = after["histograms"].get(name, {"count": 0, "sum": 0.0})
+        h0 = before["histograms"].get(name, {"count": 0, "sum": 0.0})
+        return {"count": h1["count"] - h0["count"], "sum": h1["sum"] - h0["sum"]}
+
+    def delta_counter(name: str) -> float:
+        return after["counters"].get(name, 0) - before["counters"].get(name, 0)
+
+    prompt = delta_hist("gemini.prompt_tokens")
+    cached = delta_hist("gemini.cached_tokens")
+    return {
+        "mode": mode,
+        "prompt_tokens_mean": prompt["sum"] / max(1, prompt["count"]),
+        "cached_tokens_mean": cached["sum"] / max(1, prompt["count"]),
+        "creates": delta_counter("gemini.cache_creates"),
+        "refreshes": delta_counter("gemini.cache_refreshes"),
+        "errors": delta_counter("gemini.cache_errors"),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Prompt tokens por request contra un fake local de Gemini: prompt inline vs system_instruction vs caché"
+    )
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--interval-sec", type=float, default=30.0, help="Tiempo simulado entre requests")
+    parser.add_argument("--contexts", type=int, default=5, help="Chunks de evidencia por prompt (top_k)")
+    parser.add_argument("--context-chars", type=int, default=900)
+    parser.add_argument("--ttl-sec", type=float, default=3600, help="GEMINI_CONTEXT_CACHE_TTL_SEC")
+    parser.add_argument("--refresh-sec", type=float, default=300, help="GEMINI_CONTEXT_CACHE_REFRESH_SEC")
+    parser.add_argument(
+        "--min-cache-tokens", type=int, default=0, help="Mínimo de tokens del caché explícito (depende del modelo)"
+    )
+    parser.add_argument("--bot-name", default="NatuBot")
+    args = parser.parse_args()
+
+    contexts = _contexts(args.contexts, args.context_chars)
+    preamble = count_tokens(system_instruction(args.bot_name))
+    print(
+        f"{args.requests} requests cada {args.interval_sec:.0f}s simulados | preámbulo ≈{preamble} tokens | "
+        f"{args.contexts} chunks x {args.context_chars} chars"
+    )
+    print(f"{'modo':<20}{'prompt tok':>12}{'en caché':>10}{'sin caché':>11}{'creates':>9}{'refresh':>9}{'errores':>9}")
+    for mode in ("legacy", "system_instruction", "cached"):
+        r = run(
+            mode,
+            requests=args.requests,
+            interval_sec=args.interval_sec,
+            contexts=contexts,
+            ttl_sec=args.ttl_sec,
+            refresh_sec=args.refresh_sec,
+            min_cache_tokens=args.min_cache_tokens,
+            bot_name=args.bot_name,
+        )
+        uncached = r["prompt_tokens_mean"] - r["cached_tokens_mean"]
+        print(
+            f"{mode:<20}{r['prompt_tokens_mean']:>12.0f}{r['cached_tokens_mean']:>10.0f}{uncached:>11.0f}"
+            f"{r['creates']:>9.0f}{r['refreshes']:>9.0f}{r['errors']:>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
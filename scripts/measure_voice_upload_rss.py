@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import json
+import resource
+import subprocess
+import sys
+from pathlib import Path
+from typing import Iterator
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from starlette.requests import Request  # noqa: E402
+
+from app.speech.upload import UploadTooLarge, read_voice_upload  # noqa: E402
+
+CHUNK_RAW = 48 * 1024  # múltiplo de 3: cada bloque codifica a base64 sin padding intermedio
+
+
+def _json_body(audio_bytes: int) -> Iterator[bytes]:
+    """Body JSON con audio_base64 generado al vuelo (el proceso nunca tiene el body completo)."""
+    yield b'{"filename":"turn.pcm","content_type":"audio/pcm;rate=16000;channels=1","audio_base64":"'
+    block = bytes(range(256)) * (CHUNK_RAW // 256)
+    sent = 0
+    while sent < audio_bytes:
+        n = min(CHUNK_RAW, audio_bytes - sent)
+        yield base64.b64encode(block[:n])
+        sent += n
+    yield b'","include_audio":true}'
+
+
+def _body_size(audio_bytes: int) -> int:
+    return sum(len(c) for c in _json_body(audio_bytes))
+
+
+def _request(audio_bytes: int, *, send_length: bool) -> Request:
+    chunks = _json_body(audio_bytes)
+    headers = [(b"content-type", b"application/json")]
+    if send_length:
+        headers.append((b"content-length", str(_body_size(audio_bytes)).encode()))
+
+    async def receive():
+        chunk = next(chunks, None)
+        if chunk is None:
+            return {"type": "http.request", "body": b"", "more_body": False}
+        return {"type": "http.request", "body": chunk, "more_body": True}
+
+    scope = {"type": "http", "method": "POST", "path": "/api/voice/turn", "headers": headers, "query_string": b""}
+    return Request(scope, receive)
+
+
+async def _legacy(request: Request) -> int:
+    # Comportamiento anterior: body completo + string base64 + copia decodificada.
+    body = await request.body()
+    payload = json.loads(body)
+    return len(base64.b64decode(payload["audio_base64"]))
+
+
+async def _streaming(request: Request, max_audio_bytes: int, spool_bytes: int) -> int:
+    upload = await read_voice_upload(request, max_audio_bytes=max_audio_bytes, spool_bytes=spool_bytes)
+    return len(upload.audio)
+
+
+def _maxrss_mb() -> float:
+    # Linux: KB; macOS: bytes
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _worker(args: argparse.Namespace) -> None:
+    request = _request(args.audio_bytes, send_length=not args.no_content_length)
+    base = _maxrss_mb()
+    outcome = "ok"
+    try:
+        if args.mode == "legacy":
+            n = asyncio.run(_legacy(request))
+        else:
+            n = asyncio.run(_streaming(request, args.max_audio_bytes, args.spool_bytes))
+        outcome = f"ok ({n / 1e6:.1f} MB audio)"
+    except UploadTooLarge:
+        outcome = "413"
+    print(json.dumps({"peak_delta_mb": _maxrss_mb() - base, "outcome": outcome}))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pico de RSS por request de /api/voice/turn (JSON base64): legacy vs streaming")
+    parser.add_argument("--max-audio-bytes", type=int, default=4_000_000, help="VOICE_MAX_UPLOAD_BYTES")
+    parser.add_argument("--spool-bytes", type=int, default=1_000_000, help="VOICE_UPLOAD_SPOOL_BYTES")
+    parser.add_argument("--attack-mb", type=float, default=100.0, help="Tamaño del upload abusivo a simular")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", choices=["legacy", "streaming"], help=argparse.SUPPRESS)
+    parser.add_argument("--audio-bytes", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--no-content-length", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker(args)
+        return
+
+    # 20 s de PCM 16k mono = 640 KB; el tope por bytes deja margen para WAV 48k estéreo.
+    cases = [
+        ("turno 20s pcm16k", 16000 * 2 * 20, False),
+        ("cerca del tope", int(args.max_audio_bytes * 0.95), False),
+        ("abuso con Content-Length", int(args.attack_mb * 1e6), False),
+        ("abuso chunked", int(args.attack_mb * 1e6), True),
+    ]
+    print(f"tope audio {args.max_audio_bytes / 1e6:.1f} MB | spool a disco sobre {args.spool_bytes / 1e6:.1f} MB")
+    print(f"{'caso':<28}{'modo':<11}{'pico RSS':>11}  resultado")
+    for label, audio_bytes, chunked in cases:
+        for mode in ("legacy", "streaming"):
+            cmd = [
+                sys.executable, __file__, "--worker", "--mode", mode, "--audio-bytes", str(audio_bytes),
+                "--max-audio-bytes", str(args.max_audio_bytes), "--spool-bytes", str(args.spool_bytes),
+            ]
+            if chunked:
+                cmd.append("--no-content-length")
+            out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+            row = json.loads(out.strip().splitlines()[-1])
+            print(f"{label:<28}{mode:<11}{row['peak_delta_mb']:>8.1f} MB  {row['outcome']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import argparse
+import json
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def _smaps(pid: int) -> Dict[str, int]:
+    """kB por campo de /proc/<pid>/smaps_rollup (PSS reparte cada página compartida entre quienes la usan)."""
+    out = {k: 0 for k in _FIELDS}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+        key, _, rest = line.partition(":")
+        if key in out:
+            out[key] = int(rest.split()[0])
+    return out
+
+
+def _children(pid: int) -> List[int]:
+    kids = []
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        # El nombre del comando va entre paréntesis y puede tener espacios.
+        if int(stat.rsplit(")", 1)[1].split()[1]) == pid:
+            kids.append(int(entry.name))
+    return sorted(kids)
+
+
+def _wait_ready(proc: subprocess.Popen, url: str, workers: int, timeout: float, settle: float) -> List[int]:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"El servidor terminó con código {proc.returncode}")
+        kids = _children(proc.pid)
+        try:
+            with urllib.request.urlopen(url, timeout=2) as resp:
+                up = resp.status == 200
+        except Exception:
+            up = False
+        if up and len(kids) >= workers:
+            break
+        time.sleep(0.5)
+    else:
+        raise RuntimeError(f"El servidor no respondió en {timeout:.0f}s")
+    # Los workers terminan de importar app.main después de que el primero ya responde.
+    time.sleep(settle)
+    return _children(proc.pid)
+
+
+def _measure(workers: int, preload: bool, args: argparse.Namespace) -> Dict[str, object]:
+    cmd = [sys.executable, "-m", "app.serve", "--host", "127.0.0.1", "--port", str(args.port),
+           "--workers", str(workers), "--log-level", "warning"]
+    if not preload:
+        cmd.append("--no-preload")
+    proc = subprocess.Popen(cmd, cwd=str(PROJECT_ROOT))
+    try:
+        kids = _wait_ready(proc, f"http://127.0.0.1:{args.port}/", workers, args.timeout, args.settle)
+        master = _smaps(proc.pid)
+        per_worker = [_smaps(pid) for pid in kids]
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    def mean(key: str) -> float:
+        return sum(w[key] for w in per_worker) / len(per_worker) / 1024 if per_worker else 0.0
+
+    return {
+        "mode": "preload" if preload else "sin precarga",
+        "workers": len(per_worker),
+        "master_rss_mb": master["Rss"] / 1024,
+        "master_pss_mb": master["Pss"] / 1024,
+        "worker_rss_mb": mean("Rss"),
+        "worker_pss_mb": mean("Pss"),
+        "worker_shared_mb": mean("Shared_Clean") + mean("Shared_Dirty"),
+        "worker_private_mb": mean("Private_Clean") + mean("Private_Dirty"),
+        # Memoria real del servidor completo: la suma de PSS no cuenta dos veces lo compartido.
+        "total_pss_mb": (master["Pss"] + sum(w["Pss"] for w in per_worker)) / 1024,
+        "workers_detail": per_worker,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="RSS/PSS por worker de app.serve con y sin precarga de modelos (Linux, /proc/<pid>/smaps_rollup)"
+    )
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--skip-no-preload", action="store_true", help="Solo mide el modo con precarga")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Espera máxima al arranque (carga de modelos)")
+    parser.add_argument("--settle", type=float, default=10.0, help="Segundos tras el arranque antes de medir")
+    parser.add_argument("--json", default=None, help="Guarda los resultados en JSON")
+    args = parser.parse_args()
+
+    if not Path("/proc/self/smaps_rollup").exists():
+        raise SystemExit("Se necesita Linux con /proc/<pid>/smaps_rollup (kernel >= 4.14).")
+
+    modes = [True] if args.skip_no_preload else [True, False]
+    results = [_measure(n, preload, args) for n in args.workers for preload in modes]
+
+    print(f"{'modo':<14}{'workers':>8}{'maestro PSS':>13}{'RSS/worker':>12}{'PSS/worker':>12}"
+          f"{'compart.':>10}{'privado':>10}{'PSS total':>11}")
+    for r in results:
+        print(
+            f"{r['mode']:<14}{r['workers']:>8}{r['master_pss_mb']:>11.0f}MB{r['worker_rss_mb']:>10.0f}MB"
+            f"{r['worker_pss_mb']:>10.0f}MB{r['worker_shared_mb']:>8.0f}MB{r['worker_private_mb']:>8.0f}MB"
+            f"{r['total_pss_mb']:>9.0f}MB"
+        )
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from natubot_core.near_dedup import NearDupConfig, collapse_near_duplicates, savings_report  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Detecta chunks casi duplicados (MinHash/LSH) en el JSONL de ingesta y reporta el ahorro"
+    )
+    parser.add_argument("chunks_jsonl", help="rag_contract_v1.jsonl ({id, text, metadata} por línea)")
+    parser.add_argument("--threshold", type=float, default=0.9, help="Jaccard estimado mínimo para agrupar")
+    parser.add_argument("--num-perm", type=int, default=128)
+    parser.add_argument("--bands", type=int, default=16)
+    parser.add_argument("--shingle-words", type=int, default=3)
+    parser.add_argument("--allow-number-mismatch", action="store_true", help="Agrupa aunque difieran los números")
+    parser.add_argument("--embed-dim", type=int, default=768)
+    parser.add_argument("--embed-batch-size", type=int, default=32, help="EMBED_BATCH_SIZE del notebook")
+    parser.add_argument("--out", default=None, help="Escribe el JSONL deduplicado (para indexar)")
+    parser.add_argument("--json", default=None, help="Guarda el reporte completo en JSON")
+    parser.add_argument("--show", type=int, default=10, help="Clusters a listar")
+    args = parser.parse_args()
+
+    rows = [json.loads(line) for line in Path(args.chunks_jsonl).read_text(encoding="utf-8").splitlines() if line.strip()]
+    config = NearDupConfig(
+        threshold=args.threshold,
+        num_perm=args.num_perm,
+        bands=args.bands,
+        shingle_words=args.shingle_words,
+        same_numbers=not args.allow_number_mismatch,
+    )
+    kept, clusters = collapse_near_duplicates(rows, config)
+    report = savings_report(
+        rows, kept, clusters, embed_dim=args.embed_dim, embed_batch_size=args.embed_batch_size, config=config
+    )
+
+    print(f"Chunks: {report['chunks_before']} → {report['chunks_after']} ({report['absorbed']} absorbidos en {report['clusters']} clusters)")
+    print(
+        f"Embeddings: {report['embed_texts_saved']} textos menos, llamadas {report['embed_calls_before']} → "
+        f"{report['embed_calls_after']}, {report['embed_chars_saved']} caracteres menos"
+    )
+    print(
+        f"Índice: {report['index_bytes_before'] / 1e6:.2f} MB → {report['index_bytes_after'] / 1e6:.2f} MB "
+        f"({100 * report['index_saved_ratio']:.1f}% menos)"
+    )
+    for c in clusters[: args.show]:
+        print(f"- {c['size']}x ({c['products']} productos, sim ≥ {c['min_similarity']}) {c['representative']}: {c['text'][:90]!r}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            for c in kept:
+                f.write(json.dumps(c, ensure_ascii=False) + "\n")
+        print(f"JSONL deduplicado: {args.out}")
+    if args.json:
+        Path(args.json).write_text(json.dumps({**report, "top_clusters": clusters}, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
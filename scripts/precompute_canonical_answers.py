@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import sys
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from natubot_core.canonical import CanonicalStore, intents_sha, load_intents  # noqa: E402
+from natubot_core.chunk_store import ChunkStore  # noqa: E402
+from natubot_core.decompose import Facet  # noqa: E402
+from natubot_core.gemini_client import GeminiClient  # noqa: E402
+from natubot_core.pinecone_client import PineconeClients  # noqa: E402
+from natubot_core.prompts import split_voice_answer  # noqa: E402
+from natubot_core.rag import answer_with_rag  # noqa: E402
+from natubot_core.settings import get_settings  # noqa: E402
+
+
+def _resolve(path: str) -> Path:
+    p = Path(path)
+    return p if p.is_absolute() else PROJECT_ROOT / p
+
+
+def collect_products(pinecone: PineconeClients, namespace: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Agrupa los chunks del índice por producto: nombre, firma de contenido y data_version. Un
+    representante de casi-duplicados (ver near_dedup) cuenta para cada id de `product_ids`.
+    """
+    ids = list(pinecone.list_ids(namespace=namespace))
+    print(f"Vectores en namespace '{namespace}': {len(ids)}")
+    metadata = pinecone.fetch_metadata(namespace=namespace, ids=ids)
+
+    chunks: Dict[str, List[str]] = defaultdict(list)
+    names: Dict[str, str] = {}
+    versions: Dict[str, Counter] = defaultdict(Counter)
+    fallback_names: Dict[str, str] = {}
+    for vid, md in metadata.items():
+        primary = str(md.get("product_id") or "").strip()
+        if primary:
+            names.setdefault(primary, str(md.get("product_name") or primary))
+        extra_ids = [str(p).strip() for p in md.get("product_ids") or []]
+        extra_names = [str(n) for n in md.get("product_names") or []]
+        if len(extra_ids) == len(extra_names):
+            for p, n in zip(extra_ids, extra_names):
+                fallback_names.setdefault(p, n)
+        for pid in dict.fromkeys([primary, *extra_ids]):
+            if not pid or pid == "unknown_product":
+                continue
+            chunks[pid].append(f"{vid}:{md.get('content_hash', '')}")
+            versions[pid][str(md.get("data_version") or "")] += 1
+
+    products: Dict[str, Dict[str, Any]] = {}
+    for pid, refs in chunks.items():
+        # La firma cambia si se agrega, quita o edita cualquier chunk del producto.
+        signature = hashlib.sha256("\n".join(sorted(refs)).encode("utf-8")).hexdigest()
+        products[pid] = {
+            # Un producto absorbido entero por otro no tiene chunk propio: nombre desde `product_names`.
+            "product_name": names.get(pid) or fallback_names.get(pid) or pid,
+            "signature": signature,
+            "data_version": versions[pid].most_common(1)[0][0],
+        }
+    return products
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Precalcula respuestas canónicas (texto, resumen hablado y audio) por producto")
+    parser.add_argument("--store", default=None, help="Ruta del SQLite (default: CANONICAL_STORE_PATH)")
+    parser.add_argument("--intents", default=None, help="JSON de intenciones (default: CANONICAL_INTENTS_FILE)")
+    parser.add_argument("--product", action="append", default=[], help="Limitar a estos product_id (repetible)")
+    parser.add_argument("--no-audio", action="store_true", help="No sintetizar audio con Silero")
+    parser.add_argument("--force", action="store_true", help="Regenerar aunque la respuesta esté al día")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    store = CanonicalStore(_resolve(args.store or settings.canonical_store_path))
+    intents_path = args.intents or settings.canonical_intents_file
+    intents = load_intents(_resolve(intents_path) if intents_path else None)
+
+    gemini = GeminiClient(
+        api_key=settings.gemini_api_key,
+        chat_model=settings.gemini_chat_model,
+        embed_model=settings.gemini_embed_model,
+        embed_dim=settings.embed_dim,
+    )
+    pinecone = PineconeClients(
+        api_key=settings.pinecone_api_key,
+        index_name=settings.pinecone_index_name,
+        index_host=settings.pinecone_index_host,
+    )
+
+    chunk_store_path = _resolve(settings.chunk_store_path)
+    chunk_store = ChunkStore(chunk_store_path) if settings.chunk_store_enabled and chunk_store_path.exists() else None
+
+    tts = None
+    if not args.no_audio:
+        from app.speech.tts_silero import SileroTTS
+
+        tts = SileroTTS(
+            language=settings.silero_language,
+            speaker=settings.silero_speaker,
+            sample_rate=settings.audio_sample_rate,
+            chunk_chars=settings.tts_chunk_chars,
+        )
+
+    products = collect_products(pinecone, settings.pinecone_namespace)
+    selected = {pid: p for pid, p in products.items() if not args.product or pid in args.product}
+    print(f"Productos: {len(products)} (procesando {len(selected)}) | intenciones: {', '.join(intents)}")
+
+    generated = skipped = failed = 0
+    for pid, product in sorted(selected.items()):
+        for intent, spec in intents.items():
+            template_sha = intents_sha(spec)
+            if not args.force and store.is_fresh(
+                pid,
+                intent,
+                product_signature=product["signature"],
+                template_sha=template_sha,
+                data_version=product["data_version"],
+                need_audio=tts is not None,
+            ):
+                skipped += 1
+                continue
+
+            question = spec["question"].format(product=product["product_name"])
+            result = answer_with_rag(
+                question=question,
+                gemini=gemini,
+                pinecone=pinecone,
+                namespace=settings.pinecone_namespace,
+                top_k=settings.default_top_k,
+                bot_name=settings.bot_name,
+                pinecone_filter=Facet("product", pid, product["product_name"]).pinecone_filter(),
+                chunk_store=chunk_store,
+            )
+            if result.get("degraded") or not result.get("used_context") or not result["answer"]:
+                failed += 1
+                print(f"  [skip] {pid} / {intent}: sin contexto o respuesta degradada")
+                continue
+
+            # Los turnos de voz escuchan un resumen corto, no el markdown completo de pantalla.
+            spoken, _ = split_voice_answer(result["answer"], settings.voice_spoken_max_words)
+            audio = spoken_audio = None
+            if tts is not None:
+                try:
+                    audio = tts.synthesize(result["answer"])
+                    spoken_audio = tts.synthesize(spoken)
+                except Exception as e:
+                    print(f"  [warn] {pid} / {intent}: TTS falló ({e}); se guarda solo texto")
+
+            store.upsert(
+                product_id=pid,
+                intent=intent,
+                product_name=product["product_name"],
+                question=question,
+                answer=result["answer"],
+                citations=result["citations"],
+                product_signature=product["signature"],
+                template_sha=template_sha,
+                data_version=product["data_version"],
+                audio_wav=audio,
+                spoken=spoken,
+                spoken_wav=spoken_audio,
+            )
+            generated += 1
+            print(f"  [ok] {pid} / {intent}")
+
+    # Solo se podan productos retirados cuando se recorrió el catálogo completo.
+    removed = store.prune(products.keys(), intents.keys()) if not args.product else 0
+    versions = Counter(p["data_version"] for p in products.values())
+    if versions:
+        store.set_meta("data_version", versions.most_common(1)[0][0])
+
+    print(f"Listo: {generated} generadas, {skipped} al día, {failed} sin generar, {removed} eliminadas.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import json
+import logging
+import statistics
+import sys
+import time
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.speech.audio_utils import RAW_PCM_MIME  # noqa: E402
+from app.speech.pipeline import build_voice_pipeline  # noqa: E402
+from natubot_core.metrics import metrics  # noqa: E402
+from natubot_core.settings import Settings  # noqa: E402
+
+AUDIO_SUFFIXES = {".wav", ".webm", ".ogg", ".mp3", ".m4a", ".pcm"}
+STAGES = ("decode", "vad", "stt", "tts")
+
+# Respuesta fija del chat stub: el TTS sintetiza lo mismo en ambas configuraciones.
+DEFAULT_REPLY = (
+    "La caléndula se usa tradicionalmente para calmar la piel irritada. "
+    "Aplica una capa delgada dos o tres veces al día sobre la zona limpia. "
+    "Si estás embarazada o tomas medicamentos, consulta antes con un profesional de la salud."
+)
+
+
+@dataclass
+class Utterance:
+    audio: Path
+    reference: str
+    content_type: Optional[str] = None
+
+
+def load_corpus(root: Path) -> List[Utterance]:
+    """
+    `manifest.jsonl` con {"audio": "ruta relativa", "text": "referencia", "content_type": opcional}
+    o, si no existe, cada audio con un `.txt` hermano que contiene la transcripción de referencia.
+    """
+    manifest = root / "manifest.jsonl"
+    items: List[Utterance] = []
+    if manifest.exists():
+        for line in manifest.read_text(encoding="utf-8").splitlines():
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            items.append(Utterance(root / row["audio"], str(row.get("text") or ""), row.get("content_type")))
+        return items
+
+    for audio in sorted(p for p in root.rglob("*") if p.suffix.lower() in AUDIO_SUFFIXES):
+        ref = audio.with_suffix(".txt")
+        if not ref.exists():
+            continue
+        ctype = f"{RAW_PCM_MIME};rate=16000;channels=1" if audio.suffix.lower() == ".pcm" else None
+        items.append(Utterance(audio, ref.read_text(encoding="utf-8").strip(), ctype))
+    return items
+
+
+def _normalize_words(text: str) -> List[str]:
+    # Vosk entrega minúsculas sin puntuación; se comparan palabras sin tildes ni signos.
+    t = unicodedata.normalize("NFKD", text.lower())
+    t = "".join(c for c in t if not unicodedata.combining(c))
+    t = "".join(c if c.isalnum() else " " for c in t)
+    return t.split()
+
+
+def word_edits(reference: str, hypothesis: str) -> tuple:
+    """(ediciones, palabras de referencia) con distancia de Levenshtein por palabra."""
+    ref = _normalize_words(reference)
+    hyp = _normalize_words(hypothesis)
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1], len(ref)
+
+
+def parse_overrides(pairs: Sequence[str], base: Settings) -> Dict[str, Any]:
+    """KEY=VALUE con los nombres del .env (VAD_AGGRESSIVENESS=3) o del campo (vad_aggressiveness=3)."""
+    fields = {f.name for f in dataclasses.fields(Settings)}
+    out: Dict[str, Any] = {}
+    for pair in pairs:
+        key, sep, raw = pair.partition("=")
+        name = key.strip().lower()
+        if not sep or name not in fields:
+            raise SystemExit(f"Override inválido: {pair}")
+        current = getattr(base, name)
+        if isinstance(current, bool):
+            value: Any = raw.strip().lower() in {"1", "true", "yes", "y", "on"}
+        elif isinstance(current, (int, float)):
+            value = type(current)(raw)
+        else:
+            value = raw
+        out[name] = value
+    return out
+
+
+def _dist(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "mean": 0.0}
+    v = sorted(values)
+    return {
+        "p50": v[len(v) // 2],
+        "p95": v[min(len(v) - 1, int(0.95 * len(v)))],
+        "mean": statistics.mean(v),
+    }
+
+
+def run_config(
+    label: str,
+    settings: Settings,
+    corpus: List[Utterance],
+    *,
+    include_audio: bool,
+    reply_text: str,
+    warmup: int,
+) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    pipeline = build_voice_pipeline(settings)
+    load_ms = (time.perf_counter() - t0) * 1000.0
+    pipeline.stt_router.status()  # falla temprano si no hay modelo Vosk
+
+    logger = logging.getLogger(f"natubot.replay.{label}")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    def chat_stub(text: str, session_id: Optional[str] = None, answer_profile: str = "voice") -> str:
+        return reply_text
+
+    def turn(u: Utterance):
+        return pipeline.run_turn(
+            audio_bytes=u.audio.read_bytes(),
+            source_name=u.audio.name,
+            content_type=u.content_type,
+            include_audio=include_audio,
+            chat_callable=chat_stub,
+            logger=logger,
+        )
+
+    for u in corpus[:warmup]:
+        turn(u)
+
+    counters_before = metrics.snapshot()["counters"]
+
+    stage_ms: Dict[str, List[float]] = {s: [] for s in STAGES}
+    rtf: List[float] = []
+    tts_rtf: List[float] = []
+    trimmed: List[float] = []
+    edits = ref_words = 0
+    rows = []
+    for u in corpus:
+        r = turn(u)
+        e, n = word_edits(u.reference, r.stt_text)
+        edits += e
+        ref_words += n
+        stage_ms["decode"].append(r.decode_latency_ms)
+        stage_ms["vad"].append(r.vad_latency_ms)
+        stage_ms["stt"].append(r.stt_latency_ms)
+        if include_audio:
+            stage_ms["tts"].append(r.tts_latency_ms)
+            if r.audio_wav:
+                out_ms = max(1.0, (len(r.audio_wav) - 44) / (settings.audio_sample_rate * 2 / 1000.0))
+                tts_rtf.append(r.tts_latency_ms / out_ms)
+        if r.input_audio_ms:
+            rtf.append((r.decode_latency_ms + r.vad_latency_ms + r.stt_latency_ms) / r.input_audio_ms)
+            trimmed.append(r.speech_audio_ms / r.input_audio_ms)
+        rows.append({"audio": str(u.audio), "reference": u.reference, "hypothesis": r.stt_text, "wer": e / n if n else 0.0})
+    counters = metrics.snapshot()["counters"]
+
+    return {
+        "label": label,
+        "model_load_ms": load_ms,
+        "stages_ms": {s: _dist(v) for s, v in stage_ms.items() if v},
+        "rtf": _dist(rtf),
+        "tts_rtf": _dist(tts_rtf),
+        "trimmed_ratio": _dist(trimmed),
+        "wer": edits / ref_words if ref_words else 0.0,
+        # Turnos resueltos con la gramática del catálogo vs. repetidos con vocabulario abierto.
+        "grammar": {
+            k: counters.get(f"stt.grammar_{k}", 0) - counters_before.get(f"stt.grammar_{k}", 0)
+            for k in ("hits", "fallbacks")
+        },
+        "utterances": rows,
+    }
+
+
+def _print_side_by_side(results: List[Dict[str, Any]]) -> None:
+    labels = [r["label"] for r in results]
+    print(f"{'métrica':<24}" + "".join(f"{lbl:>20}" for lbl in labels))
+
+    def line(name: str, values: List[str]) -> None:
+        print(f"{name:<24}" + "".join(f"{v:>20}" for v in values))
+
+    line("WER", [f"{100 * r['wer']:.1f}%" for r in results])
+    line("carga modelos (ms)", [f"{r['model_load_ms']:.0f}" for r in results])
+    for stage in STAGES:
+        if not all(stage in r["stages_ms"] for r in results):
+            continue
+        for k in ("p50", "p95"):
+            line(f"{stage} {k} (ms)", [f"{r['stages_ms'][stage][k]:.0f}" for r in results])
+    line("RTF decode+vad+stt p50", [f"{r['rtf']['p50']:.3f}" for r in results])
+    line("RTF decode+vad+stt p95", [f"{r['rtf']['p95']:.3f}" for r in results])
+    if all(r["tts_rtf"]["mean"] for r in results):
+        line("RTF tts p50", [f"{r['tts_rtf']['p50']:.3f}" for r in results])
+    line("audio tras VAD (media)", [f"{100 * r['trimmed_ratio']['mean']:.0f}%" for r in results])
+    if any(sum(r["grammar"].values()) for r in results):
+        line("gramática ok/fallback", [f"{r['grammar']['hits']:.0f}/{r['grammar']['fallbacks']:.0f}" for r in results])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Replay de turnos de voz grabados: latencia por etapa, RTF, WER y recorte VAD (offline, A vs B)"
+    )
+    parser.add_argument("corpus", help="Carpeta con manifest.jsonl o pares audio + .txt")
+    parser.add_argument("--a", nargs="*", default=[], metavar="KEY=VALUE", help="Overrides de la configuración A")
+    parser.add_argument("--b", nargs="*", default=None, metavar="KEY=VALUE", help="Overrides de la configuración B")
+    parser.add_argument("--no-tts", action="store_true", help="No sintetizar la respuesta (solo decode/VAD/STT)")
+    parser.add_argument("--reply-text", default=DEFAULT_REPLY, help="Texto fijo que devuelve el chat stub")
+    parser.add_argument("--warmup", type=int, default=1, help="Turnos de calentamiento por configuración")
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--json", default=None, help="Guarda el reporte completo (incluye cada utterance)")
+    parser.add_argument("--details", action="store_true", help="Muestra las utterances cuyo WER cambia entre A y B")
+    args = parser.parse_args()
+
+    corpus = load_corpus(Path(args.corpus))
+    if args.limit:
+        corpus = corpus[: args.limit]
+    if not corpus:
+        raise SystemExit(f"Sin utterances con referencia en {args.corpus}")
+
+    # Offline: solo Vosk local, sin Azure como fallback.
+    base = dataclasses.replace(Settings(), stt_mode="local", azure_speech_key="", azure_speech_region="")
+    configs = [("A", dataclasses.replace(base, **parse_overrides(args.a, base)))]
+    if args.b is not None:
+        configs.append(("B", dataclasses.replace(base, **parse_overrides(args.b, base))))
+
+    print(f"{len(corpus)} utterances | A: {' '.join(args.a) or '(base)'}" + (f" | B: {' '.join(args.b) or '(base)'}" if args.b is not None else ""))
+    results = [
+        run_config(
+            label, cfg, corpus, include_audio=not args.no_tts, reply_text=args.reply_text, warmup=args.warmup
+        )
+        for label, cfg in configs
+    ]
+    _print_side_by_side(results)
+
+    if args.details and len(results) == 2:
+        print("\nutterances con WER distinto (A → B):")
+        for ra, rb in zip(results[0]["utterances"], results[1]["utterances"]):
+            if abs(ra["wer"] - rb["wer"]) > 1e-9:
+                print(f"- {Path(ra['audio']).name}: {100 * ra['wer']:.0f}% → {100 * rb['wer']:.0f}%")
+                print(f"    ref: {ra['reference']}\n    A:   {ra['hypothesis']}\n    B:   {rb['hypothesis']}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\nReporte: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import sqlite3
+
+from natubot_core.canonical import CanonicalStore
+
+
+def _upsert(store: CanonicalStore, **kw) -> None:
+    args = dict(
+        product_id="omega3", intent="que_es", product_name="Omega 3", question="¿Qué es Omega 3?",
+        answer="**Omega 3** es un aceite [1].", citations=[], product_signature="sig",
+        template_sha="tpl", data_version="v1",
+    )
+    args.update(kw)
+    store.upsert(**args)
+
+
+def test_spoken_variant_has_its_own_audio(tmp_path):
+    store = CanonicalStore(tmp_path / "canonical.sqlite")
+    _upsert(store, audio_wav=b"full", spoken="Omega 3 es un aceite.", spoken_wav=b"short")
+    [answer] = store.load_answers()
+    assert answer.spoken == "Omega 3 es un aceite."
+    assert answer.has_audio and answer.has_spoken_audio
+    assert store.audio_for(answer.answer_sha) == b"full"
+    assert store.spoken_audio_for(answer.answer_sha) == b"short"
+
+
+def test_answer_without_spoken_variant_is_stale(tmp_path):
+    store = CanonicalStore(tmp_path / "canonical.sqlite")
+    fresh = dict(product_signature="sig", template_sha="tpl", data_version="v1", need_audio=False)
+    _upsert(store)
+    assert not store.is_fresh("omega3", "que_es", **fresh)
+    _upsert(store, spoken="Omega 3 es un aceite.")
+    assert store.is_fresh("omega3", "que_es", **fresh)
+    assert not store.is_fresh("omega3", "que_es", **dict(fresh, need_audio=True))
+
+
+def test_old_store_gets_spoken_columns(tmp_path):
+    path = tmp_path / "canonical.sqlite"
+    with sqlite3.connect(str(path)) as conn:
+        conn.execute(
+            "CREATE TABLE answers (product_id TEXT NOT NULL, intent TEXT NOT NULL, product_name TEXT NOT NULL, "
+            "question TEXT NOT NULL, answer TEXT NOT NULL, citations_json TEXT NOT NULL, answer_sha TEXT NOT NULL, "
+            "product_signature TEXT NOT NULL, template_sha TEXT NOT NULL, data_version TEXT NOT NULL, "
+            "audio_wav BLOB, created_at REAL NOT NULL, PRIMARY KEY (product_id, intent))"
+        )
+    store = CanonicalStore(path)
+    _upsert(store, spoken="Omega 3 es un aceite.")
+    assert store.load_answers()[0].spoken == "Omega 3 es un aceite."
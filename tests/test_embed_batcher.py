@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+
+from natubot_core.embed_batcher import EmbedBatcher
+
+
+class Recorder:
+    def __init__(self, fail: bool = False, drop: bool = False) -> None:
+        self.calls = []
+        self.fail = fail
+        self.drop = drop
+
+    def __call__(self, texts, timeout):
+        self.calls.append((list(texts), timeout))
+        if self.fail:
+            raise RuntimeError("upstream caído")
+        vectors = [[float(t)] for t in texts]
+        return vectors[:-1] if self.drop else vectors
+
+
+def _embed_concurrently(batcher: EmbedBatcher, texts):
+    results, errors = {}, {}
+
+    def run(t: str) -> None:
+        try:
+            results[t] = batcher.embed(t, timeout=5.0)
+        except Exception as e:
+            errors[t] = e
+
+    threads = [threading.Thread(target=run, args=(t,)) for t in texts]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join(5.0)
+    return results, errors
+
+
+def test_low_concurrency_goes_direct():
+    embed_many = Recorder()
+    batcher = EmbedBatcher(embed_many, min_concurrency=4)
+    assert batcher.embed("7", timeout=2.0) == [7.0]
+    assert embed_many.calls == [(["7"], 2.0)]
+
+
+def test_concurrent_calls_share_one_request():
+    embed_many = Recorder()
+    # Espera larga: el lote solo se envía al llenarse.
+    batcher = EmbedBatcher(embed_many, max_batch=3, max_wait_ms=5000, min_concurrency=1)
+    results, errors = _embed_concurrently(batcher, ["1", "2", "3"])
+    assert not errors
+    assert results == {"1": [1.0], "2": [2.0], "3": [3.0]}
+    assert len(embed_many.calls) == 1
+    assert sorted(embed_many.calls[0][0]) == ["1", "2", "3"]
+
+
+def test_batch_timeout_is_the_tightest_deadline():
+    embed_many = Recorder()
+    batcher = EmbedBatcher(embed_many, max_batch=1, min_concurrency=1, clock=lambda: 100.0)
+    batcher.embed("4", timeout=2.0)
+    assert embed_many.calls == [(["4"], 2.0)]
+
+
+def test_batch_error_reaches_every_caller():
+    batcher = EmbedBatcher(Recorder(fail=True), max_batch=2, max_wait_ms=5000, min_concurrency=1)
+    results, errors = _embed_concurrently(batcher, ["1", "2"])
+    assert not results
+    assert set(errors) == {"1", "2"}
+    assert all(isinstance(e, RuntimeError) for e in errors.values())
+
+
+def test_short_response_is_an_error():
+    batcher = EmbedBatcher(Recorder(drop=True), max_batch=1, min_concurrency=1)
+    with pytest.raises(RuntimeError):
+        batcher.embed("1")
@@ -0,0 +1,47 @@
+from natubot_core.health import DependencyProber
+
+
+def _failing():
+    raise RuntimeError("sin conexión")
+
+
+def test_unprobed_critical_dependency_reports_starting_not_down():
+    prober = DependencyProber()
+    prober.register("pinecone", lambda: {})
+    prober.register("stt", lambda: {}, critical=False)
+
+    snap = prober.snapshot()
+
+    assert snap["ok"] is True
+    assert snap["starting"] is True
+    assert snap["checks"]["pinecone"]["status"] == "starting"
+    assert snap["checks"]["stt"]["status"] == "starting"
+
+
+def test_snapshot_after_first_run():
+    prober = DependencyProber()
+    prober.register("pinecone", lambda: {"total_vector_count": 3})
+    prober.register("gemini", _failing)
+    prober.register("stt", _failing, critical=False)
+
+    prober.run_once()
+    snap = prober.snapshot()
+
+    assert snap["starting"] is False
+    assert snap["ok"] is False
+    assert snap["checks"]["pinecone"]["status"] == "up"
+    assert snap["checks"]["pinecone"]["detail"] == {"total_vector_count": 3}
+    assert snap["checks"]["gemini"]["status"] == "down"
+    assert snap["checks"]["gemini"]["error"] == "sin conexión"
+
+
+def test_non_critical_failure_keeps_ok():
+    prober = DependencyProber()
+    prober.register("pinecone", lambda: {})
+    prober.register("tts", _failing, critical=False)
+
+    prober.run_once()
+    snap = prober.snapshot()
+
+    assert snap["ok"] is True
+    assert snap["checks"]["tts"]["status"] == "down"
@@ -0,0 +1,46 @@
+import json
+
+from natubot_core.log_analytics import LatencyHistogram, LogAggregate, _bucket, build_report
+
+
+def _line(ms: int, path: str = "/chat", status: int = 200) -> bytes:
+    rec = {
+        "ts": "2026-01-15T08:47:57-0500", "request_id": f"r{ms}", "method": "POST", "path": path,
+        "status": status, "elapsed_ms": ms, "client_ip": "127.0.0.1", "device_id": "KIOSK_001",
+        "kiosk_location": None, "kiosk_name": None,
+    }
+    return json.dumps(rec).encode() + b"\n"
+
+
+def test_percentile_never_exceeds_observed_max():
+    h = LatencyHistogram()
+    for ms in (10, 12, 1900):
+        h.add(_bucket(ms), 1, ms)
+    assert h.percentile(0.99) == 1900.0
+    assert h.percentile(0.50) <= 12 * 1.05
+
+
+def test_percentile_without_max_uses_bucket_edge():
+    h = LatencyHistogram.from_dict({"counts": {str(_bucket(1900)): 1}, "n": 1})
+    assert h.max_ms is None
+    assert 1900 <= h.percentile(0.99) <= 1900 * 1.05
+
+
+def test_report_percentiles_are_bounded_by_max_per_group():
+    agg = LogAggregate()
+    for ms in (1, 2, 3, 1900):
+        agg.add_line(_line(ms))
+    agg.add_line(_line(5, path="/config"))
+    agg.flush()
+    report = build_report(agg, groups=("path",))
+    rows = {r["key"]: r for r in report["groups"]["path"]}
+    assert rows["/chat"]["max_ms"] == 1900 and rows["/chat"]["p99_ms"] == 1900
+    assert rows["/config"]["p99_ms"] == 5
+    assert report["total"]["p99_ms"] <= report["total"]["max_ms"] == 1900
+
+
+def test_max_survives_state_roundtrip():
+    agg = LogAggregate()
+    agg.add_line(_line(1900))
+    restored = LogAggregate.from_dict(json.loads(json.dumps(agg.to_dict())))
+    assert restored.total.hist.max_ms == 1900
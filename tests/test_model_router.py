@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from natubot_core.gemini_client import GeminiClient
+from natubot_core.model_router import ModelRouter, ModelTier, RoutingFeatures
+from natubot_core.resilience import CircuitBreaker, CircuitOpenError
+
+SIMPLE = RoutingFeatures(question_words=4, score_margin=0.2, distinct_products=1, contexts=3, voice=False)
+
+
+class FakeModels:
+    def __init__(self, down: set) -> None:
+        self.down = down
+        self.calls = []
+
+    def generate_content(self, model, contents, config):
+        self.calls.append(model)
+        if model in self.down:
+            raise RuntimeError(f"{model} caído")
+        return SimpleNamespace(text=f"respuesta de {model}", usage_metadata=None)
+
+
+def _setup(down):
+    models = FakeModels(down)
+    full_breaker = CircuitBreaker("gemini_generate", min_calls=2, failure_rate=0.5)
+    fast_breaker = CircuitBreaker("gemini_generate_fast", min_calls=2, failure_rate=0.5)
+    gemini = GeminiClient(
+        api_key="x",
+        chat_model="full-model",
+        embed_model="embed",
+        embed_dim=8,
+        generate_breaker=full_breaker,
+        model_breakers={"fast-model": fast_breaker},
+        client=SimpleNamespace(models=models),
+    )
+    pool = ThreadPoolExecutor(max_workers=4)
+    router = ModelRouter(
+        gemini,
+        fast=ModelTier("fast", "fast-model", latency_budget_ms=5000),
+        full=ModelTier("full", "full-model", latency_budget_ms=5000),
+        executor=pool,
+    )
+    return router, models, fast_breaker, full_breaker, pool
+
+
+def test_each_tier_has_its_own_breaker():
+    router, models, fast_breaker, full_breaker, pool = _setup(down={"fast-model"})
+    try:
+        for _ in range(3):
+            text, tier = router.generate("hola", features=SIMPLE, timeout=5.0)
+            assert (text, tier) == ("respuesta de full-model", "full")
+        # El tier rápido abrió su circuito; el completo sigue cerrado y atiende el failover.
+        assert fast_breaker.state == "open"
+        assert full_breaker.state == "closed"
+        models.calls.clear()
+        text, tier = router.generate("hola", features=SIMPLE, timeout=5.0)
+        assert tier == "full"
+        assert models.calls == ["full-model"]
+    finally:
+        pool.shutdown(wait=True)
+
+
+def test_generate_without_model_uses_default_breaker():
+    router, _, fast_breaker, full_breaker, pool = _setup(down={"full-model"})
+    pool.shutdown(wait=True)
+    gemini = router.gemini
+    assert gemini.generate_breaker_for("fast-model") is fast_breaker
+    assert gemini.generate_breaker_for("otro") is full_breaker
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            gemini.generate("hola")
+    with pytest.raises(CircuitOpenError):
+        gemini.generate("hola")
+    assert fast_breaker.state == "closed"
+    assert gemini.generate("hola", model="fast-model") == "respuesta de fast-model"
@@ -0,0 +1,103 @@
+from natubot_core.near_dedup import (
+    NearDupConfig,
+    collapse_near_duplicates,
+    expand_product_filter,
+    product_filter,
+    savings_report,
+)
+
+DOSIS = (
+    "Tomar dos cápsulas al día con abundante agua, de preferencia junto a las comidas principales. "
+    "No superar la dosis diaria recomendada. Mantener fuera del alcance de los niños y en un lugar "
+    "fresco y seco, protegido de la luz directa del sol. Consulte a su médico si está embarazada."
+)
+
+
+def _chunk(cid, text, product, **md):
+    return {"id": cid, "text": text, "metadata": {"product_id": product, "product_name": product.title(), **md}}
+
+
+def test_identical_text_of_two_products_collapses_into_one_chunk():
+    chunks = [
+        _chunk("a#0", DOSIS, "omega3", ingredient_tags=["omega 3"]),
+        _chunk("b#0", DOSIS, "magnesio", ingredient_tags=["magnesio"]),
+    ]
+    kept, clusters = collapse_near_duplicates(chunks)
+    assert [c["id"] for c in kept] == ["a#0"]
+    md = kept[0]["metadata"]
+    assert md["product_id"] == "omega3"
+    assert md["product_ids"] == ["omega3", "magnesio"]
+    assert md["product_names"] == ["Omega3", "Magnesio"]
+    assert md["ingredient_tags"] == ["omega 3", "magnesio"]
+    assert md["near_duplicate_ids"] == ["b#0"] and md["near_duplicate_count"] == 1
+    assert clusters[0]["representative"] == "a#0" and clusters[0]["absorbed"] == ["b#0"]
+
+
+def test_longest_text_is_the_representative():
+    chunks = [_chunk("a#0", DOSIS, "omega3"), _chunk("b#0", DOSIS + " Producto natural.", "magnesio")]
+    kept, _ = collapse_near_duplicates(chunks)
+    assert [c["id"] for c in kept] == ["b#0"]
+
+
+def test_different_numbers_are_not_duplicates():
+    # Umbral bajo: solo el chequeo de números los separa.
+    config = NearDupConfig(threshold=0.5)
+    extra = [_chunk("a#0", DOSIS, "omega3"), _chunk("b#0", DOSIS + " Contiene 60 cápsulas.", "magnesio")]
+    changed = [_chunk("a#0", DOSIS.replace("dos", "2"), "omega3"), _chunk("b#0", DOSIS.replace("dos", "3"), "zinc")]
+    assert len(collapse_near_duplicates(extra, config)[0]) == 2
+    assert len(collapse_near_duplicates(changed, config)[0]) == 2
+    assert len(collapse_near_duplicates(changed, NearDupConfig(threshold=0.5, same_numbers=False))[0]) == 1
+
+
+def test_unrelated_chunks_are_kept_in_order():
+    chunks = [
+        _chunk("a#0", "La caléndula calma la piel irritada y ayuda a cicatrizar pequeñas heridas.", "calendula"),
+        _chunk("b#0", DOSIS, "omega3"),
+        _chunk("c#0", "El ginkgo se asocia a la circulación y a la memoria en adultos mayores.", "ginkgo"),
+    ]
+    kept, clusters = collapse_near_duplicates(chunks)
+    assert kept == chunks
+    assert clusters == []
+    report = savings_report(chunks, kept, clusters)
+    assert report["absorbed"] == 0 and report["index_saved_ratio"] == 0.0
+
+
+def _matches(md, flt):
+    # Semántica mínima de filtros Pinecone ($eq/$in sobre escalares o listas, $and/$or).
+    for key, cond in flt.items():
+        if key == "$and":
+            ok = all(_matches(md, c) for c in cond)
+        elif key == "$or":
+            ok = any(_matches(md, c) for c in cond)
+        else:
+            value = md.get(key)
+            values = value if isinstance(value, list) else [value]
+            if not isinstance(cond, dict):
+                cond = {"$eq": cond}
+            ok = all(
+                (op == "$eq" and arg in values) or (op == "$in" and any(v in arg for v in values))
+                for op, arg in cond.items()
+            )
+        if not ok:
+            return False
+    return True
+
+
+def test_merged_product_is_found_by_its_own_product_id():
+    chunks = [_chunk("a#0", DOSIS, "omega3"), _chunk("b#0", DOSIS, "magnesio"), _chunk("c#0", "Otro texto.", "zinc")]
+    kept, _ = collapse_near_duplicates(chunks)
+    flt = {"product_id": "magnesio"}
+    assert not any(_matches(c["metadata"], flt) for c in kept)
+    found = [c["id"] for c in kept if _matches(c["metadata"], expand_product_filter(flt))]
+    assert found == ["a#0"]
+    found_in = [c["id"] for c in kept if _matches(c["metadata"], expand_product_filter({"product_id": {"$in": ["zinc", "magnesio"]}}))]
+    assert found_in == ["a#0", "c#0"]
+
+
+def test_expand_product_filter_keeps_other_conditions_and_is_idempotent():
+    flt = {"product_id": {"$eq": "magnesio"}, "source": "catalogo"}
+    expanded = expand_product_filter(flt)
+    assert expanded == {"$and": [{"source": "catalogo"}, product_filter(["magnesio"])]}
+    assert expand_product_filter(expanded) == expanded
+    assert expand_product_filter({"product_id": {"$ne": "zinc"}}) == {"product_id": {"$ne": "zinc"}}
+    assert expand_product_filter({"health_goal_tags": {"$in": ["sueño"]}}) == {"health_goal_tags": {"$in": ["sueño"]}}
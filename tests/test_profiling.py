@@ -0,0 +1,30 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from natubot_core.profiling import SamplingProfiler, propagate
+
+
+def _busy_in_pool(ms: float) -> None:
+    end = time.monotonic() + ms / 1000.0
+    while time.monotonic() < end:
+        pass
+
+
+def test_pool_threads_are_sampled_and_saved(tmp_path):
+    profiler = SamplingProfiler(tmp_path, enabled=True, sample_rate=1.0, slow_ms=0.0, interval_ms=1.0, rng=lambda: 0.0)
+    token = profiler.start("req-1", "/chat")
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        # El hilo del request solo espera: el trabajo real corre en el pool.
+        pool.submit(propagate(_busy_in_pool), 80.0).result()
+    profile = profiler.finish(token)
+    assert profile is not None and not profile.threads
+    assert any("_busy_in_pool" in frame for stack in profile.stacks for frame in stack)
+    path = profiler.save(profile, 200)
+    assert path is not None and path.exists()
+
+
+def test_unprofiled_requests_run_unchanged(tmp_path):
+    profiler = SamplingProfiler(tmp_path, enabled=False)
+    assert profiler.start("req-2", "/chat") is None
+    assert propagate(lambda x: x + 1)(1) == 2
+    assert profiler.finish(None) is None
@@ -0,0 +1,26 @@
+from natubot_core.prompts import split_voice_answer, to_spoken_text
+
+
+def test_to_spoken_text_strips_markdown_and_references():
+    text = "**Omega 3**\n- Apoya el corazón [1]\n- Se toma con comida [2, 3]"
+    assert to_spoken_text(text) == "Omega 3. Apoya el corazón. Se toma con comida."
+
+
+def test_split_voice_answer_uses_both_parts():
+    raw = "HABLADO: Sirve para la piel. Se aplica dos veces al día.\nPANTALLA: La caléndula calma la piel [1]."
+    spoken, screen = split_voice_answer(raw)
+    assert spoken == "Sirve para la piel. Se aplica dos veces al día."
+    assert screen == "La caléndula calma la piel."
+
+
+def test_split_voice_answer_caps_spoken_words_at_sentence_boundary():
+    raw = "HABLADO: Uno dos tres. Cuatro cinco seis. Siete ocho.\nPANTALLA: Texto."
+    spoken, _ = split_voice_answer(raw, spoken_max_words=6)
+    assert spoken == "Uno dos tres. Cuatro cinco seis."
+
+
+def test_split_voice_answer_without_markers_summarizes_screen_text():
+    raw = "**Omega 3** apoya el corazón [1].\n- Se toma con comida."
+    spoken, screen = split_voice_answer(raw, spoken_max_words=45)
+    assert spoken == "Omega 3 apoya el corazón. Se toma con comida."
+    assert screen == "**Omega 3** apoya el corazón.\n- Se toma con comida."
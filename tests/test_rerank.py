@@ -0,0 +1,27 @@
+from natubot_core.rerank import RerankConfig, score_gap_cutoff, select_diverse
+
+
+def test_fetch_k_is_bounded_by_top_k_and_max_candidates():
+    config = RerankConfig(fetch_multiplier=3, max_candidates=20)
+    assert config.fetch_k(5) == 15
+    assert config.fetch_k(10) == 20
+    assert config.fetch_k(25) == 25
+
+
+def test_score_gap_cutoff_drops_weak_tail():
+    assert score_gap_cutoff([0.9, 0.88, 0.7, 0.69], score_gap=0.08, min_score_ratio=0.5, min_keep=1) == 2
+    assert score_gap_cutoff([0.9, 0.6], score_gap=1.0, min_score_ratio=0.75, min_keep=1) == 1
+    assert score_gap_cutoff([0.9, 0.1], score_gap=0.08, min_score_ratio=0.75, min_keep=2) == 2
+
+
+def test_select_diverse_skips_near_duplicate():
+    config = RerankConfig(lambda_=0.3, score_gap=1.0, min_score_ratio=0.0, min_keep=1)
+    query = [1.0, 0.0]
+    vectors = [[1.0, 0.1], [1.0, 0.11], [0.7, 0.7]]
+    picked = select_diverse(query, [0.95, 0.94, 0.8], vectors, top_k=2, config=config)
+    assert picked == [0, 2]
+
+
+def test_select_diverse_without_vectors_keeps_score_order():
+    config = RerankConfig(score_gap=1.0, min_score_ratio=0.0, min_keep=1)
+    assert select_diverse([1.0, 0.0], [0.9, 0.8, 0.7], [[], [], []], top_k=2, config=config) == [0, 1]
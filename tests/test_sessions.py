@@ -0,0 +1,44 @@
+from collections import deque
+
+from natubot_core.sessions import SessionState, is_follow_up, names_topic, normalize_text
+
+
+def _state(*product_names: str) -> SessionState:
+    return SessionState("s", deque(), chunk_refs=[("c1", 0.9)], product_names=list(product_names))
+
+
+def test_normalize_text_strips_accents_and_punctuation():
+    assert normalize_text("¿Para qué sirve la Caléndula?  Niños\n") == "para que sirve la calendula ninos"
+
+
+def test_names_topic():
+    assert not names_topic("¿y cómo se toma?")
+    assert not names_topic("¿tiene contraindicaciones?")
+    assert names_topic("¿qué es el magnesio?")
+
+
+def test_generic_question_is_follow_up():
+    assert is_follow_up("¿y cómo se toma?", _state("Caléndula Crema"))
+
+
+def test_session_product_with_generic_words_is_follow_up():
+    assert is_follow_up("¿la caléndula tiene contraindicaciones?", _state("Caléndula Crema"))
+
+
+def test_comparison_with_other_product_is_new_topic():
+    assert not is_follow_up("¿es mejor la calendula o el ginkgo?", _state("Caléndula Crema"))
+
+
+def test_new_topic_without_session_product():
+    assert not is_follow_up("¿qué es el magnesio?", _state("Caléndula Crema"))
+
+
+def test_no_state_or_no_chunks_is_never_follow_up():
+    assert not is_follow_up("¿y cómo se toma?", None)
+    empty = SessionState("s", deque(), chunk_refs=[], product_names=["Caléndula"])
+    assert not is_follow_up("¿y cómo se toma?", empty)
+
+
+def test_long_generic_question_is_not_follow_up():
+    q = "y entonces cuanto tiempo despues de la comida debo tomar cada dosis diaria"
+    assert not is_follow_up(q, _state("Caléndula Crema"))
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from app.speech import stt_vosk
+from app.speech.stt_vosk import VoskSTT
+
+
+class FakeRecognizer:
+    """Devuelve `text` con confianza `conf` (gramática) o `open_text` (vocabulario abierto)."""
+
+    created = []
+    text = "omega tres"
+    conf = 0.9
+    open_text = "omega tres para el corazón"
+
+    def __init__(self, model, sample_rate, grammar=None):
+        self.grammar = grammar
+        self.chunks = 0
+        FakeRecognizer.created.append(self)
+
+    def SetWords(self, enabled):
+        pass
+
+    def AcceptWaveform(self, data):
+        self.chunks += 1
+        return False
+
+    def PartialResult(self):
+        return json.dumps({"partial": f"{'g' if self.grammar else 'o'}{self.chunks}"})
+
+    def Result(self):
+        return "{}"
+
+    def FinalResult(self):
+        if self.grammar is None:
+            return json.dumps({"text": self.open_text})
+        words = self.text.split()
+        return json.dumps({"text": self.text, "result": [{"word": w, "conf": self.conf} for w in words]})
+
+
+@pytest.fixture
+def stt(tmp_path, monkeypatch):
+    FakeRecognizer.created = []
+    monkeypatch.setattr(stt_vosk, "Model", lambda path: object())
+    monkeypatch.setattr(stt_vosk, "KaldiRecognizer", FakeRecognizer)
+
+    def make(conf=0.9, parallel=False):
+        FakeRecognizer.conf = conf
+        return VoskSTT(str(tmp_path), chunk_bytes=4, grammar=["omega tres"], grammar_parallel=parallel)
+
+    return make
+
+
+def test_grammar_hit_decodes_once(stt):
+    partials = []
+    assert stt().transcribe(b"\0" * 12, on_partial=partials.append) == "omega tres"
+    assert [r.grammar is not None for r in FakeRecognizer.created] == [True]
+    assert partials == ["g1", "g2", "g3"]
+
+
+def test_low_confidence_redecodes_with_open_vocabulary_without_partials(stt):
+    partials = []
+    assert stt(conf=0.3).transcribe(b"\0" * 12, on_partial=partials.append) == "omega tres para el corazón"
+    grammar, open_vocab = FakeRecognizer.created
+    assert grammar.grammar is not None and open_vocab.grammar is None
+    assert grammar.chunks == open_vocab.chunks == 3
+    assert partials == ["g1", "g2", "g3"]
+
+
+def test_parallel_mode_feeds_both_recognizers_in_one_pass(stt):
+    partials = []
+    assert stt(conf=0.3, parallel=True).transcribe(b"\0" * 12, on_partial=partials.append) == "omega tres para el corazón"
+    assert len(FakeRecognizer.created) == 2
+    assert partials == ["g1", "g2", "g3"]
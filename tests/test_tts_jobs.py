@@ -0,0 +1,76 @@
+import threading
+
+from app.speech.tts_jobs import CANCELLED, DONE, TTSJobStore
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _blocking_synthesize(release: threading.Event):
+    def synthesize(text, should_stop):
+        while not should_stop() and not release.wait(0.01):
+            pass
+        return b"wav:" + text.encode()
+
+    return synthesize
+
+
+def test_precomputed_audio_is_ready_and_age_uses_store_clock():
+    clock = FakeClock()
+    store = TTSJobStore(lambda text, should_stop: b"", clock=clock)
+    try:
+        job = store.submit("kiosk", "hola", audio_wav=b"wav")
+        clock.now += 1.5
+        assert job.status == DONE and job.audio_wav == b"wav"
+        assert store.snapshot(job)["age_ms"] == 1500
+    finally:
+        store.shutdown()
+
+
+def test_new_job_cancels_previous_job_of_same_owner():
+    release = threading.Event()
+    store = TTSJobStore(_blocking_synthesize(release), clock=FakeClock())
+    try:
+        first = store.submit("kiosk", "uno")
+        other = store.submit("otro", "dos")
+        second = store.submit("kiosk", "tres")
+        assert first.status == CANCELLED and first.cancel_event.is_set()
+        assert not other.cancel_event.is_set()
+        release.set()
+        assert second.done_event.wait(2.0) and second.status == DONE
+        assert second.audio_wav == b"wav:tres"
+    finally:
+        release.set()
+        store.shutdown()
+
+
+def test_cancel_checks_owner():
+    release = threading.Event()
+    store = TTSJobStore(_blocking_synthesize(release), clock=FakeClock())
+    try:
+        job = store.submit("kiosk", "uno")
+        assert not store.cancel(job.id, "otro")
+        assert store.cancel(job.id, "kiosk")
+        assert job.status == CANCELLED
+        assert not store.cancel(job.id, "kiosk")
+    finally:
+        release.set()
+        store.shutdown()
+
+
+def test_jobs_expire_after_ttl():
+    clock = FakeClock()
+    store = TTSJobStore(lambda text, should_stop: b"", ttl_sec=10.0, clock=clock)
+    try:
+        job = store.submit("kiosk", "hola", audio_wav=b"wav")
+        clock.now += 9.0
+        assert store.get(job.id, "kiosk") is job
+        clock.now += 2.0
+        assert store.get(job.id, "kiosk") is None
+    finally:
+        store.shutdown()
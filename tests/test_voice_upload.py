@@ -0,0 +1,97 @@
+import asyncio
+import base64
+import tracemalloc
+
+import pytest
+from starlette.requests import Request
+
+from app.speech.upload import UploadTooLarge, read_voice_upload
+
+MAX_AUDIO = 2_000_000
+SPOOL = 256 * 1024
+CHUNK_RAW = 48 * 1024  # múltiplo de 3: cada bloque codifica a base64 sin padding intermedio
+MB = 1024 * 1024
+
+
+def _json_body(audio_bytes: int):
+    yield b'{"filename":"turn.pcm","content_type":"audio/pcm;rate=16000;channels=1","audio_base64":"'
+    block = bytes(range(256)) * (CHUNK_RAW // 256)
+    sent = 0
+    while sent < audio_bytes:
+        n = min(CHUNK_RAW, audio_bytes - sent)
+        yield base64.b64encode(block[:n])
+        sent += n
+    yield b'","session_id":"s1"}'
+
+
+def _request(audio_bytes: int, *, content_length: bool):
+    """Request que genera el body al vuelo; devuelve también cuántos bytes se leyeron."""
+    chunks = _json_body(audio_bytes)
+    headers = [(b"content-type", b"application/json")]
+    if content_length:
+        size = sum(len(c) for c in _json_body(audio_bytes))
+        headers.append((b"content-length", str(size).encode()))
+    read = {"bytes": 0}
+
+    async def receive():
+        chunk = next(chunks, None)
+        if chunk is None:
+            return {"type": "http.request", "body": b"", "more_body": False}
+        read["bytes"] += len(chunk)
+        return {"type": "http.request", "body": chunk, "more_body": True}
+
+    scope = {"type": "http", "method": "POST", "path": "/api/voice/turn", "headers": headers, "query_string": b""}
+    return Request(scope, receive), read
+
+
+def _read_with_peak(request):
+    """(VoiceUpload o UploadTooLarge, pico de memoria Python asignada durante la lectura)."""
+
+    async def read():
+        tracemalloc.start()
+        try:
+            base, _ = tracemalloc.get_traced_memory()
+            try:
+                result = await read_voice_upload(request, max_audio_bytes=MAX_AUDIO, spool_bytes=SPOOL)
+            except UploadTooLarge as e:
+                result = e
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return result, peak - base
+
+    return asyncio.run(read())
+
+
+def test_declared_oversized_upload_is_rejected_before_reading():
+    request, read = _request(50 * MB, content_length=True)
+    result, _ = _read_with_peak(request)
+    assert isinstance(result, UploadTooLarge)
+    assert read["bytes"] == 0
+
+
+def test_chunked_oversized_upload_stops_at_the_limit_with_bounded_memory():
+    request, read = _request(50 * MB, content_length=False)
+    result, peak = _read_with_peak(request)
+    assert isinstance(result, UploadTooLarge)
+    # Corta al pasar el tope (audio en base64 + margen), no al terminar los 50 MB.
+    assert read["bytes"] < 2 * MAX_AUDIO
+    assert peak < SPOOL + 1 * MB
+
+
+def test_base64_upload_peak_is_close_to_the_decoded_audio():
+    audio_bytes = int(MAX_AUDIO * 0.9)
+    request, _ = _request(audio_bytes, content_length=True)
+    upload, peak = _read_with_peak(request)
+    assert len(upload.audio) == audio_bytes
+    assert upload.fields == {"filename": "turn.pcm", "content_type": "audio/pcm;rate=16000;channels=1", "session_id": "s1"}
+    # Leer el body completo + el string base64 + el audio decodificado costaría ~3.7x el audio;
+    # en streaming queda el audio final más el spool y los bloques en curso.
+    assert peak < audio_bytes + SPOOL + 1 * MB
+
+
+@pytest.mark.parametrize("content_length", [True, False])
+def test_small_upload_roundtrip(content_length):
+    request, _ = _request(1000, content_length=content_length)
+    upload, _ = _read_with_peak(request)
+    assert upload.audio == (bytes(range(256)) * 4)[:1000]